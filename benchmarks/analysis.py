@@ -0,0 +1,50 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Compares turning the documents of a corpus into terms token by token, through the token ranges
+and a generator that normalizes each token, with the Analyzer, which processes a whole document
+per call with memoized normalization. Also times building an InMemoryInvertedIndex, which uses
+the Analyzer. Run from the repository root:
+
+    python -m benchmarks.analysis [--corpora data/en.txt ...] [--repeat 3]
+"""
+
+import os
+
+from mapreduce.analysis import Analyzer
+from mapreduce.corpus import InMemoryCorpus
+from mapreduce.invertedindex import InMemoryInvertedIndex
+from mapreduce.tokenization import Tokenizer
+
+from .common import Table, analysis, best_of, make_parser
+
+
+def _per_token(corpus, normalizer, tokenizer):
+    # How terms were produced before the Analyzer, one generator step per token.
+    def get_terms(buffer):
+        return (normalizer.normalize(t) for t in Tokenizer.strings(tokenizer, normalizer.canonicalize(buffer)))
+    return [list(get_terms(document.get_field("body", ""))) for document in corpus]
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--corpora", nargs="+", default=[os.path.join("data", f) for f in ["en.txt", "cran.xml"]])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    normalizer, tokenizer = analysis()
+    table = Table(("corpus", -12, "{}"), ("per token", 10, "{:.1f}ms"), ("analyzer", 10, "{:.1f}ms"),
+                  ("speedup", 10, "{:.1f}x"), ("build index", 12, "{:.1f}ms"))
+    for filename in args.corpora:
+        corpus = InMemoryCorpus(filename)
+        analyzer = Analyzer(normalizer, tokenizer)
+        assert _per_token(corpus, normalizer, tokenizer) == analyzer.get_batch_terms(corpus, ["body"])
+        per_token = best_of(lambda: _per_token(corpus, normalizer, tokenizer), args.repeat)
+        batched = best_of(lambda: analyzer.get_batch_terms(corpus, ["body"]), args.repeat)
+        build = best_of(lambda: InMemoryInvertedIndex(corpus, ["body"], normalizer, tokenizer), args.repeat)
+        table.row(os.path.basename(filename), per_token * 1000, batched * 1000, per_token / batched, build * 1000)
+
+
+if __name__ == "__main__":
+    main()
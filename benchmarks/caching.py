@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Replays a skewed stream of ranked queries, where the popularity of the distinct queries
+follows a Zipf distribution, against an index without caches, with a posting list cache,
+and with both a posting list cache and a result cache. Run from the repository root:
+
+    python -m benchmarks.caching [--corpus data/en.txt] [--queries 2000] [--skew 1.0]
+"""
+
+import os
+import random
+
+from mapreduce.caching import CachedInvertedIndex, ResultCache
+from mapreduce.ranking import RankedSearchEngine
+
+from .common import Table, build_index, make_parser, timed
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--corpus", default=os.path.join("data", "en.txt"))
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--distinct", type=int, default=500)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--posting-budget", type=int, default=4 * 1024 * 1024)
+    parser.add_argument("--result-budget", type=int, default=256 * 1024)
+    args = parser.parse_args()
+
+    index = build_index(args.corpus)
+    vocabulary = sorted(index.get_vocabulary())
+    generator = random.Random(0)
+    weights = [index.get_document_frequency(term) for term in vocabulary]
+    distinct = [" ".join(generator.choices(vocabulary, weights, k=2) + generator.choices(vocabulary, k=1))
+                for _ in range(args.distinct)]
+    stream = generator.choices(distinct, [1 / (rank + 1) ** args.skew for rank in range(args.distinct)],
+                               k=args.queries)
+
+    setups = [("no caches", index, None),
+              ("postings", CachedInvertedIndex(index, args.posting_budget), None),
+              ("postings+results", CachedInvertedIndex(index, args.posting_budget), ResultCache(args.result_budget))]
+
+    table = Table(("caches", -18, "{}"), ("per query", 10, "{:.3f}ms"), ("posting hits", 14, "{:.1f}%"),
+                  ("result hits", 14, "{:.1f}%"))
+    expected = None
+    for name, searched_index, result_cache in setups:
+        engine = RankedSearchEngine(searched_index, result_cache=result_cache)
+        results, elapsed = timed(lambda: [engine.evaluate(query) for query in stream])
+        expected = expected or results
+        assert results == expected
+        posting_hits = searched_index.cache.hit_ratio if isinstance(searched_index, CachedInvertedIndex) else 0.0
+        result_hits = result_cache.cache.hit_ratio if result_cache else 0.0
+        table.row(name, elapsed / len(stream) * 1000, posting_hits * 100, result_hits * 100)
+
+
+if __name__ == "__main__":
+    main()
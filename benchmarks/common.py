@@ -0,0 +1,123 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Helpers shared by the benchmarks: finding the sample corpora, loading and indexing them the
+same way, timing and tracing what is measured, and printing the results as a table.
+"""
+
+import argparse
+import glob
+import os
+import time
+import tracemalloc
+from typing import Any, Callable, List, Tuple
+
+from mapreduce.corpus import InMemoryCorpus
+from mapreduce.invertedindex import InMemoryInvertedIndex
+from mapreduce.normalization import BrainDeadNormalizer, Normalizer
+from mapreduce.tokenization import BrainDeadTokenizer, Tokenizer
+
+
+def make_parser(description: str) -> argparse.ArgumentParser:
+    """
+    Returns a parser for the arguments of a benchmark, with its docstring as the description.
+    """
+    return argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+
+def sample_corpora(pattern: str = "*.*") -> List[str]:
+    """
+    Returns the paths of the sample corpora in data/ whose file names match the pattern, sorted.
+    """
+    return sorted(glob.glob(os.path.join("data", pattern)))
+
+
+def largest_corpora(count: int = 3) -> List[str]:
+    """
+    Returns the paths of the largest sample corpora in data/, largest first.
+    """
+    return sorted(sample_corpora(), key=os.path.getsize, reverse=True)[:count]
+
+
+def field(filename: str) -> str:
+    """
+    Returns the field of a corpus that holds its text, which is the description in CSV files.
+    """
+    return "description" if filename.endswith(".csv") else "body"
+
+
+def analysis() -> Tuple[Normalizer, Tokenizer]:
+    """
+    Returns the normalizer and tokenizer that every benchmark indexes with.
+    """
+    return BrainDeadNormalizer(), BrainDeadTokenizer()
+
+
+def build_index(filename: str) -> InMemoryInvertedIndex:
+    """
+    Loads a corpus and returns an InMemoryInvertedIndex of its text field.
+    """
+    return InMemoryInvertedIndex(InMemoryCorpus(filename), [field(filename)], *analysis())
+
+
+def timed(func: Callable[[], Any]) -> Tuple[Any, float]:
+    """
+    Calls func() once and returns what it returns and the time the call took, in seconds.
+    """
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def best_of(func: Callable[[], Any], repeat: int) -> float:
+    """
+    Calls func() repeat times and returns the shortest time a call took, in seconds.
+    """
+    return min(timed(func)[1] for _ in range(repeat))
+
+
+def average_time(func: Callable[[], Any], repeat: int) -> float:
+    """
+    Calls func() repeat times and returns the average time a call took, in seconds, for
+    calls that are too short to time one by one.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def traced(build: Callable[[], Any]) -> Tuple[Any, int]:
+    """
+    Returns what build() returns and the number of bytes it allocated and still holds.
+    """
+    tracemalloc.start()
+    try:
+        result = build()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+class Table:
+    """
+    Prints measurements in aligned columns, one row at a time, under a line of headers. Each
+    column is given as (header, width, format), where the format turns a value into text,
+    e.g., "{:.1f}ms", and the text is right-aligned, or left-aligned if the width is negative.
+    """
+
+    def __init__(self, *columns: Tuple[str, int, str]):
+        self._widths = [width for _, width, _ in columns]
+        self._formats = [value_format for _, _, value_format in columns]
+        print(self._join(header for header, _, _ in columns))
+
+    def _join(self, texts) -> str:
+        return " ".join("{:{}{}}".format(text, "<" if width < 0 else ">", abs(width))
+                        for text, width in zip(texts, self._widths)).rstrip()
+
+    def row(self, *values: Any) -> None:
+        """
+        Prints a row with a value for each column.
+        """
+        print(self._join(value_format.format(value) for value, value_format in zip(values, self._formats)))
@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Compares the memory taken by the vocabulary of each sample corpus in an InMemoryDictionary,
+i.e., a dict of term strings, and in a FrontCodedDictionary with a few block sizes, along with
+the time it takes to look up each term. Run from the repository root:
+
+    python -m benchmarks.dictionary [--corpora data/en.txt ...] [--block-sizes 4 8 16]
+"""
+
+import os
+
+from mapreduce.analysis import Analyzer
+from mapreduce.corpus import InMemoryCorpus
+from mapreduce.dictionary import FrontCodedDictionary, InMemoryDictionary
+
+from .common import Table, analysis, make_parser, sample_corpora, timed, traced
+
+
+def build_in_memory(keys: list) -> InMemoryDictionary:
+    dictionary = InMemoryDictionary()
+    for key in keys:
+        dictionary.add_if_absent(key.decode("utf-8"))
+    return dictionary
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--corpora", nargs="+", default=sample_corpora("*.txt"))
+    parser.add_argument("--block-sizes", nargs="+", type=int, default=[4, 8, 16])
+    args = parser.parse_args()
+
+    analyzer = Analyzer(*analysis())
+    table = Table(("corpus", -10, "{}"), ("terms", 8, "{}"), ("dictionary", -14, "{}"), ("memory", 10, "{:.2f}M"),
+                  ("per term", 10, "{:.1f}B"), ("lookup", 10, "{:.2f}us"))
+    for filename in args.corpora:
+        vocabulary = set()
+        for terms in analyzer.get_batch_terms(InMemoryCorpus(filename), ["body"]):
+            vocabulary.update(terms)
+        # The dictionaries are built from fresh strings, so that they're charged for the strings
+        # they keep, as they would be at the end of indexing.
+        keys = [term.encode("utf-8") for term in vocabulary]
+        lookups = list(vocabulary)
+        setups = [("dict", lambda: build_in_memory(keys))]
+        setups += [("front coded/{}".format(block_size),
+                    lambda block_size=block_size: FrontCodedDictionary((key.decode("utf-8") for key in keys), block_size))
+                   for block_size in args.block_sizes]
+        for name, build in setups:
+            dictionary, memory = traced(build)
+            found, seconds = timed(lambda: all(dictionary.get_term_id(term) is not None for term in lookups))
+            assert found
+            table.row(os.path.basename(filename), len(keys), name, memory / 2 ** 20, memory / len(keys),
+                      seconds / len(lookups) * 10 ** 6)
+
+
+if __name__ == "__main__":
+    main()
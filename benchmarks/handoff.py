@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Compares two ways of handing the runs of the shuffle from mapper processes to reducer
+processes: pickling them through the pipes of the process pool, and writing them to files
+that the reducers map into memory, as a shared Shuffle does. Reports the time of the map and
+reduce phases, the bytes that go through pipes between them, i.e., the pickled results of the
+map tasks and the pickled reduce tasks, and the bytes written to run files. Run from the
+repository root:
+
+    python -m benchmarks.handoff [--corpora data/en.txt ...] [--mappers 2] [--reducers 2]
+"""
+
+import os
+import pickle
+import tempfile
+
+from mapreduce.corpus import InMemoryCorpus
+from mapreduce.executor import ProcessExecutor
+from mapreduce.mapreducer import MapReducer
+from mapreduce.partitioning import HashPartitioner
+from mapreduce.shuffle import Shuffle
+
+from .common import Table, analysis, field, largest_corpora, make_parser, timed
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--corpora", nargs="+", default=largest_corpora())
+    parser.add_argument("--mappers", type=int, default=2)
+    parser.add_argument("--reducers", type=int, default=2)
+    args = parser.parse_args()
+
+    table = Table(("corpus", -10, "{}"), ("runs", -6, "{}"), ("map", 10, "{:.0f}ms"), ("reduce", 10, "{:.0f}ms"),
+                  ("pipe bytes", 12, "{:,}"), ("file bytes", 12, "{:,}"))
+    for filename in args.corpora:
+        mapreducer = MapReducer([field(filename)], InMemoryCorpus(filename), *analysis())
+        partitioner = HashPartitioner()
+        partitioner.fit(args.reducers, [])
+        for name, shared in [("piped", False), ("shared", True)]:
+            with tempfile.TemporaryDirectory() as directory:
+                shuffle = Shuffle(partitioner, directory=directory, shared=shared)
+                map_tasks = [(split, shuffle) for split in mapreducer._split(args.mappers)]
+                runs_list, map_time = timed(lambda: ProcessExecutor(args.mappers).map(MapReducer._map, map_tasks,
+                                                                                       mapreducer))
+                parts, _ = mapreducer._partition(runs_list, args.reducers)
+                _, reduce_time = timed(lambda: ProcessExecutor(args.reducers).map(MapReducer._reduce, parts, mapreducer))
+
+                pipe_bytes = sum(len(pickle.dumps(runs, pickle.HIGHEST_PROTOCOL)) for runs, _, _ in runs_list) + \
+                    sum(len(pickle.dumps(part, pickle.HIGHEST_PROTOCOL)) for part in parts)
+                file_bytes = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+            table.row(os.path.basename(filename), name, map_time * 1000, reduce_time * 1000, pipe_bytes, file_bytes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Indexes corpora with each engine, InMemoryInvertedIndex and MapReduceInvertedIndex, the latter
+for every combination of backend, number of mappers and number of reducers, and records the
+wall time of each phase, the documents indexed per second, the bytes shuffled from the mappers
+to the reducers and the peak resident set size to a JSON file. Every measurement runs in a
+fresh process, so that the peak RSS is that of a single build, including any worker processes,
+and the best of the repetitions is kept. Where the resource module isn't available, i.e., on
+Windows, the peak is the memory traced by tracemalloc in the build process instead, which
+leaves out worker processes and memory that Python doesn't allocate, and slows the build down.
+Run from the repository root:
+
+    python -m benchmarks.indexing [--corpora data/en.txt ...] [--engines in-memory mapreduce]
+        [--backends serial threading processes] [--mappers 1 4] [--reducers 4] [--repeat 3]
+        [--output benchmarks/results/indexing.json] [--baseline previous.json] [--threshold 0.1]
+
+With --baseline, the results are compared with those of an earlier run, and the exit status
+is 1 if any configuration got slower, or grew its peak RSS, by more than the threshold. Two
+results files can also be compared without indexing anything:
+
+    python -m benchmarks.indexing --compare previous.json results.json [--threshold 0.1]
+"""
+
+import datetime
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from mapreduce.corpus import InMemoryCorpus
+from mapreduce.invertedindex import InMemoryInvertedIndex, MapReduceInvertedIndex
+
+from .common import Table, analysis, field, make_parser, sample_corpora, timed
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where the peak memory is traced instead, see _peak_rss().
+    resource = None
+
+
+def _peak_rss() -> int:
+    # The largest resident set size of this process or any of its finished child processes, in bytes.
+    # Linux reports kilobytes, macOS bytes. Without the resource module, the peak of the memory
+    # traced since _build() started.
+    if resource is None:
+        return tracemalloc.get_traced_memory()[1]
+    scale = 1 if sys.platform == "darwin" else 1024
+    return scale * max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                       resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def _build(configuration: dict, connection) -> None:
+    # Runs in a fresh process, and sends back the measurements of a single build.
+    if resource is None:
+        tracemalloc.start()
+    corpus, loading = timed(lambda: InMemoryCorpus(configuration["corpus"]))
+    fields, (normalizer, tokenizer) = [field(configuration["corpus"])], analysis()
+    start = time.perf_counter()
+    if configuration["engine"] == "in-memory":
+        InMemoryInvertedIndex(corpus, fields, normalizer, tokenizer)
+        phases = {"indexing": time.perf_counter() - start}
+        shuffled = 0
+    else:
+        index = MapReduceInvertedIndex(corpus, fields, normalizer, tokenizer, configuration["backend"],
+                                       configuration["mappers"], configuration["reducers"])
+        phases = index.stats.timings
+        shuffled = index.stats.bytes_shuffled
+    seconds = time.perf_counter() - start
+    connection.send({"documents": corpus.size(), "loading": loading, "seconds": seconds, "phases": phases,
+                     "bytes_shuffled": shuffled, "peak_rss": _peak_rss()})
+    connection.close()
+
+
+def measure(configuration: dict, repeat: int) -> dict:
+    """
+    Builds the index of the given configuration repeat times, each in a fresh process, and
+    returns the configuration with the measurements of the fastest build, and the highest
+    peak RSS of all builds.
+    """
+    context = multiprocessing.get_context("spawn")
+    builds = []
+    for _ in range(repeat):
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_build, args=(configuration, sender))
+        process.start()
+        sender.close()
+        try:
+            builds.append(receiver.recv())
+        except EOFError:
+            raise RuntimeError("Building {} failed".format(configuration)) from None
+        finally:
+            process.join()
+    best = min(builds, key=lambda build: build["seconds"])
+    return dict(configuration, documents=best["documents"], loading=best["loading"], seconds=best["seconds"],
+                docs_per_second=best["documents"] / best["seconds"], phases=best["phases"],
+                bytes_shuffled=best["bytes_shuffled"],
+                peak_rss_mb=max(build["peak_rss"] for build in builds) / 2 ** 20)
+
+
+def environment() -> dict:
+    """
+    Describes where the results come from, so that results files from different machines or
+    commits aren't compared by accident.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"date": datetime.datetime.now().isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+# Time differences smaller than this are noise, however large they are relative to a tiny corpus.
+_NOISE_SECONDS = 0.01
+
+
+def _key(result: dict) -> tuple:
+    return result["corpus"], result["engine"], result["backend"], result["mappers"], result["reducers"]
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """
+    Compares the results of two runs configuration by configuration, and returns a line for
+    each configuration that got slower, or grew its peak RSS, by more than the given fraction.
+    Configurations that only one of the runs has are ignored, and so are time differences
+    within _NOISE_SECONDS.
+    """
+    previous = {_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = previous.get(_key(result))
+        if old is None:
+            continue
+        for name, unit, metric, noise in [("time", "s", "seconds", _NOISE_SECONDS), ("peak RSS", "MB", "peak_rss_mb", 0)]:
+            if result[metric] > old[metric] * (1 + threshold) and result[metric] - old[metric] > noise:
+                regressions.append("{}: {} {:.2f}{} -> {:.2f}{} (+{:.0%})".format(
+                    _describe(result), name, old[metric], unit, result[metric], unit, result[metric] / old[metric] - 1))
+    return regressions
+
+
+def _describe(result: dict) -> str:
+    if result["engine"] == "in-memory":
+        return "{} in-memory".format(os.path.basename(result["corpus"]))
+    return "{} mapreduce {} {}x{}".format(os.path.basename(result["corpus"]), result["backend"], result["mappers"],
+                                          result["reducers"])
+
+
+def _report(regressions: list) -> int:
+    for regression in regressions:
+        print("REGRESSION " + regression)
+    if not regressions:
+        print("No regressions.")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--corpora", nargs="+", default=sample_corpora())
+    parser.add_argument("--engines", nargs="+", choices=["in-memory", "mapreduce"], default=["in-memory", "mapreduce"])
+    parser.add_argument("--backends", nargs="+", default=["serial", "threading", "processes"])
+    parser.add_argument("--mappers", nargs="+", type=int, default=[1, 4])
+    parser.add_argument("--reducers", nargs="+", type=int, default=[4])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "indexing.json"))
+    parser.add_argument("--baseline")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "RESULTS"))
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            sys.exit(_report(compare(json.load(f), json.load(g), args.threshold)))
+
+    configurations = []
+    for corpus in args.corpora:
+        if "in-memory" in args.engines:
+            configurations.append({"corpus": corpus, "engine": "in-memory", "backend": None, "mappers": None,
+                                   "reducers": None})
+        if "mapreduce" in args.engines:
+            for backend, mappers, reducers in itertools.product(args.backends, args.mappers, args.reducers):
+                configurations.append({"corpus": corpus, "engine": "mapreduce", "backend": backend,
+                                       "mappers": mappers, "reducers": reducers})
+
+    results = {"environment": environment(), "results": []}
+    table = Table(("corpus", -10, "{}"), ("engine", -10, "{}"), ("backend", -10, "{}"), ("m x r", 7, "{}"),
+                  ("seconds", 9, "{:.3f}"), ("docs/s", 9, "{:.0f}"), ("peak RSS", 9, "{:.1f}MB"), ("phases", -1, "{}"))
+    for configuration in configurations:
+        result = measure(configuration, args.repeat)
+        results["results"].append(result)
+        table.row(os.path.basename(result["corpus"]), result["engine"], result["backend"] or "-",
+                  "{}x{}".format(result["mappers"], result["reducers"]) if result["mappers"] else "-",
+                  result["seconds"], result["docs_per_second"], result["peak_rss_mb"],
+                  " ".join("{}={:.0f}ms".format(phase, seconds * 1000) for phase, seconds in result["phases"].items()))
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print("Results written to " + args.output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            sys.exit(_report(compare(json.load(f), results, args.threshold)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Reports how much memory the inverted index of each sample corpus occupies, and how much
+the same postings would occupy as lists of Posting objects. Run from the repository root:
+
+    python -m benchmarks.memory [--corpora data/en.txt ...]
+"""
+
+import os
+
+from mapreduce.corpus import InMemoryCorpus
+from mapreduce.invertedindex import InMemoryInvertedIndex
+
+from .common import Table, analysis, field, make_parser, sample_corpora, traced
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--corpora", nargs="+", default=sample_corpora())
+    args = parser.parse_args()
+
+    table = Table(("corpus", -12, "{}"), ("terms", 9, "{}"), ("postings", 9, "{}"), ("index", 12, "{:.1f}M"),
+                  ("postings", 12, "{:.1f}M"), ("as objects", 12, "{:.1f}M"), ("ratio", 6, "{:.1f}x"))
+    for filename in args.corpora:
+        corpus = InMemoryCorpus(filename)
+        index, index_bytes = traced(lambda: InMemoryInvertedIndex(corpus, [field(filename)], *analysis()))
+        _, compressed_bytes = traced(lambda: [bytes(posting_list.buffer) for posting_list in index._posting_lists])
+        _, object_bytes = traced(lambda: [list(posting_list) for posting_list in index._posting_lists])
+        postings = sum(len(posting_list) for posting_list in index._posting_lists)
+        table.row(os.path.basename(filename), len(index._dictionary), postings, index_bytes / 2 ** 20,
+                  compressed_bytes / 2 ** 20, object_bytes / 2 ** 20, object_bytes / compressed_bytes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Reports the number of records each reducer receives with each partitioner, and the ratio
+of the largest to the average load, which bounds how much the slowest reducer holds up
+the reduce phase. Run from the repository root:
+
+    python -m benchmarks.partitioning [--reducers 8] [--corpora data/en.txt ...] [--zipf 1.0 1.2]
+
+No term of the sample corpora makes up more than a few percent of the records, so they're
+about as balanced with either partitioner. Skewed inputs are simulated with synthetic corpora
+of short documents whose terms are drawn from a Zipf distribution with the given exponents,
+like query logs or tweets, where the most frequent terms make up more than the fair load of a
+reducer: the sampled partitioner places them on the least loaded reducers, and splits those
+that are too large for a single reducer.
+"""
+
+import os
+import random
+
+from mapreduce.corpus import Corpus, InMemoryCorpus, InMemoryDocument
+from mapreduce.executor import SerialExecutor
+from mapreduce.mapreducer import MapReducer
+from mapreduce.partitioning import HashPartitioner, SampledPartitioner
+from mapreduce.shuffle import Shuffle
+
+from .common import Table, analysis, make_parser, sample_corpora
+
+
+def zipf_corpus(exponent: float, documents: int = 20000, length: int = 5, vocabulary: int = 10000) -> Corpus:
+    """
+    Returns a corpus of documents of the given length, whose terms are drawn at random from a
+    vocabulary with Zipf-distributed frequencies.
+    """
+    generator = random.Random(0)
+    terms = ["t{}".format(rank) for rank in range(vocabulary)]
+    weights = [1 / (rank + 1) ** exponent for rank in range(vocabulary)]
+    corpus = InMemoryCorpus()
+    for document_id in range(documents):
+        corpus.add_document(InMemoryDocument(document_id, {"body": " ".join(generator.choices(terms, weights, k=length))}))
+    return corpus
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--reducers", type=int, default=8)
+    parser.add_argument("--corpora", nargs="+", default=sample_corpora("*.txt"))
+    parser.add_argument("--zipf", nargs="*", type=float, default=[1.0, 1.2])
+    args = parser.parse_args()
+
+    scenarios = [(os.path.basename(filename), lambda filename=filename: InMemoryCorpus(filename))
+                 for filename in args.corpora]
+    scenarios += [("zipf/{}".format(exponent), lambda exponent=exponent: zipf_corpus(exponent)) for exponent in args.zipf]
+    table = Table(("corpus", -10, "{}"), ("", -8, "{}"), ("max/avg", 8, "{:.2f}"), ("records per reducer", -1, "{}"))
+    for scenario, load in scenarios:
+        corpus = load()
+        for name, partitioner in [("hash", HashPartitioner()), ("sampled", SampledPartitioner())]:
+            mapreducer = MapReducer(["body"], corpus, *analysis(), partitioner=partitioner)
+            partitioner.fit(args.reducers, mapreducer._sample(partitioner.sample_size))
+            map_tasks = [(split, Shuffle(partitioner)) for split in mapreducer._split(1)]
+            _, loads = mapreducer._partition(SerialExecutor().map(MapReducer._map, map_tasks, mapreducer),
+                                             args.reducers)
+            table.row(scenario, name, max(loads) / (sum(loads) / len(loads)), loads)
+
+
+if __name__ == "__main__":
+    main()
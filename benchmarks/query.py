@@ -0,0 +1,77 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Measures conjunctive queries that mix one rare term with common terms, comparing the
+BooleanSearchEngine with skipping cursors, the same engine with cursors that can't skip,
+and intersecting sets of document IDs materialized from the posting lists. Run from the
+repository root:
+
+    python -m benchmarks.query [--corpus data/en.txt] [--repeat 20]
+"""
+
+import os
+
+from mapreduce.invertedindex import InvertedIndex
+from mapreduce.postinglist import IteratorPostingsCursor
+from mapreduce.query import BooleanSearchEngine
+
+from .common import Table, average_time, build_index, make_parser
+
+
+class _UnskippingIndex(InvertedIndex):
+    """
+    Wraps an index, but hands out the fallback cursors that visit every posting.
+    """
+
+    def __init__(self, index: InvertedIndex):
+        self._index = index
+
+    def get_terms(self, buffer: str):
+        return self._index.get_terms(buffer)
+
+    def get_postings_iterator(self, term: str):
+        return self._index.get_postings_iterator(term)
+
+    def get_postings_cursor(self, term: str):
+        return IteratorPostingsCursor(self._index.get_postings_iterator(term))
+
+    def get_document_frequency(self, term: str) -> int:
+        return self._index.get_document_frequency(term)
+
+    def get_vocabulary(self):
+        return self._index.get_vocabulary()
+
+    def get_document_lengths(self):
+        return self._index.get_document_lengths()
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--corpus", default=os.path.join("data", "en.txt"))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--queries", nargs="+", default=["zebra the of", "london the of and", "the of and in"])
+    args = parser.parse_args()
+
+    index = build_index(args.corpus)
+    engine = BooleanSearchEngine(index)
+    unskipping = BooleanSearchEngine(_UnskippingIndex(index))
+
+    def materialized(query):
+        documents = [{p.document_id for p in index[term]} for term in index.get_terms(query)]
+        return sorted(set.intersection(*documents))
+
+    table = Table(("query", -22, "{}"), ("document freqs", 18, "{}"), ("matches", 8, "{}"),
+                  ("skipping", 10, "{:.2f}ms"), ("no skipping", 12, "{:.2f}ms"), ("sets", 12, "{:.2f}ms"))
+    for query in args.queries:
+        matches = list(engine.evaluate(query))
+        assert matches == materialized(query) == list(unskipping.evaluate(query))
+        frequencies = "/".join(str(index.get_document_frequency(term)) for term in index.get_terms(query))
+        table.row(query, frequencies, len(matches),
+                  average_time(lambda: list(engine.evaluate(query)), args.repeat) * 1000,
+                  average_time(lambda: list(unskipping.evaluate(query)), args.repeat) * 1000,
+                  average_time(lambda: materialized(query), args.repeat) * 1000)
+
+
+if __name__ == "__main__":
+    main()
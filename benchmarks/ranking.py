@@ -0,0 +1,56 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Compares top-k ranked retrieval with WAND against scoring every posting of every query term,
+on queries made up of a few random terms from each corpus, mixing rare and common terms.
+Run from the repository root:
+
+    python -m benchmarks.ranking [--corpora data/en.txt ...] [--k 10] [--scorer bm25]
+"""
+
+import os
+import random
+
+from mapreduce.ranking import BM25Scorer, RankedSearchEngine, TfIdfScorer
+
+from .common import Table, build_index, make_parser, timed
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--corpora", nargs="+", default=[os.path.join("data", f) for f in ["en.txt", "mesh.txt", "cran.xml"]])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--scorer", choices=["bm25", "tfidf"], default="bm25")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--terms", type=int, default=3)
+    args = parser.parse_args()
+
+    table = Table(("corpus", -12, "{}"), ("queries", 8, "{}"), ("wand", 12, "{:.2f}ms"), ("exhaustive", 12, "{:.2f}ms"),
+                  ("speedup", 8, "{:.1f}x"))
+    for filename in args.corpora:
+        index = build_index(filename)
+        engine = RankedSearchEngine(index, BM25Scorer() if args.scorer == "bm25" else TfIdfScorer())
+
+        # Draw terms by their number of postings, so that common terms show up about as often
+        # as they would in the text, next to the rarer terms that make up most of the vocabulary.
+        vocabulary = sorted(index.get_vocabulary())
+        generator = random.Random(0)
+        terms = generator.choices(vocabulary, [index.get_document_frequency(term) for term in vocabulary],
+                                  k=args.queries * args.terms // 2)
+        terms += generator.choices(vocabulary, k=args.queries * args.terms - len(terms))
+        generator.shuffle(terms)
+        queries = [" ".join(terms[i:i + args.terms]) for i in range(0, len(terms), args.terms)]
+
+        # Warm up, and check that the results agree.
+        for query in queries:
+            assert engine.evaluate(query, args.k) == engine.evaluate_exhaustively(query, args.k)
+
+        _, wand = timed(lambda: [engine.evaluate(query, args.k) for query in queries])
+        _, exhaustive = timed(lambda: [engine.evaluate_exhaustively(query, args.k) for query in queries])
+        table.row(os.path.basename(filename), len(queries), wand / len(queries) * 1000,
+                  exhaustive / len(queries) * 1000, exhaustive / wand)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Compares the sort-based reduce of MapReducer with the original implementation, which
+looked up existing postings with a linear scan and hence was quadratic in the document
+frequency. Both run serially on the same partitions. Run from the repository root:
+
+    python -m benchmarks.reduce [--reducers 4] [--corpora data/en.txt ...]
+"""
+
+import itertools
+import os
+
+from mapreduce.corpus import InMemoryCorpus
+from mapreduce.dictionary import InMemoryDictionary
+from mapreduce.executor import SerialExecutor
+from mapreduce.mapreducer import MapReducer
+from mapreduce.posting import Posting
+from mapreduce.partitioning import HashPartitioner
+from mapreduce.shuffle import Shuffle
+
+from .common import Table, analysis, largest_corpora, make_parser, timed
+
+
+def linear_scan_reduce(partition: list) -> (list, dict):
+    dictionary = InMemoryDictionary()
+    posting_lists = []
+    for term, doc_id, term_frequency in partition:
+        term_id = dictionary.add_if_absent(term)
+        posting_lists.extend([] for i in range(len(posting_lists), term_id + 1))
+        posting = next((p for p in posting_lists[term_id] if p.document_id == doc_id), None)
+        if posting:
+            posting.term_frequency += term_frequency
+        else:
+            posting_lists[term_id].append(Posting(doc_id, term_frequency))
+    return posting_lists, dictionary
+
+
+def time_reduce(reduce, parts: list) -> float:
+    return timed(lambda: [reduce(part) for part in parts])[1]
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--reducers", type=int, default=4)
+    parser.add_argument("--corpora", nargs="+", default=largest_corpora())
+    args = parser.parse_args()
+
+    table = Table(("corpus", -12, "{}"), ("records", 10, "{}"), ("linear scan", 12, "{:.2f}s"),
+                  ("sort-based", 12, "{:.2f}s"), ("speedup", 8, "{:.1f}x"))
+    for filename in args.corpora:
+        mapreducer = MapReducer(["body"], InMemoryCorpus(filename), *analysis())
+        partitioner = HashPartitioner()
+        partitioner.fit(args.reducers, [])
+        map_tasks = [(split, Shuffle(partitioner)) for split in mapreducer._split(1)]
+        runs_list = SerialExecutor().map(MapReducer._map, map_tasks, mapreducer)
+        parts, _ = mapreducer._partition(runs_list, args.reducers)
+        old = time_reduce(lambda runs: linear_scan_reduce(sorted(itertools.chain.from_iterable(runs))), parts)
+        new = time_reduce(mapreducer._reduce, parts)
+        records = sum(len(run) for part in parts for run in part)
+        table.row(os.path.basename(filename), records, old, new, old / new)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Measures how indexing throughput scales with the number of workers for each
+MapReducer backend. Run from the repository root:
+
+    python -m benchmarks.scaling [--corpus data/en.txt] [--max-workers N] [--streaming]
+
+With --streaming the corpus is read from disk by the mappers, see StreamingCorpus,
+and the time includes indexing the file.
+"""
+
+import os
+
+from mapreduce.corpus import InMemoryCorpus, StreamingCorpus
+from mapreduce.executor import make_executor
+from mapreduce.mapreducer import MapReducer
+
+from .common import Table, analysis, make_parser, timed
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--corpus", default=os.path.join("data", "en.txt"))
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--backends", nargs="+", default=["serial", "threading", "processes"])
+    parser.add_argument("--streaming", action="store_true")
+    args = parser.parse_args()
+
+    corpus = InMemoryCorpus(args.corpus)
+    print("corpus: {} ({} documents, {} cores)".format(args.corpus, len(corpus), os.cpu_count()))
+    table = Table(("backend", -10, "{}"), ("workers", 7, "{}"), ("seconds", 9, "{:.2f}"), ("docs/s", 9, "{:.0f}"),
+                  ("speedup", 8, "{:.2f}x"))
+
+    for backend in args.backends:
+        baseline = None
+        workers = 1
+        while workers <= args.max_workers:
+            def build():
+                indexed = StreamingCorpus(args.corpus, make_executor(backend, workers)) if args.streaming else corpus
+                MapReducer(["body"], indexed, *analysis()).mapreduce(workers, workers, False, backend)
+            _, elapsed = timed(build)
+            baseline = baseline or elapsed
+            table.row(backend, workers, elapsed, len(corpus) / elapsed, baseline / elapsed)
+            if backend == "serial":
+                break
+            workers *= 2
+
+
+if __name__ == "__main__":
+    main()
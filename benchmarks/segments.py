@@ -0,0 +1,48 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Measures the time to make a small batch of new documents searchable as the index grows,
+comparing rebuilding an InMemoryInvertedIndex over all documents so far with adding the
+batch to a SegmentedInvertedIndex. Run from the repository root:
+
+    python -m benchmarks.segments [--corpus data/en.txt] [--batch 100]
+"""
+
+import os
+
+from mapreduce.corpus import InMemoryCorpus
+from mapreduce.invertedindex import InMemoryInvertedIndex
+from mapreduce.segments import SegmentedInvertedIndex
+
+from .common import Table, analysis, make_parser, timed
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--corpus", default=os.path.join("data", "en.txt"))
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--reports", type=int, default=8)
+    args = parser.parse_args()
+
+    normalizer, tokenizer = analysis()
+    corpus = InMemoryCorpus(args.corpus)
+    every = max(1, corpus.size() // args.batch // args.reports)
+    table = Table(("documents", 10, "{}"), ("rebuild", 10, "{:.1f}ms"), ("add batch", 10, "{:.1f}ms"),
+                  ("segments", 10, "{}"))
+    with SegmentedInvertedIndex(["body"], normalizer, tokenizer) as index:
+        for i, start in enumerate(range(0, corpus.size(), args.batch)):
+            stop = min(start + args.batch, corpus.size())
+            _, added = timed(lambda: index.add_documents(corpus.get_documents(start, stop)))
+            if i % every == every - 1 or stop == corpus.size():
+                prefix = InMemoryCorpus()
+                for document in corpus.get_documents(0, stop):
+                    prefix.add_document(document)
+                _, rebuilt = timed(lambda: InMemoryInvertedIndex(prefix, ["body"], normalizer, tokenizer))
+                table.row(stop, rebuilt * 1000, added * 1000, len(index.segments))
+        index.wait_for_merges()
+        print("{} segments after merging: {}".format(len(index.segments), index.segments))
+
+
+if __name__ == "__main__":
+    main()
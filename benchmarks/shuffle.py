@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Compares the shuffle of packed integer runs with the original shuffle of record tuples,
+which partitioned every (term, document ID, term frequency) tuple on its own and sorted the
+tuples of each partition. Reports the time the mappers spend turning the terms of their
+documents into runs, i.e., combining, partitioning and sorting, the memory the runs of all
+mappers hold, the time it takes to pickle and unpickle them, as the processes backend does to
+hand them from the mappers to the reducers, and the time the reducers spend merging the runs
+into posting lists. The terms
+of the documents are produced up front, so that analysis doesn't drown out the shuffle.
+Run from the repository root:
+
+    python -m benchmarks.shuffle [--corpora data/en.txt ...] [--mappers 4] [--reducers 4] [--repeat 3]
+"""
+
+import itertools
+import os
+import pickle
+
+from mapreduce.combining import TermFrequencyCombiner
+from mapreduce.corpus import InMemoryCorpus
+from mapreduce.dictionary import InMemoryDictionary
+from mapreduce.mapreducer import MapReducer
+from mapreduce.partitioning import HashPartitioner
+from mapreduce.postinglist import CompressedPostingList
+from mapreduce.shuffle import Shuffle
+
+from .common import Table, analysis, best_of, field, largest_corpora, make_parser, traced
+
+
+def tuple_map(terms: list, start: int, partitioner: HashPartitioner) -> list:
+    combiner = TermFrequencyCombiner()
+    buffers = [[] for _ in range(partitioner.partitions)]
+    for document_id, document_terms in enumerate(terms, start):
+        for keyval in combiner.combine([(term, document_id, 1) for term in document_terms]):
+            buffers[partitioner.get_partition(keyval[0], keyval[1])].append(keyval)
+    for buffer in buffers:
+        buffer.sort()
+    return [[buffer] if buffer else [] for buffer in buffers]
+
+
+def tuple_reduce(runs: list) -> (list, dict):
+    dictionary = InMemoryDictionary()
+    posting_lists = []
+    posting_list = None
+    previous_term = None
+    previous_doc_id = None
+    pending_frequency = 0
+    for term, doc_id, term_frequency in sorted(itertools.chain.from_iterable(runs)):
+        if term == previous_term and doc_id == previous_doc_id:
+            pending_frequency += term_frequency
+            continue
+        if previous_term is not None:
+            posting_list.append(previous_doc_id, pending_frequency)
+        if term != previous_term:
+            dictionary.add_if_absent(term)
+            posting_list = CompressedPostingList()
+            posting_lists.append(posting_list)
+            previous_term = term
+        previous_doc_id = doc_id
+        pending_frequency = term_frequency
+    if previous_term is not None:
+        posting_list.append(previous_doc_id, pending_frequency)
+    return posting_lists, dictionary
+
+
+def packed_map(terms: list, start: int, partitioner: HashPartitioner) -> list:
+    combiner = TermFrequencyCombiner()
+    writer = Shuffle(partitioner).writer()
+    for document_id, document_terms in enumerate(terms, start):
+        writer.add_document(document_id, combiner.combine_document(document_id, document_terms))
+    return writer.close()
+
+
+def measure(map_split, reduce, splits: list, terms: list, partitions: int, repeat: int) -> (float, int, float, float):
+    """
+    Returns the best time it takes to map all splits, the memory the runs hold, the best time
+    it takes to pickle and unpickle the runs, and the best time it takes to reduce all partitions.
+    """
+    partitioner = HashPartitioner()
+    partitioner.fit(partitions, [])
+
+    def map_splits():
+        return [map_split(split_terms, split.start, partitioner) for split, split_terms in zip(splits, terms)]
+
+    map_time = best_of(map_splits, repeat)
+    runs_list, memory = traced(map_splits)
+    pickle_time = best_of(lambda: pickle.loads(pickle.dumps(runs_list, pickle.HIGHEST_PROTOCOL)), repeat)
+    parts = [[run for runs in runs_list for run in runs[partition]] for partition in range(partitions)]
+    reduce_time = best_of(lambda: [reduce(part) for part in parts], repeat)
+    return map_time, memory, pickle_time, reduce_time
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--corpora", nargs="+", default=largest_corpora())
+    parser.add_argument("--mappers", type=int, default=4)
+    parser.add_argument("--reducers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    table = Table(("corpus", -10, "{}"), ("shuffle", -7, "{}"), ("records", 9, "{}"), ("map", 10, "{:.1f}ms"),
+                  ("run memory", 11, "{:.1f}M"), ("pickle", 10, "{:.1f}ms"), ("reduce", 10, "{:.1f}ms"))
+    for filename in args.corpora:
+        corpus = InMemoryCorpus(filename)
+        text = field(filename)
+        mapreducer = MapReducer([text], corpus, *analysis())
+        splits = mapreducer._split(args.mappers)
+        terms = [mapreducer._analyzer.get_batch_terms(corpus.get_documents(split.start, split.stop), [text])
+                 for split in splits]
+        records = sum(len(set(document_terms)) for split_terms in terms for document_terms in split_terms)
+        for name, map_split, reduce in [("tuples", tuple_map, tuple_reduce), ("packed", packed_map, mapreducer._reduce)]:
+            map_time, memory, pickle_time, reduce_time = measure(map_split, reduce, splits, terms, args.reducers,
+                                                                 args.repeat)
+            table.row(os.path.basename(filename), name, records, map_time * 1000, memory / 2 ** 20, pickle_time * 1000,
+                      reduce_time * 1000)
+
+
+if __name__ == "__main__":
+    main()
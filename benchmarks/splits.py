@@ -0,0 +1,39 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Shows how evenly the input splits of the map phase are balanced for each corpus,
+as the number of splits and the ratio of the largest to the average split size.
+Run from the repository root:
+
+    python -m benchmarks.splits [--mappers 4]
+"""
+
+import os
+
+from mapreduce.corpus import InMemoryCorpus
+from mapreduce.mapreducer import MapReducer
+
+from .common import Table, analysis, field, make_parser, sample_corpora
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--mappers", type=int, default=4)
+    parser.add_argument("--corpora", nargs="+", default=sample_corpora())
+    args = parser.parse_args()
+
+    table = Table(("corpus", -16, "{}"), ("documents", 9, "{}"), ("splits", 7, "{}"), ("avg size", 12, "{:.0f}"),
+                  ("max/avg", 9, "{:.2f}"))
+    for filename in args.corpora:
+        corpus = InMemoryCorpus(filename)
+        text = field(filename)
+        mapreducer = MapReducer([text], corpus, *analysis())
+        splits = mapreducer._split(args.mappers)
+        sizes = [sum(len(corpus[i][text] or "") for i in split) for split in splits]
+        average = sum(sizes) / len(sizes)
+        table.row(os.path.basename(filename), len(corpus), len(splits), average, max(sizes) / average)
+
+
+if __name__ == "__main__":
+    main()
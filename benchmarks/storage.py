@@ -0,0 +1,44 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Compares the time to get a queryable index by building it from the raw corpus with the
+time to open a saved copy of it with DiskInvertedIndex. Run from the repository root:
+
+    python -m benchmarks.storage [--corpora data/en.txt ...]
+"""
+
+import os
+import tempfile
+import time
+
+from mapreduce.storage import DiskInvertedIndex
+
+from .common import Table, analysis, build_index, make_parser, timed
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--corpora", nargs="+", default=[os.path.join("data", f) for f in ["en.txt", "mesh.txt"]])
+    parser.add_argument("--term", default="the")
+    args = parser.parse_args()
+
+    normalizer, tokenizer = analysis()
+    table = Table(("corpus", -12, "{}"), ("build", 10, "{:.3f}s"), ("open", 10, "{:.2f}ms"),
+                  ("first query", 12, "{:.2f}ms"), ("index size", 12, "{:.1f}M"),
+                  ("postings of '{}'".format(args.term), 18, "{}"))
+    for filename in args.corpora:
+        index, build = timed(lambda: build_index(filename))
+        with tempfile.TemporaryDirectory() as directory:
+            index.save(directory)
+            size = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+            start = time.perf_counter()
+            with DiskInvertedIndex(directory, normalizer, tokenizer) as disk_index:
+                opened = time.perf_counter() - start
+                postings = len(list(disk_index[args.term]))
+                query = time.perf_counter() - start - opened
+        table.row(os.path.basename(filename), build, opened * 1000, query * 1000, size / 2 ** 20, postings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from typing import Iterable, List
+
+from .corpus import Document
+from .normalization import Normalizer
+from .tokenization import Tokenizer
+
+
+class Analyzer:
+    """
+    Turns text into index terms, by canonicalizing it, tokenizing it and normalizing each token,
+    for a whole buffer, document or batch of documents per call. Both documents and queries need
+    to be processed by the same analyzer.
+
+    Any tokenizer and normalizer work. Tokenizers that override Tokenizer.strings() to produce
+    the token strings directly skip building the token ranges. Normalizing a token is memoized
+    in a token-to-term cache, which is simply emptied when it reaches the given number of
+    entries, since the tokens of natural text are so skewed that the common ones are back
+    in the cache right away.
+    """
+
+    def __init__(self, normalizer: Normalizer, tokenizer: Tokenizer, cache_size: int = 64 * 1024):
+        assert cache_size > 0
+        self._normalizer = normalizer
+        self._tokenizer = tokenizer
+        self._cache_size = cache_size
+        self._cache = {}
+
+    def __getstate__(self):
+        # The cache is rebuilt in each worker, there's no need to ship it along with every task.
+        state = self.__dict__.copy()
+        state["_cache"] = {}
+        return state
+
+    @property
+    def normalizer(self) -> Normalizer:
+        return self._normalizer
+
+    @property
+    def tokenizer(self) -> Tokenizer:
+        return self._tokenizer
+
+    def _normalize(self, token: str) -> str:
+        term = self._cache.get(token)
+        if term is None:
+            if len(self._cache) >= self._cache_size:
+                self._cache.clear()
+            term = self._cache[token] = self._normalizer.normalize(token)
+        return term
+
+    def get_terms(self, buffer: str) -> List[str]:
+        """
+        Returns the terms of the buffer, in order.
+        """
+        tokens = self._tokenizer.strings(self._normalizer.canonicalize(buffer))
+        cache = self._cache
+        try:
+            # The common case is that all tokens have been seen before.
+            return [cache[token] for token in tokens]
+        except KeyError:
+            return [self._normalize(token) for token in tokens]
+
+    def get_document_terms(self, document: Document, fields: Iterable[str]) -> List[str]:
+        """
+        Returns the terms of the given fields of the document, field by field. Missing fields
+        have no terms.
+        """
+        terms = []
+        for field in fields:
+            buffer = document.get_field(field, None)
+            if buffer:
+                terms.extend(self.get_terms(buffer))
+        return terms
+
+    def get_batch_terms(self, documents: Iterable[Document], fields: Iterable[str]) -> List[List[str]]:
+        """
+        Returns the terms of the given fields of each document, see get_document_terms().
+        """
+        fields = list(fields)
+        return [self.get_document_terms(document, fields) for document in documents]
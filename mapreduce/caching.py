@@ -0,0 +1,201 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterator, Optional, Sequence, Tuple
+
+from .invertedindex import InvertedIndex
+from .posting import Posting
+from .postinglist import ArrayPostingsCursor, PostingsCursor
+
+
+class LRUCache:
+    """
+    A thread-safe cache that holds on to the most recently used entries within a memory budget,
+    in bytes. The size of an entry is given when it's added, typically an estimate made with
+    sys.getsizeof(). Entries larger than the whole budget aren't cached at all.
+    """
+
+    def __init__(self, memory_budget: int):
+        assert memory_budget >= 0
+        self._memory_budget = memory_budget
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return str({"entries": len(self._entries), "size": self._size, "memory_budget": self._memory_budget,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "invalidations": self.invalidations})
+
+    @property
+    def memory_budget(self) -> int:
+        return self._memory_budget
+
+    @property
+    def size(self) -> int:
+        """
+        Returns the total size of the cached entries, in bytes.
+        """
+        return self._size
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns the cached value for the key and marks it as recently used, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        """
+        Caches the value, evicting the least recently used entries until it fits the budget.
+        """
+        if size > self._memory_budget:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+            while self._entries and self._size + size > self._memory_budget:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+            self._entries[key] = (value, size)
+            self._size += size
+
+    def clear(self) -> None:
+        """
+        Drops all entries, e.g., because what they were computed from has changed.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.invalidations += 1
+
+
+class CachedInvertedIndex(InvertedIndex):
+    """
+    Wraps an inverted index with an LRU cache of decoded posting lists, for query traffic where
+    the same terms come up again and again. A cached posting list is held as arrays of document
+    identifiers and term frequencies, about 16 bytes per posting, so that hot terms skip the
+    dictionary lookup and the decompression, and cursors can gallop over the arrays directly.
+
+    The cache is emptied whenever the generation of the wrapped index changes.
+    """
+
+    def __init__(self, index: InvertedIndex, memory_budget: int = 16 * 1024 * 1024):
+        self._index = index
+        self._cache = LRUCache(memory_budget)
+        self._generation = index.generation
+
+    def __repr__(self):
+        return repr(self._index)
+
+    @property
+    def cache(self) -> LRUCache:
+        return self._cache
+
+    @property
+    def generation(self) -> int:
+        return self._index.generation
+
+    def _get_postings(self, term: str) -> Tuple[Sequence[int], Sequence[int]]:
+        generation = self._index.generation
+        if generation != self._generation:
+            self._cache.clear()
+            self._generation = generation
+        postings = self._cache.get(term)
+        if postings is None:
+            document_ids, term_frequencies = array("q"), array("q")
+            for posting in self._index.get_postings_iterator(term):
+                document_ids.append(posting.document_id)
+                term_frequencies.append(posting.term_frequency)
+            postings = (document_ids, term_frequencies)
+            self._cache.put(term, postings, sys.getsizeof(term) + sys.getsizeof(document_ids) +
+                            sys.getsizeof(term_frequencies))
+        return postings
+
+    def get_terms(self, buffer: str) -> Iterator[str]:
+        return self._index.get_terms(buffer)
+
+    def get_postings_iterator(self, term: str) -> Iterator[Posting]:
+        return map(Posting, *self._get_postings(term))
+
+    def get_postings_cursor(self, term: str) -> PostingsCursor:
+        return ArrayPostingsCursor(*self._get_postings(term))
+
+    def get_document_frequency(self, term: str) -> int:
+        return self._index.get_document_frequency(term)
+
+    def get_term_bounds(self, term: str) -> Tuple[int, int]:
+        return self._index.get_term_bounds(term)
+
+    def get_vocabulary(self) -> Iterator[str]:
+        return self._index.get_vocabulary()
+
+    def get_document_lengths(self) -> Sequence[int]:
+        return self._index.get_document_lengths()
+
+
+class ResultCache:
+    """
+    An LRU cache of query results, keyed on the normalized query, i.e., after the query has been
+    run through the index's get_terms(), so that queries that only differ in, e.g., case or
+    spacing share an entry. The search engines take a result cache as an option.
+
+    The keys don't identify the index, so the cache is bound to the index it's first used
+    with, and engines over other indexes can't share it. The cache is emptied whenever the
+    generation of the index changes.
+    """
+
+    def __init__(self, memory_budget: int = 4 * 1024 * 1024):
+        self._cache = LRUCache(memory_budget)
+        self._index = None
+        self._generation = None
+
+    @property
+    def cache(self) -> LRUCache:
+        return self._cache
+
+    def get_or_compute(self, index: InvertedIndex, key: Hashable, compute: Callable[[], list]) -> list:
+        """
+        Returns the cached result for the key, or computes and caches it. The result is a list
+        of results, which must not be changed by the caller. Raises a ValueError if the cache
+        is bound to another index.
+        """
+        if self._index is None:
+            self._index = index
+        elif self._index is not index:
+            raise ValueError("The result cache is used with another index")
+        generation = index.generation
+        if generation != self._generation:
+            if self._generation is not None:
+                self._cache.clear()
+            self._generation = generation
+        result = self._cache.get(key)
+        if result is None:
+            result = compute()
+            self._cache.put(key, result, sys.getsizeof(key) + sys.getsizeof(result) +
+                            sum(sys.getsizeof(item) for item in result))
+        return result
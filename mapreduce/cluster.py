@@ -0,0 +1,464 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Runs a worker that executes map and reduce tasks for a MapReducer on another machine, see
+ClusterExecutor, and serves the runs of its map tasks to the workers that reduce them:
+
+    python -m mapreduce.cluster [--host 127.0.0.1] [--port 0] [--advertise HOST] [--directory DIR]
+
+The worker prints the address it listens on and serves until it's interrupted or terminated.
+Every connection to a worker starts with a handshake in which both ends prove that they know
+the key in the MAPREDUCE_AUTHKEY environment variable, since the worker runs whatever code
+the tasks it's sent refer to. Without a key, the worker only listens on a loopback address.
+"""
+
+import argparse
+import hmac
+import ipaddress
+import itertools
+import os
+import pickle
+import queue
+import shutil
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import Executor as Pool
+from typing import Any, Callable, Iterable, List, Optional, Sequence, Tuple
+
+from .executor import Executor
+from .partitioning import Partitioner
+from .shuffle import PackedRun, RunReference, Shuffle
+
+
+Address = Tuple[str, int]
+
+# A message is a header with the type of the message and the length of its payload, followed by
+# the payload. Contexts, tasks, results and errors are pickled, while runs are sent in the format
+# of PackedRun.write(), so that the receiver reads them without unpickling a record. Jobs and
+# shuffles are identified by 16 random bytes, and a run by its shuffle and a number.
+_HEADER = struct.Struct("!BQ")
+_RUN_ID = struct.Struct("!16sQ")
+_CONTEXT, _TASK, _CLOSE, _FETCH, _DISCARD, _OK, _RESULT, _RUN, _ERROR = range(1, 10)
+
+# A connection is authenticated like in multiprocessing.connection: each end sends the other a
+# random challenge, which the other answers with an HMAC of the challenge keyed by the shared key.
+# No message is unpickled before both ends have proven that they know the key. A worker without
+# a key greets every connection with a welcome instead of a challenge.
+_CHALLENGE, _DIGEST, _WELCOME, _FAILURE = range(10, 14)
+_CHALLENGE_SIZE = 32
+_AUTHKEY_VARIABLE = "MAPREDUCE_AUTHKEY"
+
+# How long to wait for a worker to answer a message other than a task, in seconds.
+_CONTROL_TIMEOUT = 30.0
+
+
+class UnreachableWorkerError(ConnectionError):
+    """
+    Raised when a worker can't be reached, or the connection to it breaks.
+    """
+
+    @property
+    def address(self) -> Address:
+        return self.args[0]
+
+
+class AuthenticationError(Exception):
+    """
+    Raised when the other end of a connection doesn't know the shared key.
+    """
+    pass
+
+
+def default_authkey() -> Optional[bytes]:
+    """
+    Returns the key that workers and coordinators share, from the MAPREDUCE_AUTHKEY
+    environment variable, or None if it isn't set.
+    """
+    key = os.environ.get(_AUTHKEY_VARIABLE)
+    return key.encode("utf-8") if key else None
+
+
+def _is_loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+# Send the peer a challenge, and check that it answers it with the key.
+def _deliver_challenge(sock: socket.socket, authkey: bytes) -> None:
+    challenge = os.urandom(_CHALLENGE_SIZE)
+    _send(sock, _CHALLENGE, challenge)
+    kind, digest = _receive(sock)
+    if kind != _DIGEST or not hmac.compare_digest(bytes(digest), hmac.new(authkey, challenge, "sha256").digest()):
+        _send(sock, _FAILURE)
+        raise AuthenticationError("The peer doesn't know the key")
+    _send(sock, _WELCOME)
+
+
+# Answer the peer's challenge with the key.
+def _answer_challenge(sock: socket.socket, authkey: bytes) -> None:
+    kind, challenge = _receive(sock)
+    if kind != _CHALLENGE:
+        raise AuthenticationError("The peer has no key")
+    _send(sock, _DIGEST, hmac.new(authkey, bytes(challenge), "sha256").digest())
+    kind, _ = _receive(sock)
+    if kind != _WELCOME:
+        raise AuthenticationError("The peer doesn't accept the key")
+
+
+def _send(sock: socket.socket, kind: int, *buffers: bytes) -> None:
+    sock.sendall(_HEADER.pack(kind, sum(map(len, buffers))))
+    for buffer in buffers:
+        sock.sendall(buffer)
+
+
+def _receive(sock: socket.socket) -> Tuple[int, bytearray]:
+    kind, length = _HEADER.unpack(_read(sock, _HEADER.size))
+    return kind, _read(sock, length)
+
+
+def _read(sock: socket.socket, length: int) -> bytearray:
+    buffer = bytearray(length)
+    view = memoryview(buffer)
+    received = 0
+    while received < length:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("Connection closed")
+        received += count
+    return buffer
+
+
+def _request(address: Address, authkey: Optional[bytes], kind: int, *buffers: bytes,
+             timeout: Optional[float] = _CONTROL_TIMEOUT) -> bytearray:
+    # Send a message to a worker and return the payload of its reply. An error on the worker is raised here.
+    # With a key, the worker and this end authenticate each other first, see _deliver_challenge().
+    try:
+        with socket.create_connection(address, timeout=timeout) as sock:
+            sock.settimeout(_CONTROL_TIMEOUT)
+            if authkey is not None:
+                _answer_challenge(sock, authkey)
+                _deliver_challenge(sock, authkey)
+            elif _receive(sock)[0] != _WELCOME:
+                raise AuthenticationError("The worker at {}:{} needs a key".format(*address))
+            sock.settimeout(timeout)
+            _send(sock, kind, *buffers)
+            reply, payload = _receive(sock)
+    except OSError as e:
+        raise UnreachableWorkerError(address) from e
+    if reply == _ERROR:
+        raise pickle.loads(payload)
+    return payload
+
+
+def _pickle_exception(exception: Exception) -> bytes:
+    try:
+        return pickle.dumps(exception, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return pickle.dumps(RuntimeError(repr(exception)), pickle.HIGHEST_PROTOCOL)
+
+
+# The worker running in this process, if any.
+_worker = None
+
+
+class Worker:
+    """
+    Executes tasks sent by a ClusterExecutor, and keeps the runs of its map tasks in files in
+    a directory of its own until the shuffle is discarded. Reduce tasks fetch their runs
+    straight from the workers that hold them. The coordinator only handles references to
+    the runs, see RemoteRun.
+
+    The worker serves each connection in a thread of its own, and there's one worker per
+    process. The advertised host is the one other workers connect to, if the worker binds
+    to another address, e.g., 0.0.0.0.
+
+    A worker with a key only talks to peers that know the key, see default_authkey(). A
+    worker without a key refuses to listen on anything but a loopback address, since anyone
+    who can connect to it can make it run arbitrary code.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, advertise: Optional[str] = None,
+                 directory: Optional[str] = None, authkey: Optional[bytes] = None):
+        if authkey is None and not _is_loopback(host):
+            raise ValueError("A worker listening on {} needs a key, see {}".format(host, _AUTHKEY_VARIABLE))
+        self._authkey = authkey
+        self._server = socketserver.ThreadingTCPServer((host, port), _WorkerHandler)
+        self._server.daemon_threads = True
+        self._server.worker = self
+        self._address = (advertise or host, self._server.server_address[1])
+        self._directory = tempfile.mkdtemp(prefix="mapreduce-worker-", dir=directory)
+        self._contexts = {}
+        self._run_ids = itertools.count()
+
+    @property
+    def address(self) -> Address:
+        return self._address
+
+    @property
+    def authkey(self) -> Optional[bytes]:
+        return self._authkey
+
+    def serve_forever(self) -> None:
+        global _worker
+        _worker = self
+        try:
+            self._server.serve_forever()
+        finally:
+            _worker = None
+            self._server.server_close()
+            shutil.rmtree(self._directory, ignore_errors=True)
+
+    def shutdown(self) -> None:
+        """
+        Stops serving, and is called from another thread than serve_forever().
+        """
+        self._server.shutdown()
+
+    def keep(self, shuffle_id: bytes, run: PackedRun) -> "RemoteRun":
+        """
+        Writes a run of a map task to a file, and returns a reference for the reducers.
+        """
+        run_id = next(self._run_ids)
+        os.makedirs(os.path.join(self._directory, shuffle_id.hex()), exist_ok=True)
+        with open(self.run_file(shuffle_id, run_id), "wb") as f:
+            run.write(f)
+        return RemoteRun(self._address, shuffle_id, run_id, run.nbytes)
+
+    def run_file(self, shuffle_id: bytes, run_id: int) -> str:
+        return os.path.join(self._directory, shuffle_id.hex(), str(run_id) + ".run")
+
+    # Handle a message and return the type and payload of the reply.
+    def _handle(self, kind: int, payload: bytearray) -> Tuple[int, bytes]:
+        if kind == _CONTEXT:
+            self._contexts[bytes(payload[:16])] = pickle.loads(payload[16:])
+            return _OK, b""
+        elif kind == _TASK:
+            context = self._contexts[bytes(payload[:16])]
+            func, task = pickle.loads(payload[16:])
+            return _RESULT, pickle.dumps(func(context, task), pickle.HIGHEST_PROTOCOL)
+        elif kind == _CLOSE:
+            self._contexts.pop(bytes(payload), None)
+            return _OK, b""
+        elif kind == _FETCH:
+            with open(self.run_file(*_RUN_ID.unpack(payload)), "rb") as f:
+                return _RUN, f.read()
+        elif kind == _DISCARD:
+            shutil.rmtree(os.path.join(self._directory, payload.hex()), ignore_errors=True)
+            return _OK, b""
+        raise ValueError("Unsupported message type: " + str(kind))
+
+
+class _WorkerHandler(socketserver.BaseRequestHandler):
+    # Answer the messages on a connection until the coordinator or a peer closes it.
+    # With a key, a peer that doesn't authenticate is hung up on before any of its messages is read.
+    def handle(self):
+        authkey = self.server.worker.authkey
+        if authkey is not None:
+            try:
+                self.request.settimeout(_CONTROL_TIMEOUT)
+                _deliver_challenge(self.request, authkey)
+                _answer_challenge(self.request, authkey)
+                self.request.settimeout(None)
+            except (AuthenticationError, OSError):
+                return
+        else:
+            _send(self.request, _WELCOME)
+        while True:
+            try:
+                kind, payload = _receive(self.request)
+            except ConnectionError:
+                return
+            try:
+                reply = self.server.worker._handle(kind, payload)
+            except Exception as e:
+                reply = _ERROR, _pickle_exception(e)
+            _send(self.request, *reply)
+
+
+class RemoteRun(RunReference):
+    """
+    Refers to a run kept by the worker that produced it. A reducer on the same worker maps
+    the run file into memory, and a reducer on another worker fetches it.
+    """
+
+    __slots__ = ("address", "shuffle_id", "run_id", "_nbytes")
+
+    def __init__(self, address: Address, shuffle_id: bytes, run_id: int, nbytes: int):
+        self.address = address
+        self.shuffle_id = shuffle_id
+        self.run_id = run_id
+        self._nbytes = nbytes
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def load(self) -> PackedRun:
+        if _worker is not None and _worker.address == self.address:
+            return PackedRun.attach(_worker.run_file(self.shuffle_id, self.run_id))
+        authkey = _worker.authkey if _worker is not None else default_authkey()
+        return PackedRun.read(memoryview(_request(self.address, authkey, _FETCH,
+                                                  _RUN_ID.pack(self.shuffle_id, self.run_id))))
+
+
+class RemoteShuffle(Shuffle):
+    """
+    A shuffle between workers on other machines. The mappers keep their runs, see Worker, and
+    hand on references to them, and the reducers pull the runs of their partitions directly
+    from the workers that hold them. The runs are dropped from the workers when the shuffle is
+    discarded.
+    """
+
+    def __init__(self, partitioner: Partitioner, memory_budget: Optional[int], directory: str,
+                 workers: Sequence[Address], authkey: Optional[bytes] = None):
+        super().__init__(partitioner, memory_budget, directory, shared=True)
+        self._id = uuid.uuid4().bytes
+        self._workers = list(workers)
+        self._authkey = authkey
+
+    def __getstate__(self):
+        # The shuffle goes to the workers with every map task, and the key must never go over the wire.
+        state = self.__dict__.copy()
+        state["_authkey"] = None
+        return state
+
+    def write_run(self, run: PackedRun) -> RemoteRun:
+        if _worker is None:
+            raise RuntimeError("Only workers write the runs of a remote shuffle")
+        return _worker.keep(self._id, run)
+
+    def discard(self) -> None:
+        for address in self._workers:
+            try:
+                _request(address, self._authkey, _DISCARD, self._id)
+            except UnreachableWorkerError:
+                # A worker that's gone has lost its runs anyway.
+                pass
+
+
+class ClusterExecutor(Executor):
+    """
+    Runs tasks on workers on other machines, one task per worker at a time, see Worker. The
+    context of a job is pickled and sent to every worker once per pool, and each task is
+    pickled along with its function, which the workers import by reference, so they need
+    the same version of the code. The context should thus refer to data the workers can read
+    themselves, e.g., a StreamingCorpus of a file on a shared file system, rather than carry
+    it. Combined with a Scheduler, a task on a worker that can't be reached is run on another
+    worker.
+
+    The runs of the map tasks live on the workers that mapped them until the job is done, and
+    they aren't replicated. If a worker dies after its map tasks are done, the reducers that
+    need its runs fail on every attempt, and so does the job, which has to be run again. Map
+    tasks aren't rerun to recover the lost runs.
+
+    The executor and the workers authenticate each other with the given key, by default the
+    one in the MAPREDUCE_AUTHKEY environment variable, see Worker.
+    """
+
+    separate_processes = True
+
+    def __init__(self, addresses: Iterable[Address], authkey: Optional[bytes] = None):
+        self._addresses = list(addresses)
+        self._authkey = authkey if authkey is not None else default_authkey()
+        super().__init__(len(self._addresses))
+
+    def map(self, func: Callable[[Any, Any], Any], tasks: Iterable[Any], context: Any) -> List[Any]:
+        with self.open(context) as pool:
+            futures = [pool.submit(func, task) for task in tasks]
+            return [future.result() for future in futures]
+
+    def open(self, context: Any) -> Pool:
+        return _ClusterPool(self._addresses, self._authkey, context)
+
+    def shuffle(self, partitioner: Partitioner, memory_budget: Optional[int], directory: str) -> Shuffle:
+        return RemoteShuffle(partitioner, memory_budget, directory, self._addresses, self._authkey)
+
+
+class _ClusterPool(Pool):
+    # Sends each task to an idle worker. A worker that can't be reached is left out from then on.
+    def __init__(self, addresses: List[Address], authkey: Optional[bytes], context: Any):
+        self._id = uuid.uuid4().bytes
+        self._authkey = authkey
+        self._idle = queue.Queue()
+        self._live = set()
+        payload = pickle.dumps(context, pickle.HIGHEST_PROTOCOL)
+        for address in addresses:
+            try:
+                _request(address, self._authkey, _CONTEXT, self._id, payload)
+            except UnreachableWorkerError:
+                continue
+            self._live.add(address)
+            self._idle.put(address)
+        if not self._live:
+            raise UnreachableWorkerError(addresses[0] if addresses else None)
+        self._threads = ThreadPoolExecutor(max_workers=len(addresses))
+
+    def submit(self, func: Callable[[Any, Any], Any], task: Any) -> Future:
+        return self._threads.submit(self._run, pickle.dumps((func, task), pickle.HIGHEST_PROTOCOL))
+
+    def _run(self, payload: bytes) -> Any:
+        address = None
+        while address is None:
+            if not self._live:
+                raise ConnectionError("All workers are gone")
+            try:
+                address = self._idle.get(timeout=1)
+            except queue.Empty:
+                pass
+        try:
+            return pickle.loads(_request(address, self._authkey, _TASK, self._id, payload, timeout=None))
+        except UnreachableWorkerError as e:
+            if e.address == address:
+                self._live.discard(address)
+            raise
+        finally:
+            if address in self._live:
+                self._idle.put(address)
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        self._threads.shutdown(wait=wait, cancel_futures=cancel_futures)
+        for address in list(self._live):
+            try:
+                _request(address, self._authkey, _CLOSE, self._id)
+            except UnreachableWorkerError:
+                pass
+
+
+def parse_addresses(addresses: str) -> List[Address]:
+    """
+    Parses comma-separated host:port pairs.
+    """
+    return [(host, int(port)) for host, port in (address.rsplit(":", 1) for address in addresses.split(","))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--advertise")
+    parser.add_argument("--directory")
+    args = parser.parse_args()
+
+    worker = Worker(args.host, args.port, args.advertise, args.directory, default_authkey())
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print("Listening on {}:{}".format(*worker.address), flush=True)
+    try:
+        worker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    # Run the worker in the imported module rather than in __main__, so that the tasks it
+    # unpickles find it, see RemoteShuffle.write_run().
+    from mapreduce.cluster import main
+    main()
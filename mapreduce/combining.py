@@ -0,0 +1,77 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Collection, List, Tuple
+
+
+class Combiner(ABC):
+    """
+    Abstract base class for map-side combiners. A combiner collapses the (term, document ID,
+    term frequency) records emitted by a mapper before they are partitioned and shuffled to
+    the reducers, so that less intermediate data has to be moved and reduced.
+
+    A combiner runs either once per document or once per split, as given by its scope. The
+    records it returns must reduce to the same result as the records it was given.
+    """
+
+    def __init__(self, per_document: bool):
+        self._per_document = per_document
+
+    @property
+    def per_document(self) -> bool:
+        return self._per_document
+
+    @abstractmethod
+    def combine(self, keyvals: List[Tuple[str, int, int]]) -> List[Tuple[str, int, int]]:
+        """
+        Combines the given (term, document ID, term frequency) records.
+        """
+        pass
+
+    def combine_document(self, document_id: int, terms: List[str]) -> Collection[Tuple[str, int]]:
+        """
+        Combines the records of a single document, given the terms of the document in order,
+        and returns the combined records as (term, term frequency) pairs. Combiners that can
+        work on the terms directly override this to skip building a record per occurrence.
+        """
+        return [(term, term_frequency) for term, _, term_frequency in
+                self.combine([(term, document_id, 1) for term in terms])]
+
+
+class TermFrequencyCombiner(Combiner):
+    """
+    Sums up the term frequencies of records with the same term and document ID, i.e.,
+    turns a <term, 1> record per occurrence into a single <term, tf> record per document.
+    """
+
+    def __init__(self, per_document: bool = True):
+        super().__init__(per_document)
+
+    def combine(self, keyvals: List[Tuple[str, int, int]]) -> List[Tuple[str, int, int]]:
+        term_frequencies = Counter()
+        for term, doc_id, term_frequency in keyvals:
+            term_frequencies[(term, doc_id)] += term_frequency
+        return [(term, doc_id, term_frequency) for (term, doc_id), term_frequency in term_frequencies.items()]
+
+    def combine_document(self, document_id: int, terms: List[str]) -> Collection[Tuple[str, int]]:
+        return Counter(terms).items()
+
+
+class SumCombiner(Combiner):
+    """
+    Sums up the values of records with the same key across documents, for jobs whose reducer
+    only needs the total of each key, e.g., counting words. The sum is attributed to the first
+    document the key occurs in, so each key leaves a map task as a single record.
+    """
+
+    def __init__(self, per_document: bool = False):
+        super().__init__(per_document)
+
+    def combine(self, keyvals: List[Tuple[str, int, int]]) -> List[Tuple[str, int, int]]:
+        totals = {}
+        for key, doc_id, value in keyvals:
+            total = totals.get(key)
+            totals[key] = (doc_id, value) if total is None else (total[0], total[1] + value)
+        return [(key, doc_id, value) for key, (doc_id, value) in totals.items()]
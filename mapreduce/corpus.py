@@ -2,8 +2,16 @@
 # -*- coding: utf-8 -*-
 
 from abc import ABC, abstractmethod
+from array import array
 import collections.abc
-from typing import Dict, Any
+import csv
+import itertools
+from json import loads
+import os
+import re
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from .executor import Executor
 
 
 class Document(ABC):
@@ -86,6 +94,22 @@ class Corpus(collections.abc.Iterable):
         """
         pass
 
+    def get_documents(self, start: int, stop: int) -> Iterator[Document]:
+        """
+        Returns an iterator over the documents with identifiers in the range [start, stop),
+        in ascending order. Corpora that can read a range of documents cheaper than one
+        document at a time should override this.
+        """
+        return (self.get_document(document_id) for document_id in range(start, stop))
+
+    def get_document_sizes(self, fields: Iterable[str]) -> List[int]:
+        """
+        Returns an estimate of the size of the given fields of each document, indexed by document
+        identifier, e.g., for balancing work between mappers. Corpora that can estimate this
+        without reading all documents should override this.
+        """
+        return [sum(len(document[field] or "") for field in fields) for document in self]
+
 
 class InMemoryCorpus(Corpus):
     """
@@ -132,62 +156,447 @@ class InMemoryCorpus(Corpus):
         tab-separated fields. Empty lines are ignored. The first field gets named "body",
         the second field (optional) gets named "meta". All other fields are currently ignored.
         """
-        document_id = 0
         with open(filename, mode="r", encoding="utf-8") as f:
             for line in f:
-                anonymous_fields = line.strip().split("\t")
-                if len(anonymous_fields) == 1 and not anonymous_fields[0]:
-                    continue
-                named_fields = {"body": anonymous_fields[0]}
-                if len(anonymous_fields) >= 2:
-                    named_fields["meta"] = anonymous_fields[1]
-                self.add_document(InMemoryDocument(document_id, named_fields))
-                document_id += 1
+                named_fields = _parse_text_line(line)
+                if named_fields is not None:
+                    self.add_document(InMemoryDocument(len(self._documents), named_fields))
 
     def _load_xml(self, filename):
         """
         Loads documents from the given XML file. The schema is assumed to be
         simple <doc> nodes. Each <doc> node gets mapped to a single document field
-        named "body".
+        named "body", see _XmlDocumentReader.
         """
-        from xml.dom.minidom import parse
-
-        def __get_text(nodes):
-            data = []
-            for node in nodes:
-                if node.nodeType == node.TEXT_NODE:
-                    data.append(node.data)
-            return " ".join(data)
-
-        dom = parse(filename)
-        document_id = 0
-        for body in [__get_text(n.childNodes) for n in dom.getElementsByTagName("doc")]:
-            self.add_document(InMemoryDocument(document_id, {"body": body}))
-            document_id += 1
+        with open(filename, mode="rb") as f:
+            for _, named_fields in _XmlDocumentReader().read(f):
+                self.add_document(InMemoryDocument(len(self._documents), named_fields))
 
     def _load_csv(self, filename):
         """
         Loads documents from the given UTF-8 encoded CSV file. One document per line.
         """
-        import csv
-        document_id = 0
         with open(filename, mode="r", encoding="utf-8") as f:
             reader = csv.DictReader(f)
             for row in reader:
-                self.add_document(InMemoryDocument(document_id, dict(row)))
-                document_id += 1
+                self.add_document(InMemoryDocument(len(self._documents), dict(row)))
 
     def _load_json(self, filename):
         """
         Loads documents from the given UTF-8 encoded JSON file. One document per line.
         Lines that do not start with "{" are ignored.
         """
-        from json import loads
-        document_id = 0
         with open(filename, mode="r", encoding="utf-8") as f:
             for line in f:
-                line = line.strip()
-                if line.startswith("{"):
-                    named_fields = loads(line)
-                    self.add_document(InMemoryDocument(document_id, named_fields))
-                    document_id += 1
+                named_fields = _parse_json_line(line)
+                if named_fields is not None:
+                    self.add_document(InMemoryDocument(len(self._documents), named_fields))
+
+
+def _parse_text_line(line: str) -> Optional[Dict[str, Any]]:
+    """
+    Parses a line of a text file into named fields, see InMemoryCorpus._load_text().
+    Returns None for lines that don't hold a document.
+    """
+    anonymous_fields = line.strip().split("\t")
+    if len(anonymous_fields) == 1 and not anonymous_fields[0]:
+        return None
+    named_fields = {"body": anonymous_fields[0]}
+    if len(anonymous_fields) >= 2:
+        named_fields["meta"] = anonymous_fields[1]
+    return named_fields
+
+
+def _is_text_document(line: str) -> bool:
+    return line.strip() != ""
+
+
+def _parse_json_line(line: str) -> Optional[Dict[str, Any]]:
+    """
+    Parses a line of a JSON file into named fields, see InMemoryCorpus._load_json().
+    Returns None for lines that don't hold a document.
+    """
+    line = line.strip()
+    return loads(line) if line.startswith("{") else None
+
+
+def _is_json_document(line: str) -> bool:
+    return line.strip().startswith("{")
+
+
+# A carriage return that isn't part of a "\r\n" line break.
+_BARE_CARRIAGE_RETURN = re.compile(rb"\r(?!\n)")
+
+
+def _read_lines(f, start: int) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yields the byte offset and the bytes of each line of the binary file from the given
+    offset, including its line break. Lines are split on "\n", "\r\n" and "\r", like a
+    file opened in text mode with universal newlines splits them.
+    """
+    f.seek(start)
+    position = start
+    for line in f:
+        if b"\r" in line:
+            begin = 0
+            for match in _BARE_CARRIAGE_RETURN.finditer(line):
+                yield position + begin, line[begin:match.end()]
+                begin = match.end()
+            if begin < len(line):
+                yield position + begin, line[begin:]
+        else:
+            yield position, line
+        position += len(line)
+
+
+def _decode_line(line: bytes) -> str:
+    # Decode a line and translate its line break to "\n", like a file opened in text mode does.
+    if line.endswith(b"\r\n"):
+        line = line[:-2] + b"\n"
+    elif line.endswith(b"\r"):
+        line = line[:-1] + b"\n"
+    return line.decode("utf-8")
+
+
+class _XmlDocumentReader:
+    """
+    An incremental, event-based reader for XML files with <doc> nodes. The file is fed to
+    an Expat parser in chunks and each <doc> node is yielded as soon as it's closed, so no
+    tree is ever built and memory use doesn't grow with the size of the file.
+
+    The "body" of a document is its direct text nodes joined by a single space, as the DOM
+    would have them: a text node is a run of character data that isn't interrupted by an
+    element, a comment, a processing instruction or a CDATA section. CDATA sections and
+    the text of nested elements aren't part of the body. Documents are yielded in the
+    order of their start tags, also if they're nested within each other.
+
+    The reader also records the byte offset of each <doc> start tag and of the root end
+    tag, and whether all <doc> nodes are children of the root, for StreamingCorpus.
+    """
+
+    _CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, encoding: Optional[str] = None):
+        from xml.parsers import expat
+        self._parser = expat.ParserCreate(encoding)
+        self._parser.buffer_text = True
+        self._parser.StartElementHandler = self._start_element
+        self._parser.EndElementHandler = self._end_element
+        self._parser.CharacterDataHandler = self._character_data
+        self._parser.CommentHandler = lambda data: self._end_text()
+        self._parser.ProcessingInstructionHandler = lambda target, data: self._end_text()
+        self._parser.StartCdataSectionHandler = self._start_cdata
+        self._parser.EndCdataSectionHandler = self._end_cdata
+        self._parser.XmlDeclHandler = self._xml_declaration
+        self._open_elements = []
+        self._text = []
+        self._in_cdata = False
+        self._started = 0
+        self._finished = {}
+        self._yielded = 0
+        self.encoding = encoding
+        self.root_end_offset = None
+        self.children_of_root = True
+
+    def read(self, f, length: Optional[int] = None, final: bool = True) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Parses the given number of bytes of the file from its current position, or up to the
+        end of the file, and yields the byte offset, relative to where parsing started, and the
+        named fields of each document. Unless final, more data can be fed afterwards.
+        """
+        remaining = length
+        while True:
+            size = self._CHUNK_SIZE if remaining is None else min(self._CHUNK_SIZE, remaining)
+            data = f.read(size) if size > 0 else b""
+            if remaining is not None:
+                remaining -= len(data)
+            if data or final:
+                self._parser.Parse(data, not data)
+            yield from self._take_finished()
+            if not data:
+                return
+
+    def feed(self, data: bytes, final: bool = False) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Parses the given bytes and yields the documents that were completed by them.
+        """
+        self._parser.Parse(data, final)
+        return self._take_finished()
+
+    def _take_finished(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        while self._yielded in self._finished:
+            yield self._finished.pop(self._yielded)
+            self._yielded += 1
+
+    def _xml_declaration(self, version, encoding, standalone):
+        self.encoding = self.encoding or encoding
+
+    def _end_text(self):
+        if self._text:
+            if self._open_elements and self._open_elements[-1] is not None:
+                self._open_elements[-1][2].append("".join(self._text))
+            self._text = []
+
+    def _start_element(self, name, attributes):
+        self._end_text()
+        if name == "doc":
+            self.children_of_root = self.children_of_root and len(self._open_elements) == 1
+            self._open_elements.append((self._started, self._parser.CurrentByteIndex, []))
+            self._started += 1
+        else:
+            self._open_elements.append(None)
+
+    def _end_element(self, name):
+        self._end_text()
+        element = self._open_elements.pop()
+        if element is not None:
+            document_id, offset, text = element
+            self._finished[document_id] = (offset, {"body": " ".join(text)})
+        if not self._open_elements:
+            self.root_end_offset = self._parser.CurrentByteIndex
+
+    def _character_data(self, data):
+        if not self._in_cdata:
+            self._text.append(data)
+
+    def _start_cdata(self):
+        self._end_text()
+        self._in_cdata = True
+
+    def _end_cdata(self):
+        self._in_cdata = False
+
+
+def split_lines(filename: str, parts: int, start: int = 0) -> List[Tuple[int, int]]:
+    """
+    Splits the file, from the given byte offset and to the end, into the given number of
+    byte ranges of roughly equal size. Each range is moved forward to the start of the next
+    line, so that every line falls in exactly one range and ranges can be parsed on their
+    own. Empty ranges are dropped, so there may be fewer ranges than asked for.
+    """
+    assert parts > 0
+    size = os.path.getsize(filename)
+    boundaries = [start]
+    with open(filename, mode="rb") as f:
+        for part in range(1, parts):
+            position = max(start + (size - start) * part // parts, boundaries[-1])
+            if position > 0:
+                # Reading the rest of the line that the previous byte belongs to leaves us
+                # at the first line start at or after the position.
+                f.seek(position - 1)
+                f.readline()
+                position = f.tell()
+            boundaries.append(position)
+    boundaries.append(size)
+    return [(begin, end) for (begin, end) in zip(boundaries, boundaries[1:]) if begin < end]
+
+
+class StreamingCorpus(Corpus):
+    """
+    A corpus that reads its documents lazily from disk instead of keeping them in memory,
+    suitable for document collections that don't fit in memory. Supports the same formats
+    as InMemoryCorpus, i.e., .txt, .json and .csv files with one document per line and .xml
+    files with <doc> nodes.
+
+    Document identifiers are assigned on a first-come first-serve basis in file order, so a
+    document gets the same identifier as with InMemoryCorpus. Iterating over the corpus is a
+    single sequential pass over the file. Random access is backed by an index of the byte
+    offset of each document, built the first time it's needed. The index is built by a cheap
+    pass that only classifies lines. If an executor is given, the file is split into byte
+    ranges aligned to line boundaries that are indexed in parallel, and the document
+    identifiers follow from concatenating the offsets of the ranges in file order.
+
+    Given the index, a range of documents maps to a byte range of the file, which is read
+    and parsed by whoever asks for it. A mapper hence only touches its own split.
+
+    Lines are split on any line break, like InMemoryCorpus does. A quoted field in a CSV file
+    may span several lines, so a CSV file is parsed by a single csv.DictReader from the start
+    of a document, and indexed by a sequential pass.
+
+    XML files are indexed by a single streaming parse that records where each <doc> node
+    starts. A byte range of <doc> nodes is parsed by wrapping it in a synthetic root element,
+    so this relies on the <doc> nodes being children of the root and on the file not using
+    entities declared in a DTD. If <doc> nodes are nested deeper, documents are instead read
+    by a sequential pass from the start of the file.
+    """
+
+    # The number of byte ranges per worker when the index is built in parallel.
+    _RANGES_PER_WORKER = 4
+
+    def __init__(self, filename: str, executor: Optional[Executor] = None):
+        if filename.endswith(".txt"):
+            self._parse_line, self._is_document = _parse_text_line, _is_text_document
+        elif filename.endswith(".json"):
+            self._parse_line, self._is_document = _parse_json_line, _is_json_document
+        elif not filename.endswith(".csv") and not filename.endswith(".xml"):
+            raise IOError("Unsupported extension")
+        self._filename = filename
+        self._executor = executor
+        self._is_xml = filename.endswith(".xml")
+        self._is_csv = filename.endswith(".csv")
+        self._fieldnames = None
+        self._offsets = None
+        self._xml_encoding = None
+        self._xml_children_of_root = True
+
+    def __iter__(self):
+        document_id = 0
+        for named_fields in self._read(0):
+            yield InMemoryDocument(document_id, named_fields)
+            document_id += 1
+
+    def size(self) -> int:
+        return len(self._get_offsets()) - 1
+
+    def get_document(self, document_id: int) -> Document:
+        assert 0 <= document_id < self.size()
+        return next(self.get_documents(document_id, document_id + 1))
+
+    def get_documents(self, start: int, stop: int) -> Iterator[Document]:
+        offsets = self._get_offsets()
+        assert 0 <= start <= stop < len(offsets)
+        if start == stop:
+            return
+        if self._is_xml and not self._xml_children_of_root:
+            yield from itertools.islice(self, start, stop)
+            return
+        document_id = start
+        for named_fields in self._read(offsets[start], offsets[stop]):
+            yield InMemoryDocument(document_id, named_fields)
+            document_id += 1
+
+    def get_document_sizes(self, fields: Iterable[str]) -> List[int]:
+        # The length of the document's line, including all fields, is good enough an estimate.
+        offsets = self._get_offsets()
+        return [offsets[i + 1] - offsets[i] for i in range(0, len(offsets) - 1)]
+
+    def _read_header(self, f) -> int:
+        """
+        Reads the CSV header, if any, and returns the byte offset of the first line after it.
+        """
+        if not self._is_csv:
+            return 0
+        position = 0
+
+        def lines():
+            nonlocal position
+            for offset, line in _read_lines(f, 0):
+                position = offset + len(line)
+                yield _decode_line(line)
+
+        self._fieldnames = next(csv.reader(lines()), [])
+        return position
+
+    def _read_csv(self, f, start: int, end: Optional[int]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Parses the CSV records that start in the byte range [start, end) of the file, the same
+        way csv.DictReader does, and yields the byte offset and named fields of each. The offset
+        of a record is that of the first line the reader consumed for it, i.e., blank lines
+        before a record belong to it.
+        """
+        consumed = []
+
+        def lines():
+            for offset, line in _read_lines(f, start):
+                consumed.append(offset)
+                yield _decode_line(line)
+
+        for row in csv.DictReader(lines(), fieldnames=self._fieldnames):
+            offset = consumed[0]
+            if end is not None and offset >= end:
+                return
+            del consumed[:]
+            yield offset, dict(row)
+
+    def _read(self, start: int, end: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Parses the documents in the byte range [start, end) of the file and yields their named
+        fields. The range must be aligned to line boundaries, see split_lines(), for CSV files
+        to the start of a record, and for XML files to the start of <doc> nodes.
+        """
+        if self._is_xml:
+            yield from self._read_xml(start, end)
+            return
+        with open(self._filename, mode="rb") as f:
+            start = max(start, self._read_header(f))
+            if self._is_csv:
+                yield from (named_fields for _, named_fields in self._read_csv(f, start, end))
+                return
+            for position, line in _read_lines(f, start):
+                if end is not None and position >= end:
+                    return
+                named_fields = self._parse_line(line.decode("utf-8"))
+                if named_fields is not None:
+                    yield named_fields
+
+    def _read_xml(self, start: int, end: Optional[int]) -> Iterator[Dict[str, Any]]:
+        with open(self._filename, mode="rb") as f:
+            if start == 0 and end is None:
+                for _, named_fields in _XmlDocumentReader().read(f):
+                    yield named_fields
+                return
+            f.seek(start)
+            reader = _XmlDocumentReader(self._xml_encoding)
+            yield from (named_fields for _, named_fields in reader.feed(b"<corpus>"))
+            yield from (named_fields for _, named_fields in reader.read(f, end - start, False))
+            yield from (named_fields for _, named_fields in reader.feed(b"</corpus>", True))
+
+    def _index_xml(self) -> array:
+        """
+        Returns the byte offsets of the <doc> nodes in the file, followed by the offset of the
+        root end tag. XML isn't line-oriented, so this is a single sequential pass.
+        """
+        reader = _XmlDocumentReader()
+        with open(self._filename, mode="rb") as f:
+            offsets = array("q", (offset for offset, _ in reader.read(f)))
+        offsets.append(reader.root_end_offset)
+        self._xml_encoding = reader.encoding
+        self._xml_children_of_root = reader.children_of_root
+        return offsets
+
+    def _index_csv(self) -> array:
+        """
+        Returns the byte offsets of the records in the file, followed by its size. A record
+        may span several lines, so this is a single sequential pass.
+        """
+        with open(self._filename, mode="rb") as f:
+            offsets = array("q", (offset for offset, _ in self._read_csv(f, self._read_header(f), None)))
+        offsets.append(os.path.getsize(self._filename))
+        return offsets
+
+    def _index_range(self, byte_range: Tuple[int, int]) -> array:
+        """
+        Returns the byte offsets of the documents in the given byte range of the file.
+        """
+        start, end = byte_range
+        offsets = array("q")
+        with open(self._filename, mode="rb") as f:
+            for position, line in _read_lines(f, start):
+                if position >= end:
+                    break
+                if self._is_document(line.decode("utf-8")):
+                    offsets.append(position)
+        return offsets
+
+    def _get_offsets(self) -> array:
+        """
+        Returns the byte offset of each document in the file, indexed by document identifier,
+        followed by the offset where the last document ends.
+        """
+        if self._offsets is None and self._is_xml:
+            self._offsets = self._index_xml()
+        if self._offsets is None and self._is_csv:
+            self._offsets = self._index_csv()
+        if self._offsets is None:
+            if self._executor is None:
+                ranges = split_lines(self._filename, 1)
+                indexed_ranges = [self._index_range(byte_range) for byte_range in ranges]
+            else:
+                ranges = split_lines(self._filename, self._executor.workers * self._RANGES_PER_WORKER)
+                indexed_ranges = self._executor.map(StreamingCorpus._index_range, ranges, self)
+            offsets = array("q")
+            for indexed_range in indexed_ranges:
+                offsets.extend(indexed_range)
+            offsets.append(os.path.getsize(self._filename))
+            self._offsets = offsets
+        return self._offsets
@@ -2,8 +2,13 @@
 # -*- coding: utf-8 -*-
 
 from abc import abstractmethod
+import bisect
 import collections.abc
-from typing import Optional
+import itertools
+from array import array
+from typing import Iterable, Iterator, Optional, Tuple
+
+from .postinglist import encode_varbyte
 
 
 class Dictionary(collections.abc.Iterable):
@@ -79,3 +84,144 @@ class InMemoryDictionary(Dictionary):
 
     def get_term_id(self, term: str) -> Optional[int]:
         return self._terms.get(term, None)
+
+
+class FrontCodedDictionary(Dictionary):
+    """
+    An immutable dictionary of a fixed vocabulary, built once indexing is done. The term
+    identifiers are the ranks of the terms in sorted order, so that all terms with a given
+    prefix have consecutive identifiers, see prefix().
+
+    The terms are stored front coded, in blocks of block_size terms: the first term of each
+    block is kept as is, in a sorted list that's binary searched, and each following term of
+    the block as the length of the prefix it shares with the previous term and the rest of
+    its UTF-8 encoding, in a single buffer. Sorting UTF-8 encoded strings gives the same order
+    as sorting the strings, so the lookups work on bytes. Sorted vocabularies share long
+    prefixes, so a term takes a few bytes instead of a string object and a hash table entry.
+
+    A lookup decodes up to half a block on average, so it's an order of magnitude slower than
+    in an InMemoryDictionary. The default block size is where benchmarks/dictionary.py shows
+    that larger blocks save little memory for much slower lookups.
+    """
+
+    def __init__(self, terms: Iterable[str], block_size: int = 8):
+        assert block_size > 0
+        self._block_size = block_size
+        self._heads = []
+        self._offsets = array("q", [0])
+        self._buffer = bytearray()
+        self._size = 0
+        previous = b""
+        for key in sorted(set(term.encode("utf-8") for term in terms)):
+            if self._size % block_size == 0:
+                self._heads.append(key)
+                self._offsets.append(len(self._buffer))
+            else:
+                shared = 0
+                for a, b in zip(previous, key):
+                    if a != b:
+                        break
+                    shared += 1
+                encode_varbyte(self._buffer, shared)
+                encode_varbyte(self._buffer, len(key) - shared)
+                self._buffer += key[shared:]
+                self._offsets[-1] = len(self._buffer)
+            previous = key
+            self._size += 1
+        self._buffer = bytes(self._buffer)
+
+    def __iter__(self):
+        for block in range(len(self._heads)):
+            for i, key in enumerate(self._get_block(block), block * self._block_size):
+                yield key.decode("utf-8"), i
+
+    def __repr__(self):
+        return str(dict(self))
+
+    def _get_block(self, block: int) -> Iterator[bytes]:
+        # Yields the terms of the block in order, starting with its head.
+        key = self._heads[block]
+        yield key
+        buffer = self._buffer
+        position, end = self._offsets[block], self._offsets[block + 1]
+        while position < end:
+            key, position = _decode_key(buffer, position, key)
+            yield key
+
+    # Returns the identifier of the first term that's not smaller than the key and that term,
+    # or the size of the dictionary and None if there's no such term.
+    def _lower_bound(self, key: bytes) -> Tuple[int, Optional[bytes]]:
+        if not self._heads:
+            return 0, None
+        block = max(bisect.bisect_right(self._heads, key) - 1, 0)
+        candidate = self._heads[block]
+        term_id = block * self._block_size
+        buffer = self._buffer
+        position, end = self._offsets[block], self._offsets[block + 1]
+        while candidate < key:
+            if position == end:
+                if block + 1 < len(self._heads):
+                    return term_id + 1, self._heads[block + 1]
+                return self._size, None
+            candidate, position = _decode_key(buffer, position, candidate)
+            term_id += 1
+        return term_id, candidate
+
+    def size(self) -> int:
+        return self._size
+
+    def add_if_absent(self, term: str) -> int:
+        term_id = self.get_term_id(term)
+        if term_id is None:
+            raise ValueError("Can't add a term to an immutable dictionary: " + term)
+        return term_id
+
+    def get_term_id(self, term: str) -> Optional[int]:
+        key = term.encode("utf-8")
+        term_id, candidate = self._lower_bound(key)
+        return term_id if candidate == key else None
+
+    def get_term(self, term_id: int) -> str:
+        """
+        Returns the term with the given identifier.
+        """
+        if not 0 <= term_id < self._size:
+            raise IndexError(term_id)
+        block, i = divmod(term_id, self._block_size)
+        return next(itertools.islice(self._get_block(block), i, None)).decode("utf-8")
+
+    def prefix(self, term: str) -> range:
+        """
+        Returns the identifiers of all terms that start with the given prefix, as a range,
+        e.g., to expand a wildcard query or suggest completions. The range is empty if there
+        are no such terms. The terms themselves are given by get_term().
+        """
+        key = term.encode("utf-8")
+        if not key:
+            return range(self._size)
+        # No UTF-8 encoding contains 0xFF, so incrementing the last byte gives the smallest key
+        # that's larger than every key with the prefix.
+        return range(self._lower_bound(key)[0], self._lower_bound(key[:-1] + bytes([key[-1] + 1]))[0])
+
+
+def _decode_key(buffer: bytes, position: int, previous: bytes) -> (bytes, int):
+    # Decodes the front coded key at the position, given the previous key, and returns it along
+    # with the position of the next key. The lengths nearly always fit in a single byte.
+    shared, length = buffer[position], buffer[position + 1]
+    if shared < 0x80 and length < 0x80:
+        position += 2
+    else:
+        shared, position = _decode_varbyte(buffer, position)
+        length, position = _decode_varbyte(buffer, position)
+    return previous[:shared] + buffer[position:position + length], position + length
+
+
+def _decode_varbyte(buffer: bytes, position: int) -> (int, int):
+    number = shift = 0
+    while True:
+        byte = buffer[position]
+        position += 1
+        number |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return number, position
+        shift += 7
@@ -0,0 +1,174 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import Executor as Pool
+from typing import Any, Callable, Iterable, List, Optional, Union
+from joblib import Parallel, delayed
+
+from .partitioning import Partitioner
+from .shuffle import Shuffle
+
+
+class Executor(ABC):
+    """
+    Abstract base class for the execution backends that run map and reduce tasks.
+
+    A task function is called as func(context, task). The context is the shared,
+    read-only state of a job (e.g., the corpus and the NLP configuration) and is
+    handed to each worker once, while tasks should be small and cheap to serialize,
+    e.g., ranges of document identifiers rather than lists of documents.
+    """
+
+    # Whether tasks run in other processes, so that tasks and results are copied through pipes.
+    separate_processes = False
+
+    def __init__(self, workers: int):
+        assert workers > 0
+        self._workers = workers
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    @abstractmethod
+    def map(self, func: Callable[[Any, Any], Any], tasks: Iterable[Any], context: Any) -> List[Any]:
+        """
+        Runs func(context, task) for every task and returns the results in task order.
+        """
+        pass
+
+    @abstractmethod
+    def open(self, context: Any) -> Pool:
+        """
+        Starts the workers for a job with the given context, for a caller that hands out tasks
+        one by one, see Scheduler. The pool's submit(func, task) runs func(context, task) on a
+        worker and returns a future of the result. The caller shuts the pool down.
+        """
+        pass
+
+    def shuffle(self, partitioner: Partitioner, memory_budget: Optional[int], directory: str) -> Shuffle:
+        """
+        Creates the shuffle for a job whose tasks run on this executor's workers. The runs go
+        through files in the given directory if the workers are separate processes.
+        """
+        return Shuffle(partitioner, memory_budget, directory, self.separate_processes)
+
+
+class SerialExecutor(Executor):
+    """
+    Runs all tasks one after another in the calling thread. Useful for debugging
+    and as a baseline when measuring how well the other backends scale.
+    """
+
+    def __init__(self, workers: int = 1):
+        super().__init__(workers)
+
+    def map(self, func: Callable[[Any, Any], Any], tasks: Iterable[Any], context: Any) -> List[Any]:
+        return [func(context, task) for task in tasks]
+
+    def open(self, context: Any) -> Pool:
+        return _InlinePool(context)
+
+
+class ThreadExecutor(Executor):
+    """
+    Runs tasks in a pool of threads using JobLib. Cheap to start and shares the
+    context for free, but pure-Python tasks are serialized by the GIL.
+
+    Tasks are dispatched one at a time, so an idle thread pulls the next task
+    instead of JobLib batching several tasks up front.
+    """
+
+    def map(self, func: Callable[[Any, Any], Any], tasks: Iterable[Any], context: Any) -> List[Any]:
+        return Parallel(n_jobs=self._workers, prefer="threads", backend="threading", batch_size=1)(
+            delayed(func)(context, task)
+            for task in tasks)
+
+    def open(self, context: Any) -> Pool:
+        return _ThreadPool(self._workers, context)
+
+
+# The context of the job currently running in a worker process.
+_process_context = None
+
+
+def _install_process_context(context: Any) -> None:
+    global _process_context
+    _process_context = context
+
+
+def _run_in_process(func: Callable[[Any, Any], Any], task: Any) -> Any:
+    return func(_process_context, task)
+
+
+class ProcessExecutor(Executor):
+    """
+    Runs tasks in a pool of worker processes, so that pure-Python tasks actually
+    run in parallel across cores.
+
+    The context is installed once per worker process when the pool starts. With the
+    fork start method it is inherited without being serialized at all. Only the task
+    function (by reference), the tasks and the results travel through pipes, so
+    these should be kept small. Tasks are queued in order and each idle worker
+    pulls the next one from the queue.
+    """
+
+    separate_processes = True
+
+    def map(self, func: Callable[[Any, Any], Any], tasks: Iterable[Any], context: Any) -> List[Any]:
+        with self.open(context) as pool:
+            futures = [pool.submit(func, task) for task in tasks]
+            return [future.result() for future in futures]
+
+    def open(self, context: Any) -> Pool:
+        return _ProcessPool(self._workers, context)
+
+
+class _InlinePool(Pool):
+    # Runs each task as it's submitted, in the calling thread.
+    def __init__(self, context: Any):
+        self._context = context
+
+    def submit(self, func: Callable[[Any, Any], Any], task: Any) -> Future:
+        future = Future()
+        try:
+            future.set_result(func(self._context, task))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class _ThreadPool(ThreadPoolExecutor):
+    def __init__(self, workers: int, context: Any):
+        super().__init__(max_workers=workers)
+        self._context = context
+
+    def submit(self, func: Callable[[Any, Any], Any], task: Any) -> Future:
+        return super().submit(func, self._context, task)
+
+
+class _ProcessPool(ProcessPoolExecutor):
+    def __init__(self, workers: int, context: Any):
+        super().__init__(max_workers=workers, initializer=_install_process_context, initargs=(context,))
+
+    def submit(self, func: Callable[[Any, Any], Any], task: Any) -> Future:
+        return super().submit(_run_in_process, func, task)
+
+
+def make_executor(backend: Union[str, Executor], workers: int) -> Executor:
+    """
+    Creates an executor for the named backend, one of "threading", "processes" or "serial".
+    An executor that is given instead of a name, e.g., a ClusterExecutor, is used as is.
+    """
+    if isinstance(backend, Executor):
+        return backend
+    elif backend == "threading":
+        return ThreadExecutor(workers)
+    elif backend == "processes":
+        return ProcessExecutor(workers)
+    elif backend == "serial":
+        return SerialExecutor(workers)
+    else:
+        raise ValueError("Unsupported backend: " + backend)
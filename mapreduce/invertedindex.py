@@ -1,17 +1,21 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-import itertools
 from abc import ABC, abstractmethod
+from array import array
 from collections import Counter
-from typing import Iterable, Iterator
+from typing import Iterable, Iterator, Optional, Sequence, Tuple, Union
 
-from .dictionary import InMemoryDictionary
+from .analysis import Analyzer
+from .dictionary import Dictionary, FrontCodedDictionary, InMemoryDictionary
 from .normalization import Normalizer
 from .tokenization import Tokenizer
 from .corpus import Corpus
+from .executor import Executor
 from .mapreducer import MapReducer
 from .posting import Posting
+from .postinglist import CompressedPostingList, IteratorPostingsCursor, PostingsCursor
+from .stats import JobListener, JobStats, PrintingListener
 
 
 
@@ -27,6 +31,14 @@ class InvertedIndex(ABC):
     def __contains__(self, term: str) -> bool:
         return self.get_document_frequency(term) > 0
 
+    @property
+    def generation(self) -> int:
+        """
+        Returns a number that changes whenever the contents of the index change, e.g., so that
+        caches know when to throw away what they hold. Indexes that never change return 0.
+        """
+        return 0
+
     @abstractmethod
     def get_terms(self, buffer: str) -> Iterator[str]:
         """
@@ -44,6 +56,14 @@ class InvertedIndex(ABC):
         """
         pass
 
+    def get_postings_cursor(self, term: str) -> PostingsCursor:
+        """
+        Returns a cursor over the term's associated posting list, for document-at-a-time
+        query processing. Implementations should override this with a cursor that can skip
+        ahead without visiting every posting.
+        """
+        return IteratorPostingsCursor(self.get_postings_iterator(term))
+
     @abstractmethod
     def get_document_frequency(self, term: str) -> int:
         """
@@ -51,6 +71,55 @@ class InvertedIndex(ABC):
         """
         pass
 
+    def get_term_bounds(self, term: str) -> Tuple[int, int]:
+        """
+        Returns the largest frequency of the term in a document and the smallest length of a
+        document that contains it, or (0, 0) if no document does, so that rankers can bound the
+        score of the term without reading its posting list, see RankedSearchEngine. A smallest
+        length of 0 means that it isn't known. Implementations should override this with the
+        numbers kept as the index is built, since this makes a pass over the posting list.
+        """
+        lengths = self.get_document_lengths()
+        max_term_frequency, min_document_length = 0, 0
+        for posting in self.get_postings_iterator(term):
+            max_term_frequency = max(max_term_frequency, posting.term_frequency)
+            length = lengths[posting.document_id]
+            min_document_length = length if min_document_length == 0 else min(min_document_length, length)
+        return max_term_frequency, min_document_length
+
+    @abstractmethod
+    def get_vocabulary(self) -> Iterator[str]:
+        """
+        Returns an iterator over all terms in the index, in no particular order.
+        """
+        pass
+
+    @abstractmethod
+    def get_document_lengths(self) -> Sequence[int]:
+        """
+        Returns the number of terms indexed for each document, indexed by document identifier,
+        e.g., for length normalization when ranking. The length of the sequence is taken to be
+        the number of documents in the indexed corpus.
+        """
+        pass
+
+    def save(self, directory: str) -> None:
+        """
+        Saves the index to the given directory in the binary format read by DiskInvertedIndex.
+        """
+        from .storage import save_index
+        save_index(self, directory)
+
+
+def _freeze_dictionary(terms: Iterable[str], front_coding: bool) -> Dictionary:
+    # Returns a dictionary of the finished vocabulary, with the terms numbered in sorted order.
+    if front_coding:
+        return FrontCodedDictionary(terms)
+    dictionary = InMemoryDictionary()
+    for term in sorted(terms):
+        dictionary.add_if_absent(term)
+    return dictionary
+
 
 class InMemoryInvertedIndex(InvertedIndex):
     """
@@ -58,20 +127,28 @@ class InMemoryInvertedIndex(InvertedIndex):
 
     In a serious application we'd have configuration to allow for field-specific NLP,
     scale beyond current memory constraints, have a positional index, and so on.
+
+    Once the index is built, the terms are numbered in sorted order. If front_coding is set,
+    they're kept in a FrontCodedDictionary, which takes about a tenth of the memory of a hash
+    table but makes each term lookup over ten times slower. It's for large vocabularies where
+    memory is tight.
     """
 
-    def __init__(self, corpus: Corpus, fields: Iterable[str], normalizer: Normalizer, tokenizer: Tokenizer):
+    def __init__(self, corpus: Corpus, fields: Iterable[str], normalizer: Normalizer, tokenizer: Tokenizer,
+                 front_coding: bool = False):
         self._corpus = corpus
         self._normalizer = normalizer
         self._tokenizer = tokenizer
+        self._analyzer = Analyzer(normalizer, tokenizer)
         self._posting_lists = []
         self._dictionary = InMemoryDictionary()
-        self._build_index(fields)
+        self._document_lengths = array("q", bytes(8 * len(corpus)))
+        self._build_index(fields, front_coding)
 
     def __repr__(self):
         return str({term: self._posting_lists[term_id] for (term, term_id) in self._dictionary})
 
-    def _build_index(self, fields: Iterable[str]) -> None:
+    def _build_index(self, fields: Iterable[str], front_coding: bool) -> None:
         for document in self._corpus:
 
             # Compute TF values for all unique terms in the document. Note that we
@@ -80,8 +157,9 @@ class InMemoryInvertedIndex(InvertedIndex):
             # contain 'foo' in the 'title' field") then we would have to keep
             # track of that, either as a synthetic term in the dictionary
             # (e.g., 'title.foo') or as extra data in the posting.
-            all_terms = itertools.chain.from_iterable(self.get_terms(document.get_field(f, "")) for f in fields)
-            term_frequencies = Counter(all_terms)
+            term_frequencies = Counter(self._analyzer.get_document_terms(document, fields))
+            document_length = sum(term_frequencies.values())
+            self._document_lengths[document.document_id] = document_length
 
             for (term, term_frequency) in term_frequencies.items():
 
@@ -90,65 +168,130 @@ class InMemoryInvertedIndex(InvertedIndex):
 
                 # Locate the posting list for this term.
                 if term_id >= len(self._posting_lists):
-                    self._posting_lists.extend(([] for _ in range(len(self._posting_lists) - term_id + 1)))
+                    self._posting_lists.extend((CompressedPostingList() for _ in range(len(self._posting_lists) - term_id + 1)))
                 posting_list = self._posting_lists[term_id]
 
                 # Append the posting to the posting list. The posting lists
                 # must be kept sorted so that we can efficiently traverse and
                 # merge them when querying the inverted index. Be paranoid and
                 # verify that iterating over documents in the corpus happens
-                # in ascending order by document identifiers.
-                assert len(posting_list) == 0 or posting_list[-1].document_id < document.document_id
-                posting_list.append(Posting(document.document_id, term_frequency))
+                # in ascending order by document identifiers. The posting list keeps track of the
+                # score bounds of the term as we go, see get_term_bounds().
+                assert posting_list.last_document_id < document.document_id
+                posting_list.append(document.document_id, term_frequency, document_length)
+
+        # The vocabulary is complete, so swap the dictionary for a sorted one, and order the
+        # posting lists by the new term identifiers.
+        dictionary = _freeze_dictionary((term for (term, _) in self._dictionary), front_coding)
+        self._posting_lists = [self._posting_lists[self._dictionary[term]] for (term, _) in dictionary]
+        self._dictionary = dictionary
 
     def get_terms(self, buffer: str) -> Iterator[str]:
-        return (self._normalizer.normalize(t) for t in self._tokenizer.strings(self._normalizer.canonicalize(buffer)))
+        return iter(self._analyzer.get_terms(buffer))
 
     def get_postings_iterator(self, term: str) -> Iterator[Posting]:
-        # In a serious application a postings list would be stored as a contiguous buffer
-        # storing compressed integers, and the iterator would facilitate loading this buffer
-        # from somewhere and decompressing the integers.
+        # The posting lists are stored as contiguous buffers of compressed integers, and
+        # the iterator decompresses the postings as we go, see CompressedPostingList.
         term_id = self._dictionary.get_term_id(term)
         return iter([]) if term_id is None else iter(self._posting_lists[term_id])
 
+    def get_postings_cursor(self, term: str) -> PostingsCursor:
+        term_id = self._dictionary.get_term_id(term)
+        return (self._posting_lists[term_id] if term_id is not None else CompressedPostingList()).cursor()
+
     def get_document_frequency(self, term: str) -> int:
-        # In a serious application we'd store this number explicitly, e.g., as part of the dictionary.
-        # That way, we can look up the document frequency without having to access the posting lists
-        # themselves. Imagine if the posting lists don't even reside in memory!
+        # The posting lists keep their length next to the compressed buffer. In a serious application
+        # we'd store this number as part of the dictionary, so that we can look up the document frequency
+        # without having to access the posting lists themselves. Imagine if they don't even reside in memory!
         term_id = self._dictionary.get_term_id(term)
         return 0 if term_id is None else len(self._posting_lists[term_id])
 
+    def get_term_bounds(self, term: str) -> Tuple[int, int]:
+        term_id = self._dictionary.get_term_id(term)
+        if term_id is None:
+            return 0, 0
+        posting_list = self._posting_lists[term_id]
+        return posting_list.max_term_frequency, posting_list.min_document_length
+
+    def get_vocabulary(self) -> Iterator[str]:
+        return (term for (term, _) in self._dictionary)
+
+    def get_document_lengths(self) -> Sequence[int]:
+        return self._document_lengths
+
 
 class MapReduceInvertedIndex(InvertedIndex):
     """
-    
+    An in-memory inverted index that is built with MapReduce semantics, see MapReducer.
+
+    The backend selects how the map and reduce tasks are executed: "threading",
+    "processes" or "serial", or an executor, e.g., a ClusterExecutor that runs the tasks on
+    workers on other machines. Only the process and cluster backends use several cores.
+    The job runs the given number of map and reduce tasks at a time. Its progress is
+    reported to the listener, if any, or printed if print_log is set, see JobListener.
+    If front_coding is set, the terms are kept in a FrontCodedDictionary, as for
+    InMemoryInvertedIndex.
     """
 
-    def __init__(self, corpus: Corpus, fields: Iterable[str], normalizer: Normalizer, tokenizer: Tokenizer):
+    def __init__(self, corpus: Corpus, fields: Iterable[str], normalizer: Normalizer, tokenizer: Tokenizer,
+                 backend: Union[str, Executor] = "threading", mappers: int = 4, reducers: int = 4,
+                 print_log: bool = False, listener: Optional[JobListener] = None, front_coding: bool = False):
         self._corpus = corpus
         self._normalizer = normalizer
         self._tokenizer = tokenizer
-        self._posting_lists = []
-        self._dictionary = InMemoryDictionary()
+        self._analyzer = Analyzer(normalizer, tokenizer)
+        self._backend = backend
+        self._mappers = mappers
+        self._reducers = reducers
+        self._listener = listener or (PrintingListener() if print_log else None)
+        self._front_coding = front_coding
         self._build_index(fields)
 
     def __repr__(self):
         return str({term: self._posting_lists[term_id] for (term, term_id) in self._dictionary})
 
+    @property
+    def stats(self) -> JobStats:
+        """
+        Returns the metrics of building the index. These are the phases of the MapReduce job,
+        see MapReducer.stats, followed by freezing the dictionary.
+        """
+        return self._stats
+
     def _build_index(self, fields: Iterable[str]) -> None:
        mapreducer = MapReducer(fields, self._corpus, self._normalizer, self._tokenizer)
-       mappers = 4
-       reducers = 4
-       print_info = True
-       self._posting_lists, self._dictionary._terms = mapreducer.mapreduce(mappers, reducers, print_info)
+       posting_lists, terms = mapreducer.mapreduce(self._mappers, self._reducers, False, self._backend,
+                                                   self._listener)
+       self._stats = mapreducer.stats
+       with self._stats.phase("freezing", self._listener):
+           self._dictionary = _freeze_dictionary(terms, self._front_coding)
+           self._posting_lists = [posting_lists[terms[term]] for (term, _) in self._dictionary]
+       self._document_lengths = mapreducer.document_lengths
 
     def get_terms(self, buffer: str) -> Iterator[str]:
-        return (self._normalizer.normalize(t) for t in self._tokenizer.strings(self._normalizer.canonicalize(buffer)))
+        return iter(self._analyzer.get_terms(buffer))
 
     def get_postings_iterator(self, term: str) -> Iterator[Posting]:
         term_id = self._dictionary.get_term_id(term)
         return iter([]) if term_id is None else iter(self._posting_lists[term_id])
 
+    def get_postings_cursor(self, term: str) -> PostingsCursor:
+        term_id = self._dictionary.get_term_id(term)
+        return (self._posting_lists[term_id] if term_id is not None else CompressedPostingList()).cursor()
+
     def get_document_frequency(self, term: str) -> int:
         term_id = self._dictionary.get_term_id(term)
         return 0 if term_id is None else len(self._posting_lists[term_id])
+
+    def get_term_bounds(self, term: str) -> Tuple[int, int]:
+        term_id = self._dictionary.get_term_id(term)
+        if term_id is None:
+            return 0, 0
+        posting_list = self._posting_lists[term_id]
+        return posting_list.max_term_frequency, posting_list.min_document_length
+
+    def get_vocabulary(self) -> Iterator[str]:
+        return (term for (term, _) in self._dictionary)
+
+    def get_document_lengths(self) -> Sequence[int]:
+        return self._document_lengths
@@ -0,0 +1,291 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import heapq
+import itertools
+import re
+from abc import ABC, abstractmethod
+from array import array
+from collections import Counter
+from typing import Any, Collection, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .analysis import Analyzer
+from .combining import Combiner, SumCombiner, TermFrequencyCombiner
+from .corpus import Document
+from .dictionary import InMemoryDictionary
+from .partitioning import HashPartitioner, Partitioner, RangePartitioner
+from .postinglist import CompressedPostingList
+from .shuffle import ShuffleWriter
+
+
+class Job(ABC):
+    """
+    Abstract base class for the jobs a MapReducer runs over the documents of a corpus, see
+    MapReducer.run(). The map function turns a document into (key, value) pairs, which are
+    shuffled as (key, document ID, value) records, optionally combined first, and partitioned
+    by key. The reduce function then gets the records of each key, sorted by document ID, and
+    the outputs of all reduce tasks are put together into the result of the job.
+
+    Keys are strings and values are integers, so that the records pack into flat runs that
+    are cheap to spill and to move between processes and machines, see PackedRun. Anything
+    else the job needs is kept by the job itself, which is sent to the workers along with the
+    corpus, so a job must be picklable, i.e., be an instance of a module-level class.
+
+    The splits of the corpus are sized by the length of the given fields.
+    """
+
+    def __init__(self, fields: Iterable[str], combiner: Optional[Combiner] = None,
+                 partitioner: Optional[Partitioner] = None):
+        self._fields = list(fields)
+        self._combiner = combiner
+        self._partitioner = partitioner or HashPartitioner()
+
+    @property
+    def fields(self) -> List[str]:
+        return self._fields
+
+    @property
+    def combiner(self) -> Optional[Combiner]:
+        return self._combiner
+
+    @property
+    def partitioner(self) -> Partitioner:
+        return self._partitioner
+
+    @abstractmethod
+    def map(self, document: Document) -> Collection[Tuple[str, int]]:
+        """
+        Returns the (key, value) pairs of a document.
+        """
+        pass
+
+    @abstractmethod
+    def reduce(self, key: str, pieces: List[Sequence[int]]) -> Any:
+        """
+        Returns the output for a key, or None if the key has no output, given its records as
+        pieces of alternating document IDs and values. The pieces are sorted by document ID,
+        and so is each piece, see records().
+        """
+        pass
+
+    @staticmethod
+    def records(pieces: List[Sequence[int]]) -> Iterator[Tuple[int, int]]:
+        """
+        Yields the (document ID, value) records of a key, given the pieces passed to reduce().
+        """
+        for piece in pieces:
+            for i in range(0, len(piece), 2):
+                yield piece[i], piece[i + 1]
+
+    def map_split(self, documents: Iterable[Document], writer: ShuffleWriter) -> Any:
+        """
+        Maps the documents of an input split, combines their records if the job has a
+        combiner, and adds them to the writer. Returns what the split adds to the result
+        besides its records, which is passed on to finish(), by default None. Jobs can
+        override this to map a whole split at a time.
+        """
+        combiner = self._combiner
+        if combiner is not None and not combiner.per_document:
+            keyvals = []
+            for document in documents:
+                document_id = document.document_id
+                keyvals.extend((key, document_id, value) for key, value in self.map(document))
+            writer.add(combiner.combine(keyvals))
+            return None
+        for document in documents:
+            document_id = document.document_id
+            pairs = self.map(document)
+            if combiner is not None:
+                pairs = [(key, value) for key, _, value in
+                         combiner.combine([(key, document_id, value) for key, value in pairs])]
+            writer.add_document(document_id, pairs)
+        return None
+
+    def prepare_reduce(self, splits: List[Any]) -> None:
+        """
+        Called once every split is mapped and before any partition is reduced, given what
+        map_split() returned for each split, in order. The job goes to the reducers after this,
+        so it can keep what it needs for reducing. Does nothing by default.
+        """
+        pass
+
+    def reduce_partition(self, merged: Iterator[Tuple[str, List[Sequence[int]]]]) -> Any:
+        """
+        Reduces the keys of a partition, given in sorted order along with the pieces of their
+        records from every run, see Shuffle.merge(). Returns the (key, output) pairs of the
+        partition by default.
+        """
+        outputs = []
+        for key, pieces in merged:
+            if len(pieces) > 1:
+                pieces.sort(key=lambda piece: piece[0])
+            output = self.reduce(key, pieces)
+            if output is not None:
+                outputs.append((key, output))
+        return outputs
+
+    def size(self, output: Any) -> int:
+        """
+        Returns the number of keys in the output of reduce_partition(), for the job's metrics.
+        """
+        return len(output)
+
+    def finish(self, outputs: List[Any], splits: List[Any]) -> Any:
+        """
+        Puts the outputs of the partitions together into the result of the job, given what
+        map_split() returned for each split, in order. By default, the result is the list of
+        (key, output) pairs of every partition, sorted by key.
+        """
+        return list(heapq.merge(*outputs, key=lambda pair: pair[0]))
+
+
+class InvertedIndexJob(Job):
+    """
+    Builds an inverted index. The keys are the terms of the given fields and the values are
+    their frequencies in each document. The result is the posting lists of the terms, the
+    position of each term's posting list by term, and the number of terms in each document.
+    """
+
+    def __init__(self, fields: Iterable[str], analyzer: Analyzer,
+                 combiner: Optional[Combiner] = TermFrequencyCombiner(), partitioner: Optional[Partitioner] = None):
+        super().__init__(fields, combiner, partitioner)
+        self._analyzer = analyzer
+        self._document_lengths = None
+
+    def map(self, document: Document) -> Collection[Tuple[str, int]]:
+        return Counter(self._analyzer.get_document_terms(document, self._fields)).items()
+
+    # Terms are not counted here, each occurrence gets a term frequency of 1,
+    # but the combiner may collapse them per document or per split.
+    # Records are only built as tuples for a combiner that runs per split, otherwise the terms
+    # of a document go straight to the shuffle writer, which partitions and packs them into runs
+    # of integers on the mapper, see Shuffle.
+    # Along with the records, the split returns the number of terms in each of its documents.
+    def map_split(self, documents: Iterable[Document], writer: ShuffleWriter) -> array:
+        combiner = self._combiner
+        combine_split = combiner is not None and not combiner.per_document
+        keyvals = []
+        lengths = array("q")
+        for doc in documents:
+            document_id = doc.document_id
+            terms = self._analyzer.get_document_terms(doc, self._fields)
+            lengths.append(len(terms))
+            if combine_split:
+                keyvals.extend((term, document_id, 1) for term in terms)
+            elif combiner:
+                writer.add_document(document_id, combiner.combine_document(document_id, terms))
+            else:
+                writer.add_document(document_id, [(term, 1) for term in terms])
+        if combine_split:
+            writer.add(combiner.combine(keyvals))
+        return lengths
+
+    # Keep the number of terms in each document, so that the reducers can record the shortest
+    # document of each posting list, for ranking, see CompressedPostingList.min_document_length.
+    def prepare_reduce(self, splits: List[Any]) -> None:
+        self._document_lengths = array("q", itertools.chain.from_iterable(splits))
+
+    # The records of a run are sorted by document ID, and the runs of a term cover consecutive
+    # ranges of documents, so the pieces give a posting list sorted by document ID, which
+    # CompressedPostingList.extend() asserts. Without a combiner, the records of a document are
+    # next to each other and summed up.
+    def reduce(self, key: str, pieces: List[Sequence[int]]) -> CompressedPostingList:
+        posting_list = CompressedPostingList()
+        for piece in pieces:
+            posting_list.extend(piece, self._document_lengths)
+        return posting_list
+
+    # Produce the complete posting lists of the terms in this partition, and a term ID
+    # dictionary for the terms in this partition.
+    def reduce_partition(self, merged: Iterator[Tuple[str, List[Sequence[int]]]]) -> (list, InMemoryDictionary):
+        dictionary = InMemoryDictionary()
+        posting_lists = []
+        for term, pieces in merged:
+            dictionary.add_if_absent(term)
+            if len(pieces) > 1:
+                pieces.sort(key=lambda piece: piece[0])
+            posting_lists.append(self.reduce(term, pieces))
+        return posting_lists, dictionary
+
+    def size(self, output: Any) -> int:
+        return len(output[0])
+
+    # Combine the dictionaries from each reduced partition and join the posting lists.
+    # The term ID of a posting list must be offset by the posting lists from other
+    # partitions before it. A term that the partitioner split by document ID ranges has
+    # a posting list in several partitions, and these are joined in document ID order.
+    def finish(self, outputs: List[Any], splits: List[Any]) -> (list, dict, array):
+        combined_posting_lists = []
+        combined_dictionary = {}
+
+        for posting_lists, dictionary in outputs:
+            for term, term_id in dictionary:
+                combined_term_id = combined_dictionary.get(term)
+                if combined_term_id is None:
+                    combined_dictionary[term] = len(combined_posting_lists)
+                    combined_posting_lists.append(posting_lists[term_id])
+                else:
+                    pieces = [combined_posting_lists[combined_term_id], posting_lists[term_id]]
+                    pieces.sort(key=lambda posting_list: posting_list.last_document_id)
+                    combined_posting_lists[combined_term_id] = CompressedPostingList.concatenate(pieces)
+
+        return combined_posting_lists, combined_dictionary, array("q", itertools.chain.from_iterable(splits))
+
+
+class WordCountJob(Job):
+    """
+    Counts the occurrences of each term in the given fields. The result is a list of
+    (term, count) pairs sorted by term. The counts of each split are summed up on the mapper.
+    """
+
+    def __init__(self, fields: Iterable[str], analyzer: Analyzer, partitioner: Optional[Partitioner] = None):
+        super().__init__(fields, SumCombiner(), partitioner)
+        self._analyzer = analyzer
+
+    def map(self, document: Document) -> Collection[Tuple[str, int]]:
+        return Counter(self._analyzer.get_document_terms(document, self._fields)).items()
+
+    def reduce(self, key: str, pieces: List[Sequence[int]]) -> int:
+        return sum(sum(piece[1::2]) for piece in pieces)
+
+
+class GrepJob(Job):
+    """
+    Finds the lines of a field that match a regular expression. The result is a list of
+    (document ID, line number, line) triples, in order, where lines are numbered from 0.
+    """
+
+    def __init__(self, pattern: str, field: str = "body", flags: int = 0):
+        super().__init__([field])
+        self._regex = re.compile(pattern, flags)
+
+    def map(self, document: Document) -> Collection[Tuple[str, int]]:
+        lines = document.get_field(self._fields[0], "").splitlines()
+        return [(line, line_number) for line_number, line in enumerate(lines) if self._regex.search(line)]
+
+    def reduce(self, key: str, pieces: List[Sequence[int]]) -> List[Tuple[int, int]]:
+        return list(self.records(pieces))
+
+    def finish(self, outputs: List[Any], splits: List[Any]) -> List[Tuple[int, int, str]]:
+        return sorted((document_id, line_number, line)
+                      for line, matches in super().finish(outputs, splits) for document_id, line_number in matches)
+
+
+class SortJob(Job):
+    """
+    Sorts the documents by the value of a field, ties by document ID. The result is the list
+    of document IDs in that order. The partitions are ranges of values, see RangePartitioner,
+    so that each reducer sorts a slice of the result.
+    """
+
+    def __init__(self, field: str, partitioner: Optional[Partitioner] = None):
+        super().__init__([field], partitioner=partitioner or RangePartitioner())
+
+    def map(self, document: Document) -> Collection[Tuple[str, int]]:
+        return [(str(document.get_field(self._fields[0], "")), 0)]
+
+    def reduce(self, key: str, pieces: List[Sequence[int]]) -> List[int]:
+        return [document_id for document_id, _ in self.records(pieces)]
+
+    def finish(self, outputs: List[Any], splits: List[Any]) -> List[int]:
+        return [document_id for _, document_ids in super().finish(outputs, splits) for document_id in document_ids]
@@ -1,126 +1,281 @@
 import itertools
-from typing import Iterable, Iterator
-from joblib import Parallel, delayed
+import tempfile
+from array import array
+from collections import Counter
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple, Union
 
-from .corpus import Document, Corpus, InMemoryDocument, InMemoryCorpus
-from .normalization import Normalizer, BrainDeadNormalizer
-from .tokenization import Tokenizer,  BrainDeadTokenizer
-from .dictionary import InMemoryDictionary
-from .posting import Posting
+from .corpus import Corpus
+from .normalization import Normalizer
+from .tokenization import Tokenizer
+from .analysis import Analyzer
+from .executor import Executor, make_executor
+from .splitting import plan_splits
+from .combining import Combiner, TermFrequencyCombiner
+from .shuffle import Run, Shuffle
+from .partitioning import Partitioner
+from .scheduler import Scheduler
+from .jobs import Job, InvertedIndexJob
+from .pipeline import Stage, batches, read_ahead
+from .stats import JobListener, JobStats, MeasuredTask, PhaseStats, PrintingListener, TaskStats
 
 
 class MapReducer:
-    def __init__(self, fields : Iterable[str], corpus: Corpus, normalizer: Normalizer, tokenizer: Tokenizer):
+    # The input splits are sized by content, aiming for splits_per_mapper splits per mapper
+    # but never making a split smaller than min_split_size characters, see plan_splits().
+    # The fields, combiner and partitioner are those of the inverted index built by mapreduce(), other jobs bring
+    # their own, see run(). The combiner runs on the mappers before partitioning, or not at all if None.
+    # If a memory budget (in bytes per map task) is given, the mappers spill their intermediate
+    # records to sorted runs in a temporary directory below spill_directory, see Shuffle.
+    # With the processes backend, the mappers write all their runs there for the reducers to map
+    # into memory, instead of sending them through pipes. The directory is removed with every
+    # run file in it when the job ends, also if it fails.
+    # The partitioner decides which reducer gets each record, by default a stable hash of the term.
+    # A task that fails is retried up to max_attempts times in all. If speculation is given, a task that runs that
+    # many times longer than the median task of its phase, and at least speculation_delay seconds, gets a backup
+    # copy, see Scheduler. That only pays off with spare cores, i.e., with the processes or cluster backends.
+    # If a batch size (in characters) is given, the corpus isn't split up front. Instead, the map phase runs as a
+    # pipeline over batches of documents of about that size, as they're read, and the runs of every merge_factor
+    # consecutive batches are pre-merged while mapping goes on, see _pipeline().
+    # Unless measure_tasks is False, the wall time, CPU time and peak memory of every task are measured, see
+    # MeasuredTask. The records and attempts of the tasks are counted either way.
+    def __init__(self, fields : Iterable[str], corpus: Corpus, normalizer: Normalizer, tokenizer: Tokenizer,
+                 splits_per_mapper: int = 4, min_split_size: int = 16 * 1024,
+                 combiner: Optional[Combiner] = TermFrequencyCombiner(),
+                 memory_budget: Optional[int] = None, spill_directory: Optional[str] = None,
+                 partitioner: Optional[Partitioner] = None, max_attempts: int = 3,
+                 speculation: Optional[float] = None, speculation_delay: float = 1.0,
+                 batch_size: Optional[int] = None, merge_factor: int = 8, measure_tasks: bool = True):
         self._fields = fields
         self._corpus = corpus
         self._normalizer = normalizer
         self._tokenizer = tokenizer
+        self._analyzer = Analyzer(normalizer, tokenizer)
+        self._splits_per_mapper = splits_per_mapper
+        self._min_split_size = min_split_size
+        self._memory_budget = memory_budget
+        self._spill_directory = spill_directory
+        self._max_attempts = max_attempts
+        self._speculation = speculation
+        self._speculation_delay = speculation_delay
+        self._batch_size = batch_size
+        self._merge_factor = merge_factor
+        self._measure_tasks = measure_tasks
+        self._index_job = InvertedIndexJob(fields, self._analyzer, combiner, partitioner)
+        self._job = self._index_job
+        self._document_lengths = array("q")
+        self._stats = JobStats()
     
-    # Build an inverted index with MapReduce semantics.
-    def mapreduce(self, mappers: int, reducers: int, print_log: bool) -> (list, dict):
-        self._print_log("Starting splitting...", print_log)
-        document_split = self._split(self._corpus._documents, mappers)
-        self._print_log("Finished splitting!", print_log)
-
-        self._print_log("Starting mapping...", print_log)
-        keyvals_list = self._parallelize(self._map, document_split, mappers)
-        self._print_log("Finished mapping!", print_log)
-
-        self._print_log("Starting partitioning...", print_log)
-        parts = self._partition(keyvals_list, reducers)
-        self._print_log("Finished partitioning!", print_log)
-       
-        self._print_log("Starting reducing...", print_log)
-        reduced_parts = self._parallelize(self._reduce, parts, reducers)
-        self._print_log("Finished reducing!", print_log)
-
-        self._print_log("Starting combining...", print_log)
-        combined_parts = self._combine(reduced_parts)
-        self._print_log("Finished combining!", print_log)
-
-        return combined_parts
-    
+    # The number of terms indexed for each document by the last job, indexed by document ID.
+    # The mappers count these as they go, so that ranking doesn't need another pass over the corpus.
+    @property
+    def document_lengths(self) -> array:
+        return self._document_lengths
+
+    # The metrics of the last job, see JobStats.
+    @property
+    def stats(self) -> JobStats:
+        return self._stats
+
+    # Build an inverted index with MapReduce semantics, see InvertedIndexJob.
+    # The backend selects how map and reduce tasks are executed, see make_executor(). It's either the name of a
+    # backend or an executor, e.g., a ClusterExecutor for workers on other machines.
+    # The listener, if any, is told about the progress of the job, see JobListener. With print_log and
+    # no listener, the progress is printed.
+    def mapreduce(self, mappers: int, reducers: int, print_log: bool, backend: Union[str, Executor] = "threading",
+                  listener: Optional[JobListener] = None) -> (list, dict):
+        listener = listener or (PrintingListener() if print_log else None)
+        posting_lists, dictionary, self._document_lengths = self.run(self._index_job, mappers, reducers, backend,
+                                                                     listener)
+        return posting_lists, dictionary
+
+    # Run a job over the corpus with the given number of mappers and reducers, and return its result, see Job.
+    # The job is carried to the workers by the MapReducer, as the context of every task, so it must be picklable.
+    # The splitting, spilling, shuffling, scheduling and metrics are the same for every job.
+    def run(self, job: Job, mappers: int, reducers: int, backend: Union[str, Executor] = "threading",
+            listener: Optional[JobListener] = None) -> Any:
+        self._job = job
+        self._stats = stats = JobStats()
+        with tempfile.TemporaryDirectory(prefix="mapreduce-", dir=self._spill_directory,
+                                         ignore_cleanup_errors=True) as directory:
+            with stats.phase("splitting", listener):
+                document_split = self._split(mappers) if self._batch_size is None else None
+                job.partitioner.fit(reducers, self._sample(job.partitioner.sample_size))
+                map_executor = make_executor(backend, mappers)
+                shuffle = map_executor.shuffle(job.partitioner, self._memory_budget, directory)
+
+            try:
+                if document_split is None:
+                    runs_list = self._pipeline(map_executor, make_executor(backend, reducers), shuffle, listener)
+                else:
+                    with stats.phase("mapping", listener) as phase:
+                        map_tasks = [(split, shuffle) for split in document_split]
+                        runs_list = self._parallelize(MapReducer._map, map_tasks, map_executor, phase, listener,
+                                                      lambda i, result: (len(document_split[i]), sum(result[1])))
+
+                with stats.phase("partitioning", listener):
+                    splits = [split_output for _, _, split_output in runs_list]
+                    job.prepare_reduce(splits)
+                    parts, stats.partition_records = self._partition(runs_list, reducers)
+                    stats.partition_bytes = [sum(map(Shuffle.size, part)) for part in parts]
+
+                with stats.phase("reducing", listener) as phase:
+                    reduced_parts = self._parallelize(MapReducer._reduce, parts, make_executor(backend, reducers),
+                                                      phase, listener,
+                                                      lambda i, result: (stats.partition_records[i], job.size(result)))
+            finally:
+                shuffle.discard()
+
+        with stats.phase("combining", listener):
+            return job.finish(reduced_parts, splits)
+
+    # Split the corpus into parts of roughly equal size, estimated by the length of the job's fields.
+    # A part is a range of document IDs, which is cheap to hand to another process, and the mapper
+    # reads the documents of its part through Corpus.get_documents().
+    def _split(self, mappers: int) -> list:
+        sizes = self._corpus.get_document_sizes(self._job.fields)
+        return plan_splits(sizes, mappers * self._splits_per_mapper, self._min_split_size)
+
+
+    # Create the records of evenly spaced documents, for partitioners that need a sample.
+    # The records are those the job maps the documents to, before combining.
+    def _sample(self, sample_size: int) -> list:
+        if sample_size == 0:
+            return []
+        step = max(len(self._corpus) // sample_size, 1)
+        records = []
+        for document_id in range(0, len(self._corpus), step)[:sample_size]:
+            for doc in self._corpus.get_documents(document_id, document_id + 1):
+                records.extend((key, doc.document_id, value) for key, value in self._job.map(doc))
+        return records
+
 
-    # Print log if desired.
-    def _print_log(self, log_line, print_log):
-        if print_log:
-            print(log_line)
-
-    # Split the corpus into a number of equal sized parts.
-    def _split(self, elements, stride):
-        parts = []
-        for i in range(0, len(elements), stride):
-            parts.append(elements[i:i + stride])
-        return parts
-        
-
-    # Run the function func on each part in parts.
-    # JobLib will perform the function calls in parallel threads.
-    # This becomes very slow for a large number of parts.
-    def _parallelize(self, func: callable, parts: list, total_parts: int) -> list:
-        return Parallel(n_jobs=total_parts, prefer="threads", backend="threading")(
-            delayed(func)(part)
-            for part in parts)
-
-
-    # Helper function to normalize and tokenize a buffer. 
-    def _get_terms(self, buffer: str) -> Iterator[str]:
-        return (self._normalizer.normalize(t) for t in self._tokenizer.strings(self._normalizer.canonicalize(buffer)))
-
-
-    # Create (key, value) tuples for each term in a document.
-    # The term is the key and the document ID is the value.
-    # Terms are not counted in any way here. 
-    def _map(self, docs: list) -> list:
-        keyvals = []
-        for doc in docs:
-            for field in self._fields:
-                for term in self._get_terms(doc[field]):
-                    keyvals.append((term, doc.document_id))
-        return keyvals
-
-
-    # Partition the (key, value) pairs into a number of partitions.
-    # The terms are partitioned based on a modulated hash of each term.
+    # Run the function func on each part in parts using the given executor, and record the metrics of each task.
+    # The MapReducer itself is the context of each task, so func is called as func(self, part).
+    # The parts are handed out one at a time by a Scheduler, so an idle worker pulls the next part
+    # while a slow one is still busy, and failed or straggling parts are run again.
+    # Given the index of a task and its result, count returns the number of records the task read and wrote.
+    def _parallelize(self, func: callable, parts: list, executor: Executor, phase: PhaseStats,
+                     listener: Optional[JobListener], count: Callable[[int, Any], Tuple[int, int]]) -> list:
+        scheduler = Scheduler(executor, self._max_attempts, self._speculation, self._speculation_delay)
+        results = []
+        measured = MeasuredTask(func, self._measure_tasks)
+        for i, (result, wall, cpu, memory) in enumerate(scheduler.map(measured, parts, self)):
+            self._task_finished(phase, listener, TaskStats(phase.name, i, wall, cpu, *count(i, result), memory,
+                                                           scheduler.attempts[i]))
+            results.append(result)
+        return results
+
+
+    # Record the metrics of a task of the phase, and tell the listener, if any.
+    def _task_finished(self, phase: PhaseStats, listener: Optional[JobListener], task: TaskStats) -> None:
+        phase.tasks.append(task)
+        if listener:
+            listener.task_finished(self._stats, task)
+
+
+    # Run the map phase as a pipeline: a reader thread cuts the corpus into batches of documents as it reads them,
+    # at most one batch per mapper ahead of the mappers, and each batch is mapped as soon as a mapper is free.
+    # The runs of a batch go to their partitions as soon as it's mapped, and once merge_factor consecutive batches
+    # are mapped, their runs of each partition are pre-merged into one on the reducers' workers while mapping goes
+    # on, see Shuffle.concatenate(). The reducers thus start from a few large runs per partition. If mapping gets
+    # ahead of the merges, it waits for them, since the merge tasks are handed over through a bounded queue.
+    # Returns the output of the map tasks like the barrier map phase, with the pre-merged runs in place of
+    # the runs they merged.
+    def _pipeline(self, map_executor: Executor, merge_executor: Executor, shuffle: Shuffle,
+                  listener: Optional[JobListener]) -> list:
+        runs_list = []
+        batch_sizes = []
+        merges = []
+        mapped = Counter()
+        map_scheduler = Scheduler(map_executor, self._max_attempts, self._speculation, self._speculation_delay)
+        merge_scheduler = Scheduler(merge_executor, self._max_attempts, self._speculation, self._speculation_delay)
+
+        def read():
+            for batch in read_ahead(batches(self._corpus, self._job.fields, self._batch_size), map_executor.workers):
+                batch_sizes.append(len(batch))
+                yield batch, shuffle
+
+        # Runs in the merging stage's thread, which only replaces the merged runs and measures the tasks.
+        def merge(tasks: Iterator) -> list:
+            merged = []
+            measured = MeasuredTask(MapReducer._merge, self._measure_tasks)
+            for i, (run, wall, cpu, memory) in merge_scheduler.imap(measured, tasks, self):
+                partition_runs, records = merges[i]
+                partition_runs[0][:] = [run]
+                for runs in partition_runs[1:]:
+                    runs.clear()
+                merged.append(TaskStats("merging", i, wall, cpu, records, records, memory, merge_scheduler.attempts[i]))
+            return merged
+
+        merging = Stage(merge, merge_executor.workers)
+        try:
+            with self._stats.phase("mapping", listener) as phase:
+                measured = MeasuredTask(MapReducer._map, self._measure_tasks)
+                for i, (result, wall, cpu, memory) in map_scheduler.imap(measured, read(), self):
+                    runs_list.extend([None] * (i + 1 - len(runs_list)))
+                    runs_list[i] = result
+                    self._task_finished(phase, listener, TaskStats(phase.name, i, wall, cpu, batch_sizes[i],
+                                                                   sum(result[1]), memory, map_scheduler.attempts[i]))
+                    block = i // self._merge_factor
+                    mapped[block] += 1
+                    if mapped[block] == self._merge_factor:
+                        block_runs = runs_list[block * self._merge_factor:(block + 1) * self._merge_factor]
+                        for partition in range(shuffle.partitions):
+                            partition_runs = [runs[partition] for runs, _, _ in block_runs]
+                            if sum(map(len, partition_runs)) > 1:
+                                merges.append((partition_runs, sum(records[partition] for _, records, _ in block_runs)))
+                                merging.put((list(itertools.chain.from_iterable(partition_runs)), shuffle))
+        except BaseException:
+            try:
+                merging.close()
+            except BaseException:
+                pass
+            raise
+
+        # The merges mostly ran while mapping, this is only the time it takes the last ones to finish.
+        with self._stats.phase("merging", listener) as phase:
+            for task in merging.close():
+                self._task_finished(phase, listener, task)
+        return runs_list
+
+
+    # Map the documents of a split with the job, which adds their records to a shuffle writer, see Job.map_split().
+    # A split is a range of document IDs, or a batch of documents read by the pipeline, see _pipeline().
+    # The writer partitions and packs the records into runs of integers on the mapper, see Shuffle.
+    # Along with the runs, the mapper returns the number of records of each partition and what the job
+    # returned for the split, e.g., the number of terms in each of its documents.
+    def _map(self, task: (Union[range, list], Shuffle)) -> list:
+        documents, shuffle = task
+        if isinstance(documents, range):
+            documents = self._corpus.get_documents(documents.start, documents.stop)
+        writer = shuffle.writer()
+        output = self._job.map_split(documents, writer)
+        return writer.close(), writer.records, output
+
+
+    # Gather the runs of each partition from the output of all mappers, and count the records of each partition.
+    # The records are partitioned by the partitioner on the mappers, see Partitioner.
     # Hashing each term ensures all key/val pairs of that term are put in the same partition.
-    # This will probably result in a non-optimal distribution of terms with high frequency. 
-    def _partition(self, keyvals_list: list, total_parts: int) -> list:
+    # This gives a poor distribution of terms with high frequency, unless they are split, see SampledPartitioner.
+    def _partition(self, runs_list: list, total_parts: int) -> (list, list):
         parts = [[] for i in range(0, total_parts)]
-        for keyvals in keyvals_list:
-            for term, doc_id in keyvals:
-                parts[hash(term) % total_parts].append((term, doc_id))
-        return parts
-
-
-    # Reduce the (key, value) pairs into posting lists.
-    # This step will produce complete posting lists for each term in this partition.
-    # It will also produce a term ID dictionary for each term in this partition.
-    def _reduce(self, partition: list) -> (list, dict):
-        dictionary = InMemoryDictionary()
-        posting_lists = []
-
-        for term, doc_id in partition:
-            term_id = dictionary.add_if_absent(term)
-            posting_lists.extend([] for i in range(len(posting_lists), term_id+1))
-
-            posting = next((p for p in posting_lists[term_id] if p.document_id == doc_id), None)
-            if posting:
-                posting.term_frequency += 1
-            else:
-                posting_lists[term_id].append(Posting(doc_id, 1))
-        return posting_lists, dictionary
+        loads = [0] * total_parts
+        for runs, records, _ in runs_list:
+            for partition, partition_runs in enumerate(runs):
+                parts[partition].extend(partition_runs)
+                loads[partition] += records[partition]
+        return parts, loads
 
 
-    # Combine the dictionaries from each reduced partition and join the posting lists.
-    # The term ID of a posting list must be offset by the posting lists from other
-    # partitions before it.
-    def _combine(self, reduced_parts : list) -> (list, dict):
-        combined_posting_lists = []
-        combined_dictionary = {}
+    # Merge the runs of a partition from consecutive map tasks into one, written like the runs of a map task.
+    def _merge(self, task: (list, Shuffle)) -> Run:
+        runs, shuffle = task
+        run = Shuffle.concatenate(runs)
+        return shuffle.write_run(run) if shuffle.shared else run
 
-        for posting_lists, dictionary in reduced_parts:
-            for term, term_id in dictionary:
-                combined_dictionary[term] = len(combined_posting_lists) + term_id
-            combined_posting_lists.extend(posting_lists)
 
-        return combined_posting_lists, combined_dictionary
+    # Reduce the records of a partition with the job, see Job.reduce_partition().
+    # Merging the runs of the partition yields the keys in sorted order, each with its records
+    # from every run that has it.
+    def _reduce(self, runs: list) -> Any:
+        return self._job.reduce_partition(Shuffle.merge(runs))
@@ -0,0 +1,195 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import bisect
+import math
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from typing import Iterable, Tuple
+
+
+class Partitioner(ABC):
+    """
+    Abstract base class for partitioners, which decide what reducer each intermediate
+    (term, document ID, term frequency) record goes to.
+
+    The MapReducer calls fit() once per job before mapping, with the number of partitions
+    and a sample of the records, and then hands the partitioner to the mappers. The answer
+    for a record must hence be the same in every worker process. A partitioner may spread
+    the records of a term over several partitions, as long as every partition receives whole
+    documents, since the posting lists of a term are joined again when combining.
+    """
+
+    # The number of documents the partitioner wants to see records of in fit(), if any.
+    sample_size = 0
+
+    def __init__(self):
+        self._partitions = 1
+
+    @property
+    def partitions(self) -> int:
+        return self._partitions
+
+    def fit(self, partitions: int, sample: Iterable[Tuple[str, int, int]]) -> None:
+        """
+        Prepares the partitioner for a job with the given number of partitions, given the
+        records of the sampled documents.
+        """
+        assert partitions > 0
+        self._partitions = partitions
+
+    @abstractmethod
+    def get_partition(self, term: str, document_id: int) -> int:
+        """
+        Returns the partition that the record with the given term and document ID belongs to.
+        """
+        pass
+
+    def is_split(self, term: str) -> bool:
+        """
+        Returns whether the records of the term may go to different partitions depending on
+        their document IDs. If not, the mappers only ask for the partition of a term once.
+        """
+        return False
+
+
+class HashPartitioner(Partitioner):
+    """
+    Partitions records by a hash of the term, so all records of a term go to the same
+    partition. Python's built-in string hash is randomized per process, so this uses a
+    stable hash that gives the same answer in every worker process and every run.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._cache = {}
+
+    def __getstate__(self):
+        # The cache is rebuilt in each worker, there's no need to ship it along with every task.
+        state = self.__dict__.copy()
+        state["_cache"] = {}
+        return state
+
+    def fit(self, partitions: int, sample: Iterable[Tuple[str, int, int]]) -> None:
+        super().fit(partitions, sample)
+        self._cache = {}
+
+    def get_partition(self, term: str, document_id: int) -> int:
+        partition = self._cache.get(term)
+        if partition is None:
+            partition = self._cache[term] = self._hash(term)
+        return partition
+
+    def _hash(self, term: str) -> int:
+        return zlib.crc32(term.encode("utf-8")) % self._partitions
+
+
+class SampledPartitioner(HashPartitioner):
+    """
+    Partitions records based on a sample of the corpus. The most frequent terms in the sample
+    are placed explicitly, largest first, on the least loaded partition, while the long tail
+    of other terms is partitioned by a hash of the term. Heavy hitters, i.e., terms whose
+    estimated number of records exceeds the fair load of a reducer by more than split_factor,
+    are also split into ranges of document IDs that are placed on different partitions, as
+    many as it takes for each range to fit within the fair load.
+
+    This only pays off for skewed inputs, where a few terms make up more than the fair load
+    of a reducer, e.g., many short documents or many reducers, see benchmarks/partitioning.py.
+    Otherwise no term is split, and the result is about as balanced as with a HashPartitioner,
+    which is the default.
+
+    The sample consists of evenly spaced documents, so the partitioning is deterministic for
+    a given corpus. The ranges of a heavy hitter are cut at quantiles of its sampled document
+    IDs, so that each range gets about the same number of records.
+    """
+
+    def __init__(self, sample_size: int = 1000, placed_terms: int = 1000, split_factor: float = 1.25):
+        super().__init__()
+        assert sample_size > 0 and placed_terms >= 0 and split_factor >= 1
+        self.sample_size = sample_size
+        self._placed_terms = placed_terms
+        self._split_factor = split_factor
+        self._placements = {}
+
+    @property
+    def heavy_hitters(self) -> dict:
+        """
+        Returns the ranges of each heavy hitter, as the sorted document IDs where the ranges
+        after the first one start, and the partition of each range.
+        """
+        return {term: placement for term, placement in self._placements.items() if len(placement[1]) > 1}
+
+    def fit(self, partitions: int, sample: Iterable[Tuple[str, int, int]]) -> None:
+        super().fit(partitions, sample)
+        records = Counter()
+        document_ids = defaultdict(list)
+        for term, document_id, _ in sample:
+            records[term] += 1
+            document_ids[term].append(document_id)
+
+        fair_load = max(sum(records.values()) / partitions, 1)
+        loads = [0] * partitions
+        self._placements = {}
+        pieces = []
+        for rank, (term, count) in enumerate(records.most_common()):
+            if rank >= self._placed_terms:
+                loads[self._hash(term)] += count
+                continue
+            ranges = min(partitions, math.ceil(count / fair_load)) if count > self._split_factor * fair_load else 1
+            sampled_ids = sorted(document_ids[term])
+            boundaries = [sampled_ids[len(sampled_ids) * i // ranges] for i in range(1, ranges)]
+            self._placements[term] = (boundaries, [0] * ranges)
+            pieces.extend((count / ranges, term, i) for i in range(ranges))
+
+        # Largest first, each piece goes to the least loaded partition that has no other range
+        # of the term, so that the posting lists of a term that come out of the reducers cover
+        # disjoint ranges of document IDs.
+        used = defaultdict(set)
+        for weight, term, i in sorted(pieces, key=lambda piece: piece[0], reverse=True):
+            partition = min((p for p in range(partitions) if p not in used[term]), key=lambda p: loads[p])
+            self._placements[term][1][i] = partition
+            used[term].add(partition)
+            loads[partition] += weight
+
+    def is_split(self, term: str) -> bool:
+        placement = self._placements.get(term)
+        return placement is not None and len(placement[1]) > 1
+
+    def get_partition(self, term: str, document_id: int) -> int:
+        placement = self._placements.get(term)
+        if placement is None:
+            return super().get_partition(term, document_id)
+        boundaries, partitions = placement
+        return partitions[bisect.bisect_right(boundaries, document_id)] if boundaries else partitions[0]
+
+
+class RangePartitioner(Partitioner):
+    """
+    Partitions records by ranges of keys, so that the partitions are in key order and the
+    outputs of the reducers can simply be concatenated into a sorted result, e.g., for
+    sorting. The ranges are cut at quantiles of the keys in a sample of the documents, so
+    that each partition gets about the same number of records. All records of a key go to
+    the same partition.
+    """
+
+    def __init__(self, sample_size: int = 1000):
+        super().__init__()
+        assert sample_size > 0
+        self.sample_size = sample_size
+        self._boundaries = []
+
+    @property
+    def boundaries(self) -> list:
+        """
+        Returns the sorted keys where the partitions after the first one start.
+        """
+        return self._boundaries
+
+    def fit(self, partitions: int, sample: Iterable[Tuple[str, int, int]]) -> None:
+        super().fit(partitions, sample)
+        keys = sorted(term for term, _, _ in sample)
+        self._boundaries = [keys[len(keys) * i // partitions] for i in range(1, partitions)] if keys else []
+
+    def get_partition(self, term: str, document_id: int) -> int:
+        return bisect.bisect_right(self._boundaries, term)
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List
+
+from .corpus import Document
+
+# Marks the end of the items in a queue between two stages.
+_END = object()
+
+
+def batches(documents: Iterable[Document], fields: Iterable[str], batch_size: int) -> Iterator[List[Document]]:
+    """
+    Cuts a stream of documents into batches of consecutive documents, each with about the
+    given number of characters in the given fields, as the documents are read. Unlike
+    plan_splits(), this needs no sizes up front, so the first batch can be mapped while the
+    rest of the corpus is still being read.
+    """
+    assert batch_size > 0
+    fields = list(fields)
+    batch = []
+    size = 0
+    for document in documents:
+        batch.append(document)
+        size += sum(len(document[field] or "") for field in fields)
+        if size >= batch_size:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
+
+
+def read_ahead(items: Iterable[Any], capacity: int) -> Iterator[Any]:
+    """
+    Yields the items of an iterable that is read in a background thread, at most capacity
+    items ahead of the consumer, so that reading overlaps with whatever the consumer does
+    with the items. An exception raised by the iterable is raised to the consumer. If the
+    consumer stops early, the thread stops after the item it's reading.
+    """
+    assert capacity > 0
+    buffer = queue.Queue(capacity)
+    stopped = threading.Event()
+    failure = []
+
+    def read():
+        try:
+            for item in items:
+                if not _put(buffer, item, stopped):
+                    return
+        except BaseException as exception:
+            failure.append(exception)
+        _put(buffer, _END, stopped)
+
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    try:
+        for item in iter(buffer.get, _END):
+            yield item
+        thread.join()
+        if failure:
+            raise failure[0]
+    finally:
+        stopped.set()
+
+
+class Stage:
+    """
+    A stage of a pipeline that runs in a background thread and consumes the items put into
+    it through a queue of the given capacity, so that a producer that gets ahead of the
+    stage blocks instead of buffering without bounds. The consume function is given an
+    iterator over the items, and its return value is returned by close().
+
+    If the stage fails, the items put into it are discarded, and its exception is raised by
+    the next put() or by close().
+    """
+
+    def __init__(self, consume: Callable[[Iterator[Any]], Any], capacity: int):
+        assert capacity > 0
+        self._queue = queue.Queue(capacity)
+        self._result = None
+        self._failure = None
+        self._thread = threading.Thread(target=self._run, args=(consume,), daemon=True)
+        self._thread.start()
+
+    def put(self, item: Any) -> None:
+        """
+        Hands an item to the stage, waiting while the queue is full.
+        """
+        if self._failure is not None:
+            raise self._failure
+        self._queue.put(item)
+
+    def close(self) -> Any:
+        """
+        Tells the stage that there are no more items, waits for it to finish and returns
+        what it returned.
+        """
+        self._queue.put(_END)
+        self._thread.join()
+        if self._failure is not None:
+            raise self._failure
+        return self._result
+
+    def _run(self, consume: Callable[[Iterator[Any]], Any]) -> None:
+        items = iter(self._queue.get, _END)
+        try:
+            self._result = consume(items)
+        except BaseException as exception:
+            self._failure = exception
+        # Drain the queue, so that the producer doesn't wait for a stage that is gone.
+        for _ in items:
+            pass
+
+
+# Put an item into a queue unless the consumer is gone, checking every now and then while the queue is full.
+def _put(buffer: queue.Queue, item: Any, stopped: threading.Event) -> bool:
+    while not stopped.is_set():
+        try:
+            buffer.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
@@ -0,0 +1,462 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import bisect
+import sys
+from abc import ABC, abstractmethod
+from array import array
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .posting import Posting
+
+
+def encode_varbyte(buffer: bytearray, number: int) -> None:
+    """
+    Appends a non-negative integer to the buffer using variable-byte encoding, i.e., seven
+    bits per byte with the least significant group first. The high bit is set on every
+    byte except the last one of the integer.
+    """
+    assert number >= 0
+    while number >= 0x80:
+        buffer.append((number & 0x7F) | 0x80)
+        number >>= 7
+    buffer.append(number)
+
+
+class CompressedPostingList:
+    """
+    A posting list stored as a contiguous buffer of compressed integers. Each posting is the
+    gap from the previous document identifier followed by the term frequency, both variable-byte
+    encoded. Gaps and term frequencies are mostly small, so the typical posting takes two bytes
+    instead of a Posting object of a hundred bytes or more.
+
+    Postings are decoded lazily while iterating, and must be appended in ascending order by
+    document identifier. The buffer can be any bytes-like object, e.g., a slice of a memory-mapped
+    file, in which case the posting list is read-only.
+
+    Cursors can skip ahead without decoding every posting, using a table of skip pointers
+    that records the position and preceding document identifier of every _SKIP_INTERVAL'th
+    posting. The table is built on first use and kept until the next posting is appended,
+    unless it's given along with the buffer, e.g., as stored by save_index().
+
+    The posting list also keeps the largest term frequency in it and the smallest length of
+    a document in it, if the lengths are given as postings are added, so that rankers can
+    bound the score of the term without reading the postings, see RankedSearchEngine. A
+    smallest length of 0 means that it isn't known.
+    """
+
+    __slots__ = ("_buffer", "_length", "_last_document_id", "_skips", "_max_term_frequency", "_min_document_length")
+
+    _SKIP_INTERVAL = 64
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview] = None, length: int = 0,
+                 last_document_id: int = -1, skips: Optional[Tuple[Sequence[int], Sequence[int]]] = None,
+                 max_term_frequency: int = 0, min_document_length: int = 0):
+        self._buffer = bytearray() if buffer is None else buffer
+        self._length = length
+        self._last_document_id = last_document_id
+        self._skips = skips
+        self._max_term_frequency = max_term_frequency
+        self._min_document_length = min_document_length
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self) -> Iterator[Posting]:
+        buffer = self._buffer
+        position = 0
+        document_id = -1
+        for _ in range(self._length):
+            gap = shift = 0
+            while True:
+                byte = buffer[position]
+                position += 1
+                gap |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            term_frequency = shift = 0
+            while True:
+                byte = buffer[position]
+                position += 1
+                term_frequency |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            document_id += gap
+            yield Posting(document_id, term_frequency)
+
+    def __repr__(self):
+        return str(list(self))
+
+    def cursor(self) -> "CompressedPostingsCursor":
+        return CompressedPostingsCursor(self)
+
+    def get_skips(self) -> Tuple[Sequence[int], Sequence[int]]:
+        """
+        Returns the skip pointers, as the identifier of the document just before every
+        _SKIP_INTERVAL'th posting and the position of that posting in the buffer. Building
+        them takes a single pass over the buffer that doesn't create any Posting objects.
+        """
+        if self._skips is None:
+            document_ids, positions = array("q"), array("q")
+            buffer = self._buffer
+            position = 0
+            document_id = -1
+            for i in range(self._length):
+                if i and i % self._SKIP_INTERVAL == 0:
+                    document_ids.append(document_id)
+                    positions.append(position)
+                gap = shift = 0
+                while True:
+                    byte = buffer[position]
+                    position += 1
+                    gap |= (byte & 0x7F) << shift
+                    if byte < 0x80:
+                        break
+                    shift += 7
+                while buffer[position] >= 0x80:
+                    position += 1
+                position += 1
+                document_id += gap
+            self._skips = (document_ids, positions)
+        return self._skips
+
+    @staticmethod
+    def concatenate(posting_lists: Iterable["CompressedPostingList"]) -> "CompressedPostingList":
+        """
+        Joins posting lists that cover disjoint, ascending ranges of document identifiers. Only
+        the first gap of each list needs to be re-encoded, the rest of its buffer is copied as is.
+        """
+        result = CompressedPostingList()
+        for posting_list in posting_lists:
+            if len(posting_list) == 0:
+                continue
+            buffer = posting_list.buffer
+            position = gap = shift = 0
+            while True:
+                byte = buffer[position]
+                position += 1
+                gap |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            document_id = gap - 1
+            assert document_id > result._last_document_id
+            encode_varbyte(result._buffer, document_id - result._last_document_id)
+            result._buffer += buffer[position:]
+            result._add_bounds(posting_list.max_term_frequency, posting_list.min_document_length)
+            result._length += len(posting_list)
+            result._last_document_id = posting_list.last_document_id
+        return result
+
+    @staticmethod
+    def from_postings(postings: Iterable[Posting],
+                      document_lengths: Optional[Sequence[int]] = None) -> "CompressedPostingList":
+        posting_list = CompressedPostingList()
+        for posting in postings:
+            posting_list.append(posting.document_id, posting.term_frequency,
+                                0 if document_lengths is None else document_lengths[posting.document_id])
+        return posting_list
+
+    @property
+    def buffer(self) -> Union[bytes, bytearray, memoryview]:
+        return self._buffer
+
+    @property
+    def last_document_id(self) -> int:
+        """
+        Returns the identifier of the last document in the posting list, or -1 if it's empty.
+        """
+        return self._last_document_id
+
+    @property
+    def max_term_frequency(self) -> int:
+        """
+        Returns the largest term frequency in the posting list, or 0 if it's empty.
+        """
+        return self._max_term_frequency
+
+    @property
+    def min_document_length(self) -> int:
+        """
+        Returns the smallest length of a document in the posting list, or 0 if it isn't known.
+        """
+        return self._min_document_length
+
+    # Account for postings with the given largest term frequency and smallest document length,
+    # before they're counted in the length.
+    def _add_bounds(self, max_term_frequency: int, min_document_length: int) -> None:
+        if max_term_frequency > self._max_term_frequency:
+            self._max_term_frequency = max_term_frequency
+        if self._length == 0 or min_document_length < self._min_document_length:
+            self._min_document_length = min_document_length
+
+    def append(self, document_id: int, term_frequency: int, document_length: int = 0) -> None:
+        """
+        Appends a posting. The document identifier must be larger than that of any posting
+        already in the list. The length of the document is 0 if it isn't known.
+        """
+        assert document_id > self._last_document_id
+        encode_varbyte(self._buffer, document_id - self._last_document_id)
+        encode_varbyte(self._buffer, term_frequency)
+        self._add_bounds(term_frequency, document_length)
+        self._last_document_id = document_id
+        self._length += 1
+        self._skips = None
+
+    def extend(self, postings: Sequence[int], document_lengths: Optional[Sequence[int]] = None) -> None:
+        """
+        Appends postings given as alternating document identifiers and term frequencies, as in
+        the runs of the shuffle. The term frequencies of consecutive postings for the same
+        document are summed up. The document identifiers must otherwise be ascending and larger
+        than that of any posting already in the list. The lengths of the documents, indexed by
+        document identifier, are optional.
+        """
+        buffer = self._buffer
+        start = len(buffer)
+        last_document_id = self._last_document_id
+        records = iter(postings)
+        for document_id, term_frequency in zip(records, records):
+            gap = document_id - last_document_id
+            if 0 < gap < 0x80 and term_frequency < 0x80:
+                buffer += bytes((gap, term_frequency))
+            elif gap > 0:
+                encode_varbyte(buffer, gap)
+                encode_varbyte(buffer, term_frequency)
+            else:
+                # A document repeats, so start over and sum up its term frequencies.
+                del buffer[start:]
+                self._extend_summing(postings, document_lengths)
+                return
+            last_document_id = document_id
+        if len(postings):
+            self._add_bounds(max(postings[1::2]),
+                             0 if document_lengths is None else min(map(document_lengths.__getitem__, postings[::2])))
+        self._length += len(postings) // 2
+        self._last_document_id = last_document_id
+        self._skips = None
+
+    def _extend_summing(self, postings: Sequence[int], document_lengths: Optional[Sequence[int]]) -> None:
+        pending_document_id = None
+        pending_frequency = 0
+        for document_id, term_frequency in zip(postings[::2], postings[1::2]):
+            if document_id == pending_document_id:
+                pending_frequency += term_frequency
+                continue
+            if pending_document_id is not None:
+                self.append(pending_document_id, pending_frequency,
+                            0 if document_lengths is None else document_lengths[pending_document_id])
+            pending_document_id = document_id
+            pending_frequency = term_frequency
+        if pending_document_id is not None:
+            self.append(pending_document_id, pending_frequency,
+                        0 if document_lengths is None else document_lengths[pending_document_id])
+
+class PostingsCursor(ABC):
+    """
+    Abstract base class for cursors over posting lists, for document-at-a-time query processing.
+    A cursor starts out on the first posting, and its document identifier is END once it has
+    moved past the last posting. Cursors only ever move forwards.
+    """
+
+    END = sys.maxsize
+
+    def __init__(self):
+        self.document_id = self.END
+        self.term_frequency = 0
+
+    @abstractmethod
+    def next(self) -> None:
+        """
+        Moves the cursor to the next posting.
+        """
+        pass
+
+    def advance(self, target: int) -> None:
+        """
+        Moves the cursor to the first posting with a document identifier of at least the target,
+        if it's not there already.
+        """
+        while self.document_id < target:
+            self.next()
+
+
+class IteratorPostingsCursor(PostingsCursor):
+    """
+    A cursor over any iterator of postings. It can't skip, so advancing visits every posting.
+    """
+
+    def __init__(self, postings: Iterator[Posting]):
+        super().__init__()
+        self._postings = postings
+        self.next()
+
+    def next(self) -> None:
+        posting = next(self._postings, None)
+        if posting is None:
+            self.document_id, self.term_frequency = self.END, 0
+        else:
+            self.document_id, self.term_frequency = posting.document_id, posting.term_frequency
+
+
+class ArrayPostingsCursor(PostingsCursor):
+    """
+    A cursor over decoded postings, given as parallel arrays of document identifiers and term
+    frequencies. Advancing gallops over the document identifiers themselves.
+    """
+
+    def __init__(self, document_ids: Sequence[int], term_frequencies: Sequence[int]):
+        super().__init__()
+        assert len(document_ids) == len(term_frequencies)
+        self._document_ids = document_ids
+        self._term_frequencies = term_frequencies
+        self._index = 0
+        self._update()
+
+    def _update(self) -> None:
+        if self._index < len(self._document_ids):
+            self.document_id = self._document_ids[self._index]
+            self.term_frequency = self._term_frequencies[self._index]
+        else:
+            self.document_id, self.term_frequency = self.END, 0
+
+    def next(self) -> None:
+        if self._index < len(self._document_ids):
+            self._index += 1
+            self._update()
+
+    def advance(self, target: int) -> None:
+        if self.document_id >= target:
+            return
+        document_ids, index = self._document_ids, self._index
+        step = 1
+        while index + step < len(document_ids) and document_ids[index + step] < target:
+            step *= 2
+        self._index = bisect.bisect_left(document_ids, target, index + step // 2, min(index + step + 1, len(document_ids)))
+        self._update()
+
+
+class CompressedPostingsCursor(PostingsCursor):
+    """
+    A cursor over a CompressedPostingList. Advancing far ahead gallops over the skip pointers,
+    i.e., probes 1, 2, 4, ... pointers ahead before doing a binary search, and then decodes at
+    most one interval of postings. Advancing to a document k postings ahead hence takes about
+    log(k) steps, and intersecting a short list with a long one costs time proportional to
+    the short list, up to a logarithmic factor.
+    """
+
+    def __init__(self, posting_list: CompressedPostingList):
+        super().__init__()
+        self._posting_list = posting_list
+        self._buffer = posting_list.buffer
+        self._remaining = len(posting_list)
+        self._position = 0
+        self._previous_document_id = -1
+        self._skips = None
+        self._skip = 0
+        self.next()
+
+    def next(self) -> None:
+        if self._remaining == 0:
+            self.document_id, self.term_frequency = self.END, 0
+            return
+        buffer = self._buffer
+        position = self._position
+        gap = shift = 0
+        while True:
+            byte = buffer[position]
+            position += 1
+            gap |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        term_frequency = shift = 0
+        while True:
+            byte = buffer[position]
+            position += 1
+            term_frequency |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        self._position = position
+        self._remaining -= 1
+        self._previous_document_id += gap
+        self.document_id, self.term_frequency = self._previous_document_id, term_frequency
+
+    def advance(self, target: int) -> None:
+        if self.document_id >= target:
+            return
+        interval = CompressedPostingList._SKIP_INTERVAL
+        if self._remaining > interval:
+            if self._skips is None:
+                self._skips = self._posting_list.get_skips()
+            document_ids, positions = self._skips
+            # The skip pointer i leads to posting (i + 1) * interval. Only pointers past the
+            # current posting are of use, and we want the last one before the target. If even
+            # the next pointer is past the target, decoding the postings up to it is cheaper.
+            consumed = len(self._posting_list) - self._remaining
+            low = max(self._skip, consumed // interval)
+            if low < len(document_ids) and document_ids[low] < target:
+                step = 2
+                while low + step < len(document_ids) and document_ids[low + step - 1] < target:
+                    step *= 2
+                skip = bisect.bisect_left(document_ids, target, low + step // 2, min(low + step, len(document_ids)))
+                self._skip = skip
+                self._position = positions[skip - 1]
+                self._previous_document_id = document_ids[skip - 1]
+                self._remaining = len(self._posting_list) - skip * interval
+        while self.document_id < target:
+            self.next()
+
+
+class ConcatenatedPostingsCursor(PostingsCursor):
+    """
+    A cursor over posting lists that cover disjoint, ascending ranges of document identifiers,
+    e.g., those of a term in the segments of an index. Advancing passes over whole lists at a
+    time, as long as they know their last document identifier.
+    """
+
+    def __init__(self, posting_lists: List[CompressedPostingList]):
+        super().__init__()
+        self._posting_lists = [posting_list for posting_list in posting_lists if len(posting_list) > 0]
+        self._index = 0
+        self._cursor: Optional[CompressedPostingsCursor] = None
+        self._open()
+
+    def _open(self) -> None:
+        if self._index < len(self._posting_lists):
+            self._cursor = self._posting_lists[self._index].cursor()
+            self.document_id, self.term_frequency = self._cursor.document_id, self._cursor.term_frequency
+        else:
+            self._cursor = None
+            self.document_id, self.term_frequency = self.END, 0
+
+    def next(self) -> None:
+        if self._cursor is None:
+            return
+        self._cursor.next()
+        if self._cursor.document_id == self.END:
+            self._index += 1
+            self._open()
+        else:
+            self.document_id, self.term_frequency = self._cursor.document_id, self._cursor.term_frequency
+
+    def advance(self, target: int) -> None:
+        if self.document_id >= target:
+            return
+        skipped = False
+        while (self._index < len(self._posting_lists) and
+               0 <= self._posting_lists[self._index].last_document_id < target):
+            self._index += 1
+            skipped = True
+        if skipped:
+            self._open()
+        if self._cursor is not None:
+            self._cursor.advance(target)
+            if self._cursor.document_id == self.END:
+                self._index += 1
+                self._open()
+                self.advance(target)
+            else:
+                self.document_id, self.term_frequency = self._cursor.document_id, self._cursor.term_frequency
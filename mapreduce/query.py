@@ -0,0 +1,302 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import re
+from abc import ABC, abstractmethod
+from typing import Iterator, List, Optional
+
+from .caching import ResultCache
+from .invertedindex import InvertedIndex
+from .postinglist import PostingsCursor
+
+
+class Query(ABC):
+    """
+    Abstract base class for the nodes of a parsed boolean query. A query is evaluated
+    document-at-a-time by a tree of cursors that mirrors the query tree.
+    """
+
+    @abstractmethod
+    def get_cost(self, index: InvertedIndex) -> int:
+        """
+        Returns an upper bound on the number of documents that match the query, which is
+        used to process the cheapest operands first.
+        """
+        pass
+
+    @abstractmethod
+    def get_cursor(self, index: InvertedIndex) -> PostingsCursor:
+        """
+        Returns a cursor over the identifiers of the matching documents.
+        """
+        pass
+
+
+class TermQuery(Query):
+    """
+    Matches the documents that contain the term.
+    """
+
+    def __init__(self, term: str):
+        self.term = term
+
+    def __repr__(self):
+        return repr(self.term)
+
+    def get_cost(self, index: InvertedIndex) -> int:
+        return index.get_document_frequency(self.term)
+
+    def get_cursor(self, index: InvertedIndex) -> PostingsCursor:
+        return index.get_postings_cursor(self.term)
+
+
+class AndQuery(Query):
+    """
+    Matches the documents that match all of the operands.
+    """
+
+    def __init__(self, operands: List[Query]):
+        assert operands
+        self.operands = operands
+
+    def __repr__(self):
+        return "(" + " AND ".join(repr(operand) for operand in self.operands) + ")"
+
+    def get_cost(self, index: InvertedIndex) -> int:
+        return min(operand.get_cost(index) for operand in self.operands)
+
+    def get_cursor(self, index: InvertedIndex) -> PostingsCursor:
+        # Rarest first, so that the shortest posting list drives the intersection and the
+        # others are only asked to skip ahead to its documents.
+        operands = sorted(self.operands, key=lambda operand: operand.get_cost(index))
+        return _AndCursor([operand.get_cursor(index) for operand in operands])
+
+
+class OrQuery(Query):
+    """
+    Matches the documents that match any of the operands.
+    """
+
+    def __init__(self, operands: List[Query]):
+        assert operands
+        self.operands = operands
+
+    def __repr__(self):
+        return "(" + " OR ".join(repr(operand) for operand in self.operands) + ")"
+
+    def get_cost(self, index: InvertedIndex) -> int:
+        return sum(operand.get_cost(index) for operand in self.operands)
+
+    def get_cursor(self, index: InvertedIndex) -> PostingsCursor:
+        return _OrCursor([operand.get_cursor(index) for operand in self.operands])
+
+
+class AndNotQuery(Query):
+    """
+    Matches the documents that match the first operand but not the second.
+    """
+
+    def __init__(self, included: Query, excluded: Query):
+        self.included = included
+        self.excluded = excluded
+
+    def __repr__(self):
+        return "({!r} ANDNOT {!r})".format(self.included, self.excluded)
+
+    def get_cost(self, index: InvertedIndex) -> int:
+        return self.included.get_cost(index)
+
+    def get_cursor(self, index: InvertedIndex) -> PostingsCursor:
+        return _AndNotCursor(self.included.get_cursor(index), self.excluded.get_cursor(index))
+
+
+class _AndCursor(PostingsCursor):
+    """
+    Intersects cursors by leapfrogging: the first cursor proposes a document, and the others
+    advance to it. If one of them overshoots, the first cursor advances to that document instead.
+    """
+
+    def __init__(self, cursors: List[PostingsCursor]):
+        super().__init__()
+        self._cursors = cursors
+        self._align(cursors[0].document_id)
+
+    def _align(self, target: int) -> None:
+        cursors = self._cursors
+        while target != self.END:
+            for cursor in cursors:
+                cursor.advance(target)
+                if cursor.document_id != target:
+                    target = cursor.document_id
+                    break
+            else:
+                break
+        self.document_id = target
+        self.term_frequency = 0 if target == self.END else sum(cursor.term_frequency for cursor in cursors)
+
+    def next(self) -> None:
+        if self.document_id != self.END:
+            self._cursors[0].next()
+            self._align(self._cursors[0].document_id)
+
+    def advance(self, target: int) -> None:
+        if self.document_id < target:
+            self._align(target)
+
+
+class _OrCursor(PostingsCursor):
+    """
+    Unites cursors by moving all cursors that are on the current document along together.
+    """
+
+    def __init__(self, cursors: List[PostingsCursor]):
+        super().__init__()
+        self._cursors = cursors
+        self._update()
+
+    def _update(self) -> None:
+        self.document_id = min(cursor.document_id for cursor in self._cursors)
+        self.term_frequency = sum(cursor.term_frequency for cursor in self._cursors
+                                  if cursor.document_id == self.document_id and self.document_id != self.END)
+
+    def next(self) -> None:
+        current = self.document_id
+        for cursor in self._cursors:
+            if cursor.document_id == current:
+                cursor.next()
+        self._update()
+
+    def advance(self, target: int) -> None:
+        if self.document_id < target:
+            for cursor in self._cursors:
+                cursor.advance(target)
+            self._update()
+
+
+class _AndNotCursor(PostingsCursor):
+    """
+    Walks the included cursor and skips the documents that the excluded cursor advances to.
+    """
+
+    def __init__(self, included: PostingsCursor, excluded: PostingsCursor):
+        super().__init__()
+        self._included = included
+        self._excluded = excluded
+        self._settle()
+
+    def _settle(self) -> None:
+        while self._included.document_id != self.END:
+            self._excluded.advance(self._included.document_id)
+            if self._excluded.document_id != self._included.document_id:
+                break
+            self._included.next()
+        self.document_id, self.term_frequency = self._included.document_id, self._included.term_frequency
+
+    def next(self) -> None:
+        self._included.next()
+        self._settle()
+
+    def advance(self, target: int) -> None:
+        if self.document_id < target:
+            self._included.advance(target)
+            self._settle()
+
+
+class BooleanSearchEngine:
+    """
+    Evaluates boolean queries against an inverted index. A query consists of terms, the
+    operators AND, OR and ANDNOT, and parentheses for grouping. AND and ANDNOT bind tighter
+    than OR, and adjacent operands without an operator between them are ANDed together.
+    Operators must be in upper case, so that "and" and "or" can still be searched for.
+
+    Each word of the query is processed with the index's get_terms(), just like documents
+    are when they're indexed. A word that gives several terms matches documents that contain
+    all of them, while a word that gives no terms at all is ignored.
+
+    If a result cache is given, the matching documents of each parsed query are cached.
+    """
+
+    _tokens = re.compile(r"\(|\)|[^\s()]+", re.UNICODE)
+    _operators = {"AND", "OR", "ANDNOT"}
+
+    def __init__(self, index: InvertedIndex, result_cache: Optional[ResultCache] = None):
+        self._index = index
+        self._result_cache = result_cache
+
+    def parse(self, query: str) -> Optional[Query]:
+        """
+        Parses the query into a tree of Query nodes, or None if it has no terms. Raises a
+        ValueError if the query is malformed.
+        """
+        tokens = self._tokens.findall(query)
+        if not tokens:
+            return None
+        position, parsed = self._parse_or(tokens, 0)
+        if position != len(tokens):
+            raise ValueError("Unexpected '{}' in query: {}".format(tokens[position], query))
+        return parsed
+
+    def _parse_or(self, tokens: List[str], position: int):
+        position, parsed = self._parse_and(tokens, position)
+        operands = [parsed]
+        while position < len(tokens) and tokens[position] == "OR":
+            position, parsed = self._parse_and(tokens, position + 1)
+            operands.append(parsed)
+        operands = [operand for operand in operands if operand is not None]
+        if len(operands) <= 1:
+            return position, (operands[0] if operands else None)
+        return position, OrQuery(operands)
+
+    def _parse_and(self, tokens: List[str], position: int):
+        position, parsed = self._parse_operand(tokens, position)
+        while position < len(tokens) and tokens[position] not in ("OR", ")"):
+            operator = tokens[position]
+            if operator in self._operators:
+                position += 1
+            position, operand = self._parse_operand(tokens, position)
+            if operand is None:
+                continue
+            if parsed is None:
+                # Nothing to exclude from, e.g., a first word that gave no terms.
+                parsed = None if operator == "ANDNOT" else operand
+            elif operator == "ANDNOT":
+                parsed = AndNotQuery(parsed, operand)
+            elif isinstance(parsed, AndQuery):
+                parsed = AndQuery(parsed.operands + [operand])
+            else:
+                parsed = AndQuery([parsed, operand])
+        return position, parsed
+
+    def _parse_operand(self, tokens: List[str], position: int):
+        if position == len(tokens):
+            raise ValueError("Unexpected end of query")
+        token = tokens[position]
+        if token == "(":
+            position, parsed = self._parse_or(tokens, position + 1)
+            if position == len(tokens) or tokens[position] != ")":
+                raise ValueError("Missing ')' in query")
+            return position + 1, parsed
+        if token in self._operators or token == ")":
+            raise ValueError("Unexpected '{}' in query".format(token))
+        terms = [TermQuery(term) for term in dict.fromkeys(self._index.get_terms(token))]
+        if len(terms) <= 1:
+            return position + 1, (terms[0] if terms else None)
+        return position + 1, AndQuery(terms)
+
+    def evaluate(self, query: str) -> Iterator[int]:
+        """
+        Yields the identifiers of the documents that match the query, in ascending order.
+        """
+        parsed = self.parse(query)
+        if parsed is None:
+            return iter([])
+        if self._result_cache is None:
+            return self._iterate(parsed.get_cursor(self._index))
+        return iter(self._result_cache.get_or_compute(
+            self._index, ("boolean", repr(parsed)), lambda: list(self._iterate(parsed.get_cursor(self._index)))))
+
+    @staticmethod
+    def _iterate(cursor: PostingsCursor) -> Iterator[int]:
+        while cursor.document_id != cursor.END:
+            yield cursor.document_id
+            cursor.next()
@@ -0,0 +1,229 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import heapq
+import math
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from typing import List, Optional, Tuple
+
+from .caching import ResultCache
+from .invertedindex import InvertedIndex
+from .postinglist import PostingsCursor
+
+
+class Scorer(ABC):
+    """
+    Abstract base class for ranking functions that score a document as the sum of the scores
+    of the query terms it contains. The score of a term is its weight, which only depends on
+    the collection, times a part that depends on the term frequency and the document length.
+    """
+
+    @abstractmethod
+    def get_term_weight(self, document_frequency: int, documents: int) -> float:
+        """
+        Returns the weight of a term with the given document frequency, e.g., its IDF.
+        """
+        pass
+
+    @abstractmethod
+    def get_score(self, term_frequency: int, document_length: int, average_length: float) -> float:
+        """
+        Returns the score of a term in a document, before it's multiplied by the term weight.
+        The score must not decrease with the term frequency, nor increase with the document
+        length, so that the largest term frequency and the smallest document length of a posting
+        list bound the score of the term, see InvertedIndex.get_term_bounds().
+        """
+        pass
+
+
+class BM25Scorer(Scorer):
+    """
+    Okapi BM25, with the IDF variant that never goes negative.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        assert k1 >= 0 and 0 <= b <= 1
+        self._k1 = k1
+        self._b = b
+
+    def get_term_weight(self, document_frequency: int, documents: int) -> float:
+        return math.log(1 + (documents - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def get_score(self, term_frequency: int, document_length: int, average_length: float) -> float:
+        normalization = 1 - self._b + self._b * document_length / average_length if average_length else 1
+        return term_frequency * (self._k1 + 1) / (term_frequency + self._k1 * normalization)
+
+
+class TfIdfScorer(Scorer):
+    """
+    TF-IDF with logarithmic term frequencies and no length normalization.
+    """
+
+    def get_term_weight(self, document_frequency: int, documents: int) -> float:
+        return math.log(documents / document_frequency) if document_frequency else 0.0
+
+    def get_score(self, term_frequency: int, document_length: int, average_length: float) -> float:
+        return 1 + math.log(term_frequency) if term_frequency else 0.0
+
+
+def _get_document_id(entry: list) -> int:
+    return entry[0].document_id
+
+
+def _get_number(entry: list) -> int:
+    return entry[3]
+
+
+class RankedSearchEngine:
+    """
+    Finds the top k documents for a query under a Scorer, BM25 by default. The query is processed
+    with the index's get_terms(), and a term that occurs several times in the query counts
+    as many times.
+
+    Documents are evaluated with WAND: the cursors of the query terms are kept sorted by their
+    current document, and a document is only scored if the upper bounds of the terms up to and
+    including it add up to more than the score of the k'th best document found so far. Otherwise
+    the cursors before it skip ahead, see CompressedPostingsCursor, without decoding the postings
+    in between. The upper bound of a term is its score for the largest term frequency and the
+    smallest document length of its posting list, which the index keeps when it's built or
+    saved, see InvertedIndex.get_term_bounds(). So a bound costs a lookup, for any scorer and
+    parameters, and doesn't go stale as documents are added.
+
+    Ties are broken by document identifier, so the results are the same as if every posting of
+    every query term were scored, see evaluate_exhaustively().
+
+    If a result cache is given, the results are cached by the query terms, k and the scorer.
+    """
+
+    def __init__(self, index: InvertedIndex, scorer: Scorer = None, result_cache: Optional[ResultCache] = None):
+        self._index = index
+        self._scorer = scorer or BM25Scorer()
+        self._result_cache = result_cache
+        self._document_lengths = None
+        self._average_length = 0.0
+
+    def _update_statistics(self) -> None:
+        document_lengths = self._index.get_document_lengths()
+        if document_lengths is not self._document_lengths:
+            self._document_lengths = document_lengths
+            self._average_length = sum(document_lengths) / len(document_lengths) if len(document_lengths) else 0.0
+
+    def _get_term_weights(self, terms: Counter) -> List[Tuple[str, float]]:
+        documents = len(self._document_lengths)
+        weights = []
+        for term, count in terms.items():
+            document_frequency = self._index.get_document_frequency(term)
+            if document_frequency:
+                weights.append((term, count * self._scorer.get_term_weight(document_frequency, documents)))
+        return weights
+
+    def evaluate(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """
+        Returns the (document identifier, score) pairs of the k best matching documents, best first.
+        """
+        assert k > 0
+        terms = Counter(self._index.get_terms(query))
+        if self._result_cache is None:
+            return self._evaluate(terms, k)
+        key = ("ranked", type(self._scorer).__name__, tuple(sorted(vars(self._scorer).items())),
+               tuple(sorted(terms.items())), k)
+        return list(self._result_cache.get_or_compute(self._index, key, lambda: self._evaluate(terms, k)))
+
+    def _evaluate(self, terms: Counter, k: int) -> List[Tuple[int, float]]:
+        self._update_statistics()
+        get_score, lengths, average_length = self._scorer.get_score, self._document_lengths, self._average_length
+
+        # Each entry is [cursor, term weight, upper bound, query term number]. The upper bounds are
+        # padded a little, so that rounding never makes them smaller than an actual score.
+        entries = []
+        for number, (term, weight) in enumerate(self._get_term_weights(terms)):
+            max_term_frequency, min_document_length = self._index.get_term_bounds(term)
+            upper_bound = weight * get_score(max_term_frequency, min_document_length, average_length) * (1 + 1e-9)
+            entries.append([self._index.get_postings_cursor(term), weight, upper_bound, number])
+
+        # A min-heap of (score, -document identifier), so that the root is the result that's
+        # the first to go, which for equal scores is the one with the largest identifier.
+        results = []
+        threshold = -math.inf
+        end = PostingsCursor.END
+        while len(entries) > 1:
+            entries.sort(key=_get_document_id)
+
+            # Find the pivot, i.e., the first cursor where the upper bounds add up to more than the
+            # threshold. No document before the pivot's current document can make it into the top k.
+            accumulated = 0.0
+            pivot = 0
+            for entry in entries:
+                accumulated += entry[2]
+                if accumulated > threshold:
+                    break
+                pivot += 1
+            if pivot == len(entries):
+                break
+            pivot_document_id = entries[pivot][0].document_id
+            if pivot_document_id == end:
+                break
+
+            if entries[0][0].document_id == pivot_document_id:
+                # All cursors up to the pivot are on the document, so score it in the order of the
+                # query terms, which is how evaluate_exhaustively() adds up the scores too.
+                matching = pivot + 1
+                while matching < len(entries) and entries[matching][0].document_id == pivot_document_id:
+                    matching += 1
+                matching = entries[:matching]
+                if len(matching) > 1:
+                    matching.sort(key=_get_number)
+                score = 0.0
+                document_length = lengths[pivot_document_id]
+                for cursor, weight, _, _ in matching:
+                    score += weight * get_score(cursor.term_frequency, document_length, average_length)
+                if len(results) < k:
+                    heapq.heappush(results, (score, -pivot_document_id))
+                    if len(results) == k:
+                        threshold = results[0][0]
+                elif score > threshold:
+                    heapq.heapreplace(results, (score, -pivot_document_id))
+                    threshold = results[0][0]
+                moved = matching
+                for entry in moved:
+                    entry[0].next()
+            else:
+                moved = entries[:pivot]
+                for entry in moved:
+                    entry[0].advance(pivot_document_id)
+            if any(entry[0].document_id == end for entry in moved):
+                entries = [entry for entry in entries if entry[0].document_id != end]
+
+        # Once a single term is left there's nothing to skip to, but there's also no need to
+        # keep the cursors sorted, and the rest of the posting list is of no use as soon as the
+        # term's upper bound can't beat the threshold.
+        if len(entries) == 1:
+            cursor, weight, upper_bound, _ = entries[0]
+            while cursor.document_id != end and upper_bound > threshold:
+                score = weight * get_score(cursor.term_frequency, lengths[cursor.document_id], average_length)
+                if len(results) < k:
+                    heapq.heappush(results, (score, -cursor.document_id))
+                    if len(results) == k:
+                        threshold = results[0][0]
+                elif score > threshold:
+                    heapq.heapreplace(results, (score, -cursor.document_id))
+                    threshold = results[0][0]
+                cursor.next()
+
+        return [(-negated_document_id, score)
+                for score, negated_document_id in sorted(results, key=lambda result: (-result[0], -result[1]))]
+
+    def evaluate_exhaustively(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """
+        Returns the same as evaluate(), but scores every posting of every query term.
+        """
+        assert k > 0
+        self._update_statistics()
+        get_score, lengths, average_length = self._scorer.get_score, self._document_lengths, self._average_length
+        scores = defaultdict(float)
+        for term, weight in self._get_term_weights(Counter(self._index.get_terms(query))):
+            for posting in self._index.get_postings_iterator(term):
+                scores[posting.document_id] += weight * get_score(posting.term_frequency,
+                                                                  lengths[posting.document_id], average_length)
+        return heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
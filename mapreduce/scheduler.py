@@ -0,0 +1,191 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import collections
+import statistics
+import time
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, wait
+from concurrent.futures import Executor as Pool
+from typing import Any, Callable, Deque, Iterable, Iterator, List, Optional, Tuple
+
+from .executor import Executor
+
+# Marks the end of a stream of tasks.
+_END = object()
+
+
+class Scheduler(Executor):
+    """
+    The master of a phase: hands the tasks out to the workers of an executor one by one and
+    keeps track of each task, so that a task that fails or straggles doesn't fail or stall
+    the whole phase.
+
+    A task that raises is run again, up to max_attempts times in all, after which its last
+    exception is raised. If a worker process dies, the pool is restarted, and every task that
+    was running in it counts as failed. Once the queue is empty and a worker is idle, a task
+    that has been running for more than speculation times the median time of the finished
+    tasks, and for at least speculation_delay seconds, gets a backup copy. Whichever copy
+    finishes first wins, and the other is abandoned. Tasks should thus be deterministic and
+    free of side effects beyond files in a directory that is cleaned up with the job.
+
+    An abandoned copy can't be interrupted, so it runs to completion in the background.
+    Backup copies only help when there are spare cores, i.e., with the processes or cluster
+    backends, and otherwise just compete with the original for the same cores. Speculation
+    is hence off by default, i.e., if speculation is None, and callers opt in with, e.g., 4.0.
+    """
+
+    def __init__(self, executor: Executor, max_attempts: int = 3, speculation: Optional[float] = None,
+                 speculation_delay: float = 1.0):
+        super().__init__(executor.workers)
+        assert max_attempts > 0
+        assert speculation is None or speculation >= 1
+        self._executor = executor
+        self._max_attempts = max_attempts
+        self._speculation = speculation
+        self._speculation_delay = speculation_delay
+        self._attempts = []
+        self.separate_processes = executor.separate_processes
+
+    @property
+    def attempts(self) -> List[int]:
+        """
+        Returns the number of attempts that were started for each task of the last phase,
+        including failed attempts and backup copies.
+        """
+        return self._attempts
+
+    def map(self, func: Callable[[Any, Any], Any], tasks: Iterable[Any], context: Any) -> List[Any]:
+        tasks = list(tasks)
+        results = [None] * len(tasks)
+        for i, result in self.imap(func, tasks, context):
+            results[i] = result
+        return results
+
+    def imap(self, func: Callable[[Any, Any], Any], tasks: Iterable[Any], context: Any) -> Iterator[Tuple[int, Any]]:
+        """
+        Runs func(context, task) for every task like map(), but yields (i, result) for the i-th
+        task as soon as it's done, in order of completion. The next task is only taken from
+        the iterable when a worker is free, so the tasks may be a stream that is still being
+        read or produced while the first tasks run, see pipeline.read_ahead(). A stream that
+        blocks holds up the handling of finished tasks until it yields or ends.
+        """
+        tasks = iter(tasks)
+        pulled = []
+        done = []
+        self._attempts = attempts = []
+        failures = []
+        remaining = 0
+        exhausted = False
+        pending = collections.deque()
+        running = {}
+        abandoned = set()
+        durations = []
+        pool = self._executor.open(context)
+        try:
+            while remaining or not exhausted:
+                # Keep every worker busy, with the queue first, then the stream, and backup copies
+                # of stragglers after. An abandoned copy still occupies its worker until it finishes.
+                abandoned = {future for future in abandoned if not future.done()}
+                while len(running) + len(abandoned) < self._workers:
+                    if not pending and not exhausted:
+                        task = next(tasks, _END)
+                        if task is _END:
+                            exhausted = True
+                        else:
+                            pending.append(len(pulled))
+                            pulled.append(task)
+                            done.append(False)
+                            attempts.append(0)
+                            failures.append(0)
+                            remaining += 1
+                    i = pending.popleft() if pending else self._straggler(running, durations)
+                    if i is None:
+                        break
+                    attempts[i] += 1
+                    running[pool.submit(func, pulled[i])] = (i, time.perf_counter())
+                if not remaining and exhausted:
+                    break
+
+                timeout = self._timeout(running, durations) if len(running) + len(abandoned) < self._workers else None
+                finished, _ = wait(list(running) + list(abandoned), timeout=timeout, return_when=FIRST_COMPLETED)
+                completed = []
+                broken = None
+                for future in finished:
+                    if future not in running:
+                        continue
+                    i, start = running.pop(future)
+                    exception = future.exception()
+                    if exception is None:
+                        completed.append((i, future.result()))
+                        done[i] = True
+                        remaining -= 1
+                        durations.append(time.perf_counter() - start)
+                        for other in [other for other, (j, _) in running.items() if j == i]:
+                            abandoned.add(other)
+                            del running[other]
+                    elif isinstance(exception, BrokenExecutor):
+                        broken = exception
+                        running[future] = (i, start)
+                    else:
+                        self._retry(i, exception, failures, pending, running)
+
+                if broken is not None:
+                    # A worker process died and took the whole pool with it, so every task that
+                    # was running in the pool failed.
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = self._executor.open(context)
+                    lost = {i for i, _ in running.values() if not done[i]}
+                    running.clear()
+                    abandoned.clear()
+                    for i in lost:
+                        self._retry(i, broken, failures, pending, running)
+
+                for i, result in completed:
+                    # A task that is done isn't submitted again, so let go of it, e.g., of the documents of a batch.
+                    pulled[i] = None
+                    yield i, result
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def open(self, context: Any) -> Pool:
+        return self._executor.open(context)
+
+    # Count a failed attempt of task i, and queue the task again unless another copy of it is still running.
+    # The exception of the attempt is raised once the task has failed max_attempts times.
+    def _retry(self, i: int, exception: BaseException, failures: List[int], pending: Deque[int],
+               running: dict) -> None:
+        failures[i] += 1
+        if failures[i] >= self._max_attempts:
+            raise exception
+        if i not in pending and all(j != i for j, _ in running.values()):
+            pending.append(i)
+
+    # Pick the running task that started first among those beyond the speculation threshold without a backup yet.
+    def _straggler(self, running: dict, durations: List[float]) -> Optional[int]:
+        threshold = self._threshold(durations)
+        if threshold is None:
+            return None
+        now = time.perf_counter()
+        stragglers = [(start, i) for i, start in self._single_copies(running) if now - start > threshold]
+        return min(stragglers)[1] if stragglers else None
+
+    # How long a task may run before it gets a backup copy, or None before any task has finished.
+    def _threshold(self, durations: List[float]) -> Optional[float]:
+        if self._speculation is None or not durations:
+            return None
+        return max(self._speculation * statistics.median(durations), self._speculation_delay)
+
+    # How long to wait for a task to finish before looking for stragglers again, or None for as long as it takes.
+    def _timeout(self, running: dict, durations: List[float]) -> Optional[float]:
+        threshold = self._threshold(durations)
+        candidates = self._single_copies(running)
+        if threshold is None or not candidates:
+            return None
+        now = time.perf_counter()
+        return max(min(start + threshold - now for _, start in candidates), 0.01)
+
+    # The (task, start time) of the running tasks that have a single copy running.
+    @staticmethod
+    def _single_copies(running: dict) -> List[Tuple[int, float]]:
+        copies = collections.Counter(i for i, _ in running.values())
+        return [(i, start) for i, start in running.values() if copies[i] == 1]
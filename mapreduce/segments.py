@@ -0,0 +1,351 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import itertools
+import math
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .analysis import Analyzer
+from .corpus import Document
+from .invertedindex import InvertedIndex
+from .normalization import Normalizer
+from .posting import Posting
+from .postinglist import CompressedPostingList, ConcatenatedPostingsCursor, PostingsCursor
+from .tokenization import Tokenizer
+
+
+class Segment:
+    """
+    An immutable piece of an inverted index, covering a contiguous range of document
+    identifiers. Segments are never changed once built. Instead, adjacent segments are
+    merged into a new, larger segment that replaces them.
+
+    The document lengths cover the whole range, with zeros for any gaps in it.
+    """
+
+    def __init__(self, posting_lists: Dict[str, CompressedPostingList], documents: int,
+                 first_document_id: int, last_document_id: int, document_lengths: Optional[array] = None):
+        self._posting_lists = posting_lists
+        self._documents = documents
+        self._first_document_id = first_document_id
+        self._last_document_id = last_document_id
+        self._document_lengths = array("q", bytes(8 * (last_document_id - first_document_id + 1))) \
+            if document_lengths is None else document_lengths
+
+    def __repr__(self):
+        return "Segment({} documents, {}..{})".format(self._documents, self._first_document_id, self._last_document_id)
+
+    @property
+    def documents(self) -> int:
+        return self._documents
+
+    @property
+    def first_document_id(self) -> int:
+        return self._first_document_id
+
+    @property
+    def last_document_id(self) -> int:
+        return self._last_document_id
+
+    @property
+    def document_lengths(self) -> array:
+        return self._document_lengths
+
+    def get_posting_list(self, term: str) -> Optional[CompressedPostingList]:
+        return self._posting_lists.get(term)
+
+    def get_vocabulary(self) -> Iterator[str]:
+        return iter(self._posting_lists)
+
+    @staticmethod
+    def merge(segments: List["Segment"]) -> "Segment":
+        """
+        Merges adjacent segments, given in ascending order by document identifiers, into one.
+        Since the segments cover disjoint ranges, the posting lists of a term are simply
+        concatenated, see CompressedPostingList.concatenate().
+        """
+        assert segments
+        terms = set(itertools.chain.from_iterable(segment.get_vocabulary() for segment in segments))
+        posting_lists = {}
+        for term in terms:
+            posting_lists[term] = CompressedPostingList.concatenate(
+                posting_list for posting_list in (segment.get_posting_list(term) for segment in segments)
+                if posting_list is not None)
+        document_lengths = array("q")
+        for segment in segments:
+            gap = segment.first_document_id - segments[0].first_document_id - len(document_lengths)
+            document_lengths.extend(array("q", bytes(8 * gap)))
+            document_lengths.extend(segment.document_lengths)
+        return Segment(posting_lists, sum(segment.documents for segment in segments),
+                       segments[0].first_document_id, segments[-1].last_document_id, document_lengths)
+
+
+class MergePolicy(ABC):
+    """
+    Abstract base class for merge policies, which decide what segments of a segmented
+    index to merge, if any. Only adjacent segments can be merged, so that the segments
+    keep covering ascending ranges of document identifiers.
+    """
+
+    @abstractmethod
+    def find_merge(self, segments: List[Segment]) -> Optional[Tuple[int, int]]:
+        """
+        Returns the start and stop index of a run of adjacent segments to merge, or None
+        if the segments should be left as they are.
+        """
+        pass
+
+
+class TieredMergePolicy(MergePolicy):
+    """
+    Assigns each segment to a tier by its number of documents, where each tier holds segments
+    segments_per_tier times larger than the tier below it, and merges segments_per_tier
+    adjacent segments of the same tier into one of the next tier. The smallest tiers are
+    merged first. Segments smaller than the floor size all belong to the lowest tier.
+
+    Every document is hence merged about log(N / floor_size) / log(segments_per_tier) times
+    as the index grows to N documents, while the number of live segments stays logarithmic.
+    """
+
+    def __init__(self, segments_per_tier: int = 4, floor_size: int = 100):
+        assert segments_per_tier > 1 and floor_size > 0
+        self._segments_per_tier = segments_per_tier
+        self._floor_size = floor_size
+
+    def get_tier(self, segment: Segment) -> int:
+        if segment.documents <= self._floor_size:
+            return 0
+        return int(math.log(segment.documents / self._floor_size, self._segments_per_tier))
+
+    def find_merge(self, segments: List[Segment]) -> Optional[Tuple[int, int]]:
+        tiers = [self.get_tier(segment) for segment in segments]
+        best = None
+        for start in range(len(segments) - self._segments_per_tier + 1):
+            stop = start + self._segments_per_tier
+            if all(tier == tiers[start] for tier in tiers[start:stop]):
+                if best is None or tiers[start] < tiers[best[0]]:
+                    best = (start, stop)
+        return best
+
+
+class SegmentedInvertedIndex(InvertedIndex):
+    """
+    An inverted index that is built incrementally. Each batch of documents added to the index
+    is indexed into a small, immutable segment of its own, so the time to add a batch depends
+    on the size of the batch and not on the size of the index. Queries fan out over all live
+    segments, and since later batches must have larger document identifiers, the postings of
+    a term are simply read segment by segment.
+
+    A merge policy compacts segments into larger ones to keep the number of segments small.
+    By default merging happens in a background thread, which swaps the merged segment in for
+    the segments it replaces. Readers work on a snapshot of the segment list, so they never
+    see a partial merge, and the generation is bumped whenever the list changes.
+    """
+
+    def __init__(self, fields: Iterable[str], normalizer: Normalizer, tokenizer: Tokenizer,
+                 merge_policy: Optional[MergePolicy] = None, merge_in_background: bool = True):
+        self._fields = list(fields)
+        self._normalizer = normalizer
+        self._tokenizer = tokenizer
+        self._analyzer = Analyzer(normalizer, tokenizer)
+        self._merge_policy = merge_policy or TieredMergePolicy()
+        self._segments = []
+        self._generation = 0
+        self._document_lengths = (0, array("q"))
+        self._merging = False
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+        self._merger = None
+        if merge_in_background:
+            self._merger = threading.Thread(target=self._merge_loop, name="segment-merger", daemon=True)
+            self._merger.start()
+
+    def __repr__(self):
+        return str(self.segments)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def segments(self) -> List[Segment]:
+        """
+        Returns a snapshot of the live segments, in ascending order by document identifiers.
+        """
+        with self._condition:
+            return list(self._segments)
+
+    @property
+    def generation(self) -> int:
+        """
+        Returns a number that changes whenever documents are added or segments are merged.
+        """
+        with self._condition:
+            return self._generation
+
+    def add_documents(self, documents: Iterable[Document]) -> Optional[Segment]:
+        """
+        Indexes the documents into a new segment and makes them searchable. The documents must
+        be given in ascending order by document identifiers, larger than those already added.
+        Returns the new segment, or None if there were no documents.
+        """
+        segment = self._build_segment(documents)
+        if segment is None:
+            return None
+        with self._condition:
+            self._raise_error()
+            assert not self._closed
+            assert not self._segments or self._segments[-1].last_document_id < segment.first_document_id
+            self._segments.append(segment)
+            self._generation += 1
+            self._condition.notify_all()
+        if self._merger is None:
+            while self._merge_once():
+                pass
+        return segment
+
+    def _build_segment(self, documents: Iterable[Document]) -> Optional[Segment]:
+        posting_lists = {}
+        document_lengths = array("q")
+        count = 0
+        first_document_id = last_document_id = -1
+        for document in documents:
+            assert document.document_id > last_document_id
+            if count == 0:
+                first_document_id = document.document_id
+            else:
+                document_lengths.extend(array("q", bytes(8 * (document.document_id - last_document_id - 1))))
+            last_document_id = document.document_id
+            count += 1
+            term_frequencies = Counter(self._analyzer.get_document_terms(document, self._fields))
+            document_length = sum(term_frequencies.values())
+            document_lengths.append(document_length)
+            for (term, term_frequency) in term_frequencies.items():
+                posting_list = posting_lists.get(term)
+                if posting_list is None:
+                    posting_list = posting_lists[term] = CompressedPostingList()
+                posting_list.append(document.document_id, term_frequency, document_length)
+        return Segment(posting_lists, count, first_document_id, last_document_id, document_lengths) if count else None
+
+    def _merge_once(self) -> bool:
+        # Pick the segments to merge while holding the lock, but merge them without it so that
+        # documents can be added and queries answered meanwhile. Segments are only ever removed
+        # here, so the picked segments are still in place, next to each other, when we're done.
+        with self._condition:
+            merge = self._merge_policy.find_merge(self._segments)
+            if merge is None:
+                return False
+            start, stop = merge
+            picked = self._segments[start:stop]
+            self._merging = True
+        try:
+            merged = Segment.merge(picked)
+        except Exception:
+            with self._condition:
+                self._merging = False
+                self._condition.notify_all()
+            raise
+        with self._condition:
+            start = self._segments.index(picked[0])
+            assert self._segments[start:start + len(picked)] == picked
+            self._segments[start:start + len(picked)] = [merged]
+            self._generation += 1
+            self._merging = False
+            self._condition.notify_all()
+        return True
+
+    def _merge_loop(self) -> None:
+        while True:
+            with self._condition:
+                while not self._closed and self._merge_policy.find_merge(self._segments) is None:
+                    self._condition.wait()
+                if self._closed:
+                    return
+            try:
+                self._merge_once()
+            except Exception as e:
+                with self._condition:
+                    self._error = e
+                    self._closed = True
+                    self._condition.notify_all()
+                return
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("Merging segments failed") from self._error
+
+    def wait_for_merges(self) -> None:
+        """
+        Blocks until the merge policy has nothing more to merge.
+        """
+        with self._condition:
+            while (not self._closed and self._merger is not None and
+                   (self._merging or self._merge_policy.find_merge(self._segments) is not None)):
+                self._condition.wait()
+            self._raise_error()
+
+    def close(self) -> None:
+        """
+        Stops the background merging. The segments stay searchable, but no more documents can be added.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._merger is not None:
+            self._merger.join()
+
+    def get_terms(self, buffer: str) -> Iterator[str]:
+        return iter(self._analyzer.get_terms(buffer))
+
+    def get_postings_iterator(self, term: str) -> Iterator[Posting]:
+        # The segments cover ascending ranges of document identifiers, so reading them one after
+        # another keeps the postings sorted. The snapshot stays valid even if segments are merged.
+        return itertools.chain.from_iterable(
+            posting_list for posting_list in (segment.get_posting_list(term) for segment in self.segments)
+            if posting_list is not None)
+
+    def get_postings_cursor(self, term: str) -> PostingsCursor:
+        return ConcatenatedPostingsCursor(
+            [posting_list for posting_list in (segment.get_posting_list(term) for segment in self.segments)
+             if posting_list is not None])
+
+    def get_document_frequency(self, term: str) -> int:
+        return sum(len(posting_list) for posting_list in (segment.get_posting_list(term) for segment in self.segments)
+                   if posting_list is not None)
+
+    def get_term_bounds(self, term: str) -> Tuple[int, int]:
+        # Each segment's posting list keeps the bounds of its postings, which merging carries over,
+        # see CompressedPostingList.concatenate(), so the bounds of the term are those of its segments.
+        posting_lists = [posting_list for posting_list in (segment.get_posting_list(term) for segment in self.segments)
+                         if posting_list is not None and len(posting_list) > 0]
+        if not posting_lists:
+            return 0, 0
+        return (max(posting_list.max_term_frequency for posting_list in posting_lists),
+                min(posting_list.min_document_length for posting_list in posting_lists))
+
+    def get_vocabulary(self) -> Iterator[str]:
+        segments = self.segments
+        if len(segments) == 1:
+            return segments[0].get_vocabulary()
+        return iter(set(itertools.chain.from_iterable(segment.get_vocabulary() for segment in segments)))
+
+    def get_document_lengths(self) -> Sequence[int]:
+        # Joined from the segments on demand, and kept until the segments change.
+        with self._condition:
+            generation, segments = self._generation, list(self._segments)
+            cached_generation, document_lengths = self._document_lengths
+        if cached_generation != generation:
+            document_lengths = array("q")
+            for segment in segments:
+                document_lengths.extend(array("q", bytes(8 * (segment.first_document_id - len(document_lengths)))))
+                document_lengths.extend(segment.document_lengths)
+            with self._condition:
+                self._document_lengths = (generation, document_lengths)
+        return document_lengths
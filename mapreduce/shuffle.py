@@ -0,0 +1,409 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import heapq
+import itertools
+import mmap
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from array import array
+from typing import BinaryIO, Collection, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .partitioning import Partitioner
+
+
+class PackedRun:
+    """
+    A run of intermediate records for a single partition, packed into flat arrays of integers.
+    The distinct terms of the run are kept once, in sorted order, as a side table, and a term's
+    records are referred to by its position in that table, i.e., by a term ID local to the run.
+    The records of the term with ID i are the (document ID, term frequency) pairs stored
+    alternately in postings[offsets[i]:offsets[i + 1]], sorted by document ID.
+
+    A record takes 16 bytes this way, and moving a run between processes or to and from disk
+    copies a few large buffers instead of pickling a tuple per record. A run written to a file
+    can be attached again without reading it, in which case the offsets and postings are
+    memoryviews of the mapped file rather than arrays.
+    """
+
+    __slots__ = ("terms", "offsets", "postings")
+
+    def __init__(self, terms: List[str], offsets: Sequence[int], postings: Sequence[int]):
+        assert len(offsets) == len(terms) + 1
+        self.terms = terms
+        self.offsets = offsets
+        self.postings = postings
+
+    def __len__(self):
+        return len(self.postings) // 2
+
+    def __iter__(self) -> Iterator[Tuple[str, int, int]]:
+        """
+        Yields the records of the run as (term, document ID, term frequency) tuples, in order.
+        """
+        postings = self.postings
+        for term_id, term in enumerate(self.terms):
+            for i in range(self.offsets[term_id], self.offsets[term_id + 1], 2):
+                yield term, postings[i], postings[i + 1]
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Returns the size of the run as written by write().
+        """
+        return 8 * (3 + 2 * len(self.terms) + len(self.postings)) + sum(len(term.encode("utf-8")) for term in self.terms)
+
+    def write(self, f: BinaryIO) -> None:
+        """
+        Writes the run to a binary file. The numbers come first, so that they're aligned for
+        attach(), and the terms last.
+        """
+        encoded = [term.encode("utf-8") for term in self.terms]
+        for buffer in [array("q", [len(self.terms), len(self.postings)]), array("q", map(len, encoded)),
+                       self.offsets, self.postings, b"".join(encoded)]:
+            f.write(buffer)
+
+    @staticmethod
+    def attach(filename: str) -> "PackedRun":
+        """
+        Maps a run written by write() into memory. Only the terms are decoded, the offsets and
+        postings are read straight from the page cache as they're used, and the file stays
+        mapped for as long as any of them are referenced.
+        """
+        with open(filename, "rb") as f:
+            return PackedRun.read(memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)))
+
+    @staticmethod
+    def read(view: memoryview) -> "PackedRun":
+        """
+        Reads a run written by write() from a buffer, e.g., one received over a socket. The
+        offsets and postings are views of the buffer, not copies.
+        """
+        lengths, offsets, postings, blob = PackedRun._layout(view)
+        blob = bytes(blob)
+        ends = list(itertools.accumulate(lengths))
+        terms = [blob[start:end].decode("utf-8") for start, end in zip([0] + ends, ends)]
+        return PackedRun(terms, offsets, postings)
+
+    @staticmethod
+    def scan(filename: str) -> Iterator[Tuple[str, Sequence[int]]]:
+        """
+        Yields the terms of a run written by write() in order, each with its alternating
+        document IDs and term frequencies. Unlike attach(), the terms are decoded one at a
+        time as they're reached, so scanning a run holds on to little more than the current
+        term. The file is mapped when the scan starts, and unmapped once the scan and every
+        piece it yielded are gone.
+        """
+        with open(filename, "rb") as f:
+            view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        lengths, offsets, postings, blob = PackedRun._layout(view)
+        start = 0
+        for term_id, length in enumerate(lengths):
+            yield str(blob[start:start + length], "utf-8"), postings[offsets[term_id]:offsets[term_id + 1]]
+            start += length
+
+    # Find the term lengths, offsets, postings and term blob in a buffer written by write().
+    @staticmethod
+    def _layout(view: memoryview) -> Tuple[memoryview, memoryview, memoryview, memoryview]:
+        count, length = view[:16].cast("q")
+        numbers = view[:8 * (3 + 2 * count + length)].cast("q")
+        lengths = numbers[2:2 + count]
+        offsets = numbers[2 + count:3 + 2 * count]
+        postings = numbers[3 + 2 * count:3 + 2 * count + length]
+        return lengths, offsets, postings, view[8 * (3 + 2 * count + length):]
+
+
+class RunReference(ABC):
+    """
+    Refers to a run that is kept somewhere the reducer can't simply map into memory, e.g.,
+    by the worker on another machine that produced it. See RemoteShuffle.
+    """
+
+    @property
+    @abstractmethod
+    def nbytes(self) -> int:
+        """
+        Returns the size of the run as written by PackedRun.write().
+        """
+        pass
+
+    @abstractmethod
+    def load(self) -> PackedRun:
+        """
+        Fetches the run from wherever it's kept.
+        """
+        pass
+
+
+# A sorted run of intermediate records for a single partition. A run is either kept in memory,
+# written to disk and referred to by its file name, or kept elsewhere and referred to by a RunReference.
+Run = Union[PackedRun, str, RunReference]
+
+
+class Shuffle:
+    """
+    Describes how intermediate records move from the mappers to the reducers. Mappers
+    partition their records with the partitioner and pack each partition into runs, see
+    PackedRun. If a memory budget is given, a mapper spills its buffered records to run files
+    in the given directory whenever the budget is exceeded. Reducers then merge the runs of
+    their partition term by term, so that each term string is compared and resolved once per
+    run rather than once per record.
+
+    If the shuffle is shared, i.e., the mappers and reducers run in separate processes, the
+    mappers write all their runs to files in the directory and only hand on the file names,
+    and the reducers map the files into memory, see PackedRun.scan(). The runs thus never
+    pass through a pipe: a mapper copies a run into the page cache once, and the reducer reads
+    it from there. The owner of the directory removes it, and all run files with it, when the
+    job is done or has failed.
+
+    The shuffle is handed to every map task, so it only carries a few plain values.
+    """
+
+    def __init__(self, partitioner: Partitioner, memory_budget: Optional[int] = None, directory: Optional[str] = None,
+                 shared: bool = False):
+        assert (memory_budget is None and not shared) or directory is not None
+        self._partitioner = partitioner
+        self._memory_budget = memory_budget
+        self._directory = directory
+        self._shared = shared
+
+    @property
+    def partitions(self) -> int:
+        return self._partitioner.partitions
+
+    @property
+    def partitioner(self) -> Partitioner:
+        return self._partitioner
+
+    @property
+    def memory_budget(self) -> Optional[int]:
+        return self._memory_budget
+
+    @property
+    def shared(self) -> bool:
+        return self._shared
+
+    def writer(self) -> "ShuffleWriter":
+        """
+        Creates a writer for the output of a single map task.
+        """
+        return ShuffleWriter(self)
+
+    @staticmethod
+    def merge(runs: List[Run]) -> Iterator[Tuple[str, List[Sequence[int]]]]:
+        """
+        Yields the terms of the given runs of a partition in sorted order, each with the
+        alternating document IDs and term frequencies of the term in every run that has it,
+        in the order of the runs. This is a k-way merge over the sorted term tables of the
+        runs, so the reducer only holds the pieces of the current term, however many runs
+        there are. Run files are scanned rather than read, so their records are only paged
+        in as the reducer gets to them, and a run is let go of once the merge is past it.
+        Referenced runs are loaded when the merge starts.
+        """
+        # The heap holds the current term of each run that has terms left, along with the position of
+        # the run, which breaks ties between runs in their order and spares comparing the records.
+        scans = [Shuffle._scan(run) for run in runs]
+        heap = []
+        for i, scan in enumerate(scans):
+            head = next(scan, None)
+            if head is not None:
+                heap.append((head[0], i, head[1]))
+        heapq.heapify(heap)
+        while heap:
+            term = heap[0][0]
+            pieces = []
+            while heap and heap[0][0] == term:
+                _, i, piece = heap[0]
+                pieces.append(piece)
+                head = next(scans[i], None)
+                if head is None:
+                    heapq.heappop(heap)
+                    scans[i] = None
+                else:
+                    heapq.heapreplace(heap, (head[0], i, head[1]))
+            yield term, pieces
+
+    # Iterate over the terms of a run in order, each with its records.
+    @staticmethod
+    def _scan(run: Run) -> Iterator[Tuple[str, Sequence[int]]]:
+        if isinstance(run, str):
+            return PackedRun.scan(run)
+        if isinstance(run, RunReference):
+            run = run.load()
+        postings, offsets = run.postings, run.offsets
+        return zip(run.terms, (postings[start:stop] for start, stop in zip(offsets, itertools.islice(offsets, 1, None))))
+
+    @staticmethod
+    def concatenate(runs: List[Run]) -> PackedRun:
+        """
+        Merges runs of a partition into a single run, given runs that cover consecutive ranges
+        of documents in order, e.g., the runs of consecutive map tasks. The records of a term
+        are then sorted by document ID by putting its pieces one after another.
+        """
+        terms = []
+        offsets = array("q", [0])
+        postings = array("q")
+        for term, pieces in Shuffle.merge(runs):
+            terms.append(term)
+            for piece in pieces:
+                postings.frombytes(memoryview(piece).cast("B"))
+            offsets.append(len(postings))
+        return PackedRun(terms, offsets, postings)
+
+    @staticmethod
+    def size(run: Run) -> int:
+        """
+        Returns the size of a run in bytes, whether it's in memory or in a file.
+        """
+        return os.path.getsize(run) if isinstance(run, str) else run.nbytes
+
+    def write_run(self, run: PackedRun) -> Run:
+        """
+        Writes a run to a new file in the shuffle's directory and returns its name.
+        """
+        handle, filename = tempfile.mkstemp(suffix=".run", dir=self._directory)
+        with os.fdopen(handle, "wb") as f:
+            run.write(f)
+        return filename
+
+    def discard(self) -> None:
+        """
+        Drops the runs of the job once the reducers are done with them. Run files in the
+        directory are removed with the directory by its owner, so there's nothing to do here.
+        """
+        pass
+
+
+class ShuffleWriter:
+    """
+    Buffers the records of a single map task and packs them into a run per partition, when
+    the map task is done or whenever the estimated size of the buffer exceeds the shuffle's
+    memory budget, in which case the runs are spilled to files.
+
+    The records are buffered by term, as arrays of alternating document IDs and term
+    frequencies, so that a term string is hashed once per record, and a term is only
+    partitioned once per run unless the partitioner splits it.
+    """
+
+    # Rough size of the buffer of a term, its dictionary entry and the term string, on top of
+    # the characters of the term, and of a record in the buffer.
+    _TERM_OVERHEAD = 200
+    _RECORD_SIZE = 16
+
+    def __init__(self, shuffle: Shuffle):
+        self._shuffle = shuffle
+        self._buffers = {}
+        self._last_document_id = -1
+        self._sorted = True
+        self._runs = [[] for _ in range(shuffle.partitions)]
+        self._records = [0] * shuffle.partitions
+        self._buffered_bytes = 0
+
+    @property
+    def records(self) -> List[int]:
+        """
+        Returns the number of records packed into runs for each partition.
+        """
+        return self._records
+
+    def add(self, keyvals: Collection[Tuple[str, int, int]]) -> None:
+        """
+        Adds (term, document ID, term frequency) records to the output of the map task.
+        The records are expected in order of document ID, as mappers go through their
+        documents in order, but any order works.
+        """
+        buffers = self._buffers
+        last_document_id = self._last_document_id
+        overhead = self._TERM_OVERHEAD
+        new_bytes = 0
+        for term, document_id, term_frequency in keyvals:
+            buffer = buffers.get(term)
+            if buffer is None:
+                buffer = buffers[term] = array("q")
+                new_bytes += len(term) + overhead
+            buffer.append(document_id)
+            buffer.append(term_frequency)
+            if document_id < last_document_id:
+                self._sorted = False
+            last_document_id = document_id
+        self._last_document_id = last_document_id
+        self._account(len(keyvals), new_bytes)
+
+    def add_document(self, document_id: int, term_frequencies: Collection[Tuple[str, int]]) -> None:
+        """
+        Adds the records of a single document, as (term, term frequency) pairs, which spares
+        the mapper from building a record tuple per term. See add().
+        """
+        buffers = self._buffers
+        overhead = self._TERM_OVERHEAD
+        new_bytes = 0
+        for term, term_frequency in term_frequencies:
+            buffer = buffers.get(term)
+            if buffer is None:
+                buffer = buffers[term] = array("q")
+                new_bytes += len(term) + overhead
+            buffer.append(document_id)
+            buffer.append(term_frequency)
+        if document_id < self._last_document_id:
+            self._sorted = False
+        self._last_document_id = document_id
+        self._account(len(term_frequencies), new_bytes)
+
+    # Count the given number of records and the estimated size of new term buffers towards
+    # the memory budget, if any, and spill if the budget is exceeded.
+    def _account(self, records: int, new_bytes: int) -> None:
+        budget = self._shuffle.memory_budget
+        if budget is not None:
+            self._buffered_bytes += self._RECORD_SIZE * records + new_bytes
+            if self._buffered_bytes > budget:
+                self._spill()
+
+    def close(self) -> List[List[Run]]:
+        """
+        Returns the runs of the map task, as a list of runs for each partition. Nothing is
+        written to disk unless the shuffle is shared or the buffer overflowed at least once.
+        """
+        if any(self._runs) or self._shuffle.shared:
+            self._spill()
+        else:
+            for partition, run in enumerate(self._pack()):
+                if run is not None:
+                    self._runs[partition].append(run)
+        return self._runs
+
+    def _spill(self) -> None:
+        for partition, run in enumerate(self._pack()):
+            if run is not None:
+                self._runs[partition].append(self._shuffle.write_run(run))
+        self._buffered_bytes = 0
+
+    # Pack the buffered records into a run for each partition, or None for a partition without
+    # records, and empty the buffer.
+    def _pack(self) -> List[Optional[PackedRun]]:
+        partitioner = self._shuffle.partitioner
+        get_partition, is_split = partitioner.get_partition, partitioner.is_split
+        runs = [PackedRun([], array("q", [0]), array("q")) for _ in range(self._shuffle.partitions)]
+        buffers, self._buffers = self._buffers, {}
+        for term in sorted(buffers):
+            buffer = buffers[term]
+            if not self._sorted:
+                buffer = array("q", itertools.chain.from_iterable(sorted(zip(buffer[::2], buffer[1::2]))))
+            if not is_split(term):
+                run = runs[get_partition(term, buffer[0])]
+                run.terms.append(term)
+                run.postings.extend(buffer)
+                run.offsets.append(len(run.postings))
+                continue
+            for i in range(0, len(buffer), 2):
+                run = runs[get_partition(term, buffer[i])]
+                if not run.terms or run.terms[-1] != term:
+                    run.terms.append(term)
+                    run.offsets.append(len(run.postings))
+                run.postings.extend(buffer[i:i + 2])
+                run.offsets[-1] = len(run.postings)
+        self._sorted = True
+        self._last_document_id = -1
+        for partition, run in enumerate(runs):
+            self._records[partition] += len(run)
+        return [run if run.terms else None for run in runs]
@@ -0,0 +1,40 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from typing import List, Sequence
+
+
+def plan_splits(sizes: Sequence[int], target_splits: int, min_split_size: int) -> List[range]:
+    """
+    Plans the input splits for the map phase. The sizes are the estimated sizes of the
+    documents, in document ID order, e.g., their lengths in characters. The documents are
+    divided into contiguous ranges of document IDs with roughly equal total size, aiming
+    for the given number of splits but never making a split smaller than min_split_size
+    unless it's the last one.
+
+    Sizing splits by content rather than by document count keeps the map tasks balanced
+    for corpora with a few long documents as well as for corpora with many short ones.
+    Asking for a few more splits than there are mappers leaves room for idle workers
+    to pull more work while a slow split is still being mapped.
+    """
+    assert target_splits > 0
+    assert min_split_size >= 0
+    total_size = sum(sizes)
+    split_size = max(total_size / target_splits, min_split_size, 1)
+
+    # Cut whenever the running total passes the next multiple of the split size, so
+    # that rounding errors don't accumulate into a tiny or huge last split.
+    splits = []
+    start = 0
+    accumulated = 0
+    current = 0
+    for document_id, size in enumerate(sizes):
+        accumulated += size
+        current += size
+        if current >= min_split_size and accumulated >= (len(splits) + 1) * split_size:
+            splits.append(range(start, document_id + 1))
+            start = document_id + 1
+            current = 0
+    if start < len(sizes):
+        splits.append(range(start, len(sizes)))
+    return splits
@@ -0,0 +1,220 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import contextlib
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where peak memory isn't reported.
+    resource = None
+
+
+def peak_memory() -> int:
+    """
+    Returns the peak resident set size of the calling process so far in bytes, or 0 if the
+    platform doesn't report it. This is a high-water mark for the lifetime of the process,
+    so it never goes down between jobs.
+    """
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+class TaskStats:
+    """
+    The metrics of a single map or reduce task. The times are measured in the thread that ran
+    the attempt that succeeded, and the peak memory is that of the process that ran it, see
+    peak_memory(). What counts as a record depends on the phase: a map task reads documents
+    and writes intermediate records, a reduce task reads intermediate records and writes
+    posting lists. A task that failed or straggled took more than one attempt, see Scheduler.
+    The times and the peak memory are 0 if the tasks weren't measured, see MeasuredTask.
+    """
+
+    __slots__ = ("phase", "task", "wall", "cpu", "records_in", "records_out", "peak_memory", "attempts")
+
+    def __init__(self, phase: str, task: int, wall: float, cpu: float, records_in: int, records_out: int,
+                 peak_memory: int, attempts: int = 1):
+        self.phase = phase
+        self.task = task
+        self.wall = wall
+        self.cpu = cpu
+        self.records_in = records_in
+        self.records_out = records_out
+        self.peak_memory = peak_memory
+        self.attempts = attempts
+
+    def __repr__(self):
+        return str({slot: getattr(self, slot) for slot in self.__slots__})
+
+
+class PhaseStats:
+    """
+    The metrics of a phase of a job. The wall and CPU times are those of the calling process,
+    so the CPU time only includes the work of the tasks if they ran in threads. The tasks
+    of the phase, if any, have their own metrics.
+    """
+
+    __slots__ = ("name", "wall", "cpu", "peak_memory", "tasks")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_memory = 0
+        self.tasks = []
+
+    def __repr__(self):
+        return str({slot: getattr(self, slot) for slot in self.__slots__})
+
+    @property
+    def slowest(self) -> Optional[TaskStats]:
+        """
+        Returns the task that took the longest, i.e., the one that held up the phase, if any.
+        """
+        return max(self.tasks, key=lambda task: task.wall, default=None)
+
+
+class JobStats:
+    """
+    The metrics of a job, phase by phase in the order the phases ran, along with the number
+    of intermediate records and the bytes of the runs that each partition received from the
+    mappers.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.partition_records = []
+        self.partition_bytes = []
+
+    def __repr__(self):
+        return str({"phases": list(self.phases.values()), "partition_records": self.partition_records,
+                    "partition_bytes": self.partition_bytes})
+
+    @property
+    def wall(self) -> float:
+        return sum(phase.wall for phase in self.phases.values())
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        """
+        Returns the wall time in seconds of each phase, by phase name.
+        """
+        return {name: phase.wall for name, phase in self.phases.items()}
+
+    @property
+    def bytes_shuffled(self) -> int:
+        return sum(self.partition_bytes)
+
+    @property
+    def peak_memory(self) -> int:
+        """
+        Returns the highest peak memory seen by any phase or task, see peak_memory().
+        """
+        return max([phase.peak_memory for phase in self.phases.values()] +
+                   [task.peak_memory for phase in self.phases.values() for task in phase.tasks], default=0)
+
+    @contextlib.contextmanager
+    def phase(self, name: str, listener: Optional["JobListener"] = None) -> Iterator[PhaseStats]:
+        """
+        Measures the phase run in the body of the with statement, and tells the listener, if
+        any, when the phase starts and ends. The phase is only recorded if it completes.
+        """
+        if listener:
+            listener.phase_started(self, name)
+        phase = PhaseStats(name)
+        wall, cpu = time.perf_counter(), time.process_time()
+        yield phase
+        phase.wall = time.perf_counter() - wall
+        phase.cpu = time.process_time() - cpu
+        phase.peak_memory = peak_memory()
+        self.phases[name] = phase
+        if listener:
+            listener.phase_finished(self, phase)
+
+    def report(self) -> str:
+        """
+        Formats the metrics as a table with a line per phase, for humans.
+        """
+        lines = ["{:<14} {:>9} {:>9} {:>6} {:>9} {:>9}".format("phase", "wall", "cpu", "tasks", "slowest", "peak")]
+        for phase in self.phases.values():
+            slowest = phase.slowest
+            lines.append("{:<14} {:>7.0f}ms {:>7.0f}ms {:>6} {:>9} {:>7.1f}MB".format(
+                phase.name, phase.wall * 1000, phase.cpu * 1000, len(phase.tasks),
+                "{:.0f}ms".format(slowest.wall * 1000) if slowest else "-", phase.peak_memory / 2 ** 20))
+        lines.append("records per partition: {}, bytes shuffled: {:,}".format(self.partition_records,
+                                                                              self.bytes_shuffled))
+        return "\n".join(lines)
+
+
+class JobListener:
+    """
+    Hooks into the progress of a job, e.g., to log or profile it. The methods are called in
+    the thread that runs the job, and do nothing by default.
+    """
+
+    def phase_started(self, stats: JobStats, name: str) -> None:
+        """
+        Called when a phase starts.
+        """
+        pass
+
+    def task_finished(self, stats: JobStats, task: TaskStats) -> None:
+        """
+        Called once for each task of a phase, with the metrics of the attempt whose result was
+        used. Failed attempts and abandoned backup copies aren't reported, but they're counted
+        in task.attempts. In the map phase of a pipeline, see MapReducer, this is called as
+        each task finishes, in order of completion. In the other phases it's called for each
+        task in order once all tasks of the phase are done.
+        """
+        pass
+
+    def phase_finished(self, stats: JobStats, phase: PhaseStats) -> None:
+        """
+        Called when a phase ends, after the tasks of the phase were reported.
+        """
+        pass
+
+
+class PrintingListener(JobListener):
+    """
+    Prints a line when a phase starts and when it ends, with the wall time of the phase and
+    of its slowest task.
+    """
+
+    def phase_started(self, stats: JobStats, name: str) -> None:
+        print("Starting " + name + "...")
+
+    def phase_finished(self, stats: JobStats, phase: PhaseStats) -> None:
+        if phase.name == "partitioning":
+            print("Records per partition: " + str(stats.partition_records))
+        slowest = phase.slowest
+        print("Finished {} in {:.0f}ms{}".format(phase.name, phase.wall * 1000, "" if slowest is None else
+                                                 ", slowest of {} tasks {:.0f}ms".format(len(phase.tasks),
+                                                                                         slowest.wall * 1000)))
+
+
+class MeasuredTask:
+    """
+    Wraps a task function, so that func(context, task) also returns how long the task took
+    and the peak memory of the process that ran it, as (result, wall, cpu, peak memory). The
+    wrapper is as picklable as the function, so it works with every executor. If measure is
+    False, the times and the peak memory are 0, and the wrapper only calls the function,
+    without the clock reads and the system call that measuring takes.
+    """
+
+    __slots__ = ("func", "measure")
+
+    def __init__(self, func: Callable[[Any, Any], Any], measure: bool = True):
+        self.func = func
+        self.measure = measure
+
+    def __call__(self, context: Any, task: Any) -> Tuple[Any, float, float, int]:
+        if not self.measure:
+            return self.func(context, task), 0.0, 0.0, 0
+        wall, cpu = time.perf_counter(), time.thread_time()
+        result = self.func(context, task)
+        return result, time.perf_counter() - wall, time.thread_time() - cpu, peak_memory()
@@ -0,0 +1,269 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterator, Optional, Sequence, Tuple
+
+from .analysis import Analyzer
+from .invertedindex import InvertedIndex
+from .normalization import Normalizer
+from .posting import Posting
+from .postinglist import CompressedPostingList, PostingsCursor
+from .tokenization import Tokenizer
+
+
+# The on-disk format is a directory with five files, each starting with a 16 byte header
+# holding a magic number, the format version and the number of terms N:
+#
+#   dictionary.bin   N + 1 term offsets (uint64) into the UTF-8 encoded terms, which follow
+#                    them. Terms are sorted by their UTF-8 bytes, and a term's rank in that
+#                    order is its term ID.
+#   postings.bin     N + 1 posting list offsets (uint64) into the compressed posting lists,
+#                    see CompressedPostingList, and N + 1 skip table offsets (uint64), in
+#                    skip pointers, into the skip tables. The skip tables follow the offsets,
+#                    and the posting lists follow the skip tables. The skip table of a term
+#                    is the document IDs (uint64) of its skip pointers followed by their
+#                    positions (uint64) in its posting list, see CompressedPostingList.get_skips().
+#   frequencies.bin  N document frequencies (uint64), i.e., the length of each posting list.
+#   lengths.bin      The number of terms in each document (uint64), indexed by document ID.
+#                    The header holds the number of documents instead of the number of terms.
+#   bounds.bin       N largest term frequencies (uint64), followed by N smallest lengths of a
+#                    document (uint64), of the postings of each term, for bounding the scores
+#                    of the terms when ranking, see InvertedIndex.get_term_bounds().
+#
+# Integers are stored little-endian. Offsets are relative to the end of the offset table,
+# or for posting lists to the end of the skip tables.
+# Version 2 added lengths.bin, version 3 the skip tables, and version 4 bounds.bin.
+FORMAT_VERSION = 4
+
+_HEADER = struct.Struct("<4sIQ")
+_DICTIONARY_MAGIC = b"MRDI"
+_POSTINGS_MAGIC = b"MRPO"
+_FREQUENCIES_MAGIC = b"MRDF"
+_LENGTHS_MAGIC = b"MRDL"
+_BOUNDS_MAGIC = b"MRTB"
+
+
+def _to_little_endian(numbers: array) -> bytes:
+    if sys.byteorder != "little":
+        numbers = array(numbers.typecode, numbers)
+        numbers.byteswap()
+    return numbers.tobytes()
+
+
+def _write_file(filename: str, magic: bytes, count: int, *chunks) -> None:
+    with open(filename, mode="wb") as f:
+        f.write(_HEADER.pack(magic, FORMAT_VERSION, count))
+        for chunk in chunks:
+            f.write(chunk)
+
+
+def save_index(index: InvertedIndex, directory: str) -> None:
+    """
+    Saves any inverted index to the given directory, creating it if needed. The posting
+    lists are read through get_postings_iterator() and compressed as they're written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    terms = sorted(term.encode("utf-8") for term in index.get_vocabulary())
+    lengths = array("Q", index.get_document_lengths())
+
+    term_offsets = array("Q", [0])
+    posting_offsets = array("Q", [0])
+    skip_offsets = array("Q", [0])
+    frequencies = array("Q")
+    max_term_frequencies = array("Q")
+    min_document_lengths = array("Q")
+    buffers = []
+    skip_tables = []
+    for term in terms:
+        term_offsets.append(term_offsets[-1] + len(term))
+        postings = index.get_postings_iterator(term.decode("utf-8"))
+        posting_list = CompressedPostingList.from_postings(postings, lengths)
+        buffers.append(posting_list.buffer)
+        posting_offsets.append(posting_offsets[-1] + len(posting_list.buffer))
+        document_ids, positions = posting_list.get_skips()
+        skip_tables.append(_to_little_endian(array("Q", document_ids)) + _to_little_endian(array("Q", positions)))
+        skip_offsets.append(skip_offsets[-1] + len(document_ids))
+        frequencies.append(len(posting_list))
+        max_term_frequencies.append(posting_list.max_term_frequency)
+        min_document_lengths.append(posting_list.min_document_length)
+
+    _write_file(os.path.join(directory, "dictionary.bin"), _DICTIONARY_MAGIC, len(terms),
+                _to_little_endian(term_offsets), b"".join(terms))
+    _write_file(os.path.join(directory, "postings.bin"), _POSTINGS_MAGIC, len(terms),
+                _to_little_endian(posting_offsets), _to_little_endian(skip_offsets), b"".join(skip_tables),
+                b"".join(buffers))
+    _write_file(os.path.join(directory, "frequencies.bin"), _FREQUENCIES_MAGIC, len(terms),
+                _to_little_endian(frequencies))
+    _write_file(os.path.join(directory, "lengths.bin"), _LENGTHS_MAGIC, len(lengths),
+                _to_little_endian(lengths))
+    _write_file(os.path.join(directory, "bounds.bin"), _BOUNDS_MAGIC, len(terms),
+                _to_little_endian(max_term_frequencies), _to_little_endian(min_document_lengths))
+
+
+class _MappedFile:
+    """
+    A memory-mapped file of the index format. The header is verified when the file is opened,
+    while the rest is only paged in by the OS when it's accessed.
+    """
+
+    def __init__(self, filename: str, magic: bytes):
+        with open(filename, mode="rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        file_magic, version, self.count = _HEADER.unpack_from(self._mmap, 0)
+        if file_magic != magic:
+            self.close()
+            raise IOError("Not an index file: " + filename)
+        if version != FORMAT_VERSION:
+            self.close()
+            raise IOError("Unsupported index format version {} in {}".format(version, filename))
+        self._view = memoryview(self._mmap)
+
+    def get_integers(self, offset: int, count: int):
+        """
+        Returns a view of count uint64s starting at the given offset, without copying them.
+        """
+        view = self._view[_HEADER.size + offset:_HEADER.size + offset + 8 * count]
+        if sys.byteorder != "little":
+            numbers = array("Q")
+            numbers.frombytes(view)
+            numbers.byteswap()
+            return numbers
+        return view.cast("Q")
+
+    def get_bytes(self, offset: int, end: int) -> memoryview:
+        return self._view[_HEADER.size + offset:_HEADER.size + end]
+
+    def close(self) -> None:
+        if getattr(self, "_view", None) is not None:
+            self._view.release()
+            self._view = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Posting lists handed out earlier still refer to the mapping, which is then
+            # unmapped once the last of them is garbage collected.
+            pass
+
+
+class DiskInvertedIndex(InvertedIndex):
+    """
+    An inverted index that serves a saved index straight from disk, see save_index(). Opening
+    it only maps the files into memory, so startup takes the same time for any index size.
+    Terms are looked up by binary search over the sorted dictionary, document frequencies are
+    read without touching the posting lists, and posting lists are decompressed lazily from
+    the mapped file as they're iterated over. Cursors skip ahead with the skip tables stored
+    next to the posting lists, so they never need a pass over a posting list of their own.
+
+    The normalizer and tokenizer must be those the index was built with.
+    """
+
+    def __init__(self, directory: str, normalizer: Normalizer, tokenizer: Tokenizer):
+        self._normalizer = normalizer
+        self._tokenizer = tokenizer
+        self._analyzer = Analyzer(normalizer, tokenizer)
+        self._files = []
+        try:
+            self._dictionary = self._open(os.path.join(directory, "dictionary.bin"), _DICTIONARY_MAGIC)
+            self._postings = self._open(os.path.join(directory, "postings.bin"), _POSTINGS_MAGIC)
+            self._frequencies = self._open(os.path.join(directory, "frequencies.bin"), _FREQUENCIES_MAGIC)
+            self._lengths = self._open(os.path.join(directory, "lengths.bin"), _LENGTHS_MAGIC)
+            self._bounds = self._open(os.path.join(directory, "bounds.bin"), _BOUNDS_MAGIC)
+        except Exception:
+            self.close()
+            raise
+        self._size = self._dictionary.count
+        if self._postings.count != self._size or self._frequencies.count != self._size or \
+                self._bounds.count != self._size:
+            self.close()
+            raise IOError("Index files don't match: " + directory)
+        self._term_offsets = self._dictionary.get_integers(0, self._size + 1)
+        self._posting_offsets = self._postings.get_integers(0, self._size + 1)
+        self._skip_offsets = self._postings.get_integers(8 * (self._size + 1), self._size + 1)
+        self._skips_start = 16 * (self._size + 1)
+        self._postings_start = self._skips_start + 16 * self._skip_offsets[self._size]
+        self._document_frequencies = self._frequencies.get_integers(0, self._size)
+        self._document_lengths = self._lengths.get_integers(0, self._lengths.count)
+        self._max_term_frequencies = self._bounds.get_integers(0, self._size)
+        self._min_document_lengths = self._bounds.get_integers(8 * self._size, self._size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _open(self, filename: str, magic: bytes) -> _MappedFile:
+        mapped_file = _MappedFile(filename, magic)
+        self._files.append(mapped_file)
+        return mapped_file
+
+    def close(self) -> None:
+        """
+        Unmaps the index files. Posting iterators must not be used after the index is closed.
+        """
+        for name in ["_term_offsets", "_posting_offsets", "_skip_offsets", "_document_frequencies",
+                     "_document_lengths", "_max_term_frequencies", "_min_document_lengths"]:
+            view = getattr(self, name, None)
+            if isinstance(view, memoryview):
+                view.release()
+        for mapped_file in self._files:
+            mapped_file.close()
+        self._files = []
+
+    def _get_term(self, term_id: int) -> bytes:
+        terms_start = 8 * (self._size + 1)
+        return bytes(self._dictionary.get_bytes(terms_start + self._term_offsets[term_id],
+                                                terms_start + self._term_offsets[term_id + 1]))
+
+    def _get_term_id(self, term: str) -> Optional[int]:
+        key = term.encode("utf-8")
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_term(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < self._size and self._get_term(low) == key else None
+
+    def get_terms(self, buffer: str) -> Iterator[str]:
+        return iter(self._analyzer.get_terms(buffer))
+
+    def _get_posting_list(self, term: str) -> CompressedPostingList:
+        term_id = self._get_term_id(term)
+        if term_id is None:
+            return CompressedPostingList()
+        buffer = self._postings.get_bytes(self._postings_start + self._posting_offsets[term_id],
+                                          self._postings_start + self._posting_offsets[term_id + 1])
+        start, end = self._skip_offsets[term_id], self._skip_offsets[term_id + 1]
+        skips_start = self._skips_start + 16 * start
+        skips = (self._postings.get_integers(skips_start, end - start),
+                 self._postings.get_integers(skips_start + 8 * (end - start), end - start))
+        return CompressedPostingList(buffer, self._document_frequencies[term_id], skips=skips)
+
+    def get_postings_iterator(self, term: str) -> Iterator[Posting]:
+        return iter(self._get_posting_list(term))
+
+    def get_postings_cursor(self, term: str) -> PostingsCursor:
+        return self._get_posting_list(term).cursor()
+
+    def get_document_frequency(self, term: str) -> int:
+        term_id = self._get_term_id(term)
+        return 0 if term_id is None else self._document_frequencies[term_id]
+
+    def get_term_bounds(self, term: str) -> Tuple[int, int]:
+        term_id = self._get_term_id(term)
+        if term_id is None:
+            return 0, 0
+        return self._max_term_frequencies[term_id], self._min_document_lengths[term_id]
+
+    def get_vocabulary(self) -> Iterator[str]:
+        return (self._get_term(term_id).decode("utf-8") for term_id in range(self._size))
+
+    def get_document_lengths(self) -> Sequence[int]:
+        return self._document_lengths
@@ -21,7 +21,8 @@ class Tokenizer(ABC):
 
     def strings(self, buffer: str) -> List[str]:
         """
-        Returns the strings that make up the tokens in the given buffer.
+        Returns the strings that make up the tokens in the given buffer. Tokenizers that can
+        find the strings without first finding the ranges should override this.
         """
         return [buffer[r[0]:r[1]] for r in self.ranges(buffer)]
 
@@ -46,6 +47,10 @@ class BrainDeadTokenizer(Tokenizer):
     def ranges(self, buffer: str) -> List[Tuple[int, int]]:
         return [(m.start(), m.end()) for m in self._pattern.finditer(buffer)]
 
+    def strings(self, buffer: str) -> List[str]:
+        # The pattern has a single group, so this gives the token strings without any ranges.
+        return self._pattern.findall(buffer)
+
 
 class ShingleGenerator(Tokenizer):
     """
@@ -0,0 +1,39 @@
+import unittest
+
+class TestAnalyzer(unittest.TestCase):
+    def test_slow_path(self):
+        from mapreduce.analysis import Analyzer
+        from mapreduce.corpus import InMemoryDocument
+        from mapreduce.normalization import BrainDeadNormalizer
+        from mapreduce.tokenization import BrainDeadTokenizer, ShingleGenerator, Tokenizer
+
+        normalizer = BrainDeadNormalizer()
+        buffer = "Dette er en test. Test, sa jeg. TEST! prØve"
+        for tokenizer in [BrainDeadTokenizer(), ShingleGenerator(3)]:
+            analyzer = Analyzer(normalizer, tokenizer, cache_size=4)
+            expected = [normalizer.normalize(t) for t in Tokenizer.strings(tokenizer, normalizer.canonicalize(buffer))]
+            self.assertListEqual(tokenizer.strings(buffer), Tokenizer.strings(tokenizer, buffer))
+            self.assertListEqual(analyzer.get_terms(buffer), expected)
+            self.assertListEqual(analyzer.get_terms(buffer), expected)
+            self.assertLessEqual(len(analyzer._cache), 4)
+
+        analyzer = Analyzer(normalizer, BrainDeadTokenizer())
+        documents = [InMemoryDocument(0, {"a": "Test a", "b": "TEST", "c": "wtf"}), InMemoryDocument(1, {"b": "b"})]
+        self.assertListEqual(analyzer.get_document_terms(documents[0], ["a", "b"]), ["test", "a", "test"])
+        self.assertListEqual(analyzer.get_batch_terms(documents, ["a", "b"]), [["test", "a", "test"], ["b"]])
+
+    def test_pickling(self):
+        import pickle
+        from mapreduce.analysis import Analyzer
+        from mapreduce.normalization import BrainDeadNormalizer
+        from mapreduce.tokenization import BrainDeadTokenizer
+
+        analyzer = Analyzer(BrainDeadNormalizer(), BrainDeadTokenizer())
+        self.assertListEqual(analyzer.get_terms("a B c"), ["a", "b", "c"])
+        copy = pickle.loads(pickle.dumps(analyzer))
+        self.assertEqual(len(copy._cache), 0)
+        self.assertListEqual(copy.get_terms("a B c"), ["a", "b", "c"])
+
+
+if __name__ == '__main__':
+    unittest.main()
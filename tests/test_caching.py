@@ -0,0 +1,82 @@
+import unittest
+
+class TestLRUCache(unittest.TestCase):
+    def test_eviction(self):
+        from mapreduce.caching import LRUCache
+        cache = LRUCache(100)
+        cache.put("a", 1, 40)
+        cache.put("b", 2, 40)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3, 40)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        cache.put("d", 4, 101)
+        self.assertIsNone(cache.get("d"))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.size, 80)
+        self.assertTupleEqual((cache.hits, cache.misses, cache.evictions), (2, 2, 1))
+        cache.clear()
+        self.assertEqual((len(cache), cache.size, cache.invalidations), (0, 0, 1))
+
+
+class TestCachedInvertedIndex(unittest.TestCase):
+    def setUp(self):
+        from mapreduce.normalization import BrainDeadNormalizer
+        from mapreduce.tokenization import BrainDeadTokenizer
+        self._normalizer = BrainDeadNormalizer()
+        self._tokenizer = BrainDeadTokenizer()
+
+    def test_posting_cache(self):
+        import os.path
+        from mapreduce.caching import CachedInvertedIndex
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.invertedindex import InMemoryInvertedIndex
+        from mapreduce.query import BooleanSearchEngine
+
+        expected = InMemoryInvertedIndex(InMemoryCorpus(os.path.join("data", "mesh.txt")), ["body"],
+                                         self._normalizer, self._tokenizer)
+        index = CachedInvertedIndex(expected, memory_budget=64 * 1024)
+        for _ in range(2):
+            for term in ["hydrogen", "acid", "of", "wtf"]:
+                self.assertListEqual([(p.document_id, p.term_frequency) for p in index[term]],
+                                     [(p.document_id, p.term_frequency) for p in expected[term]])
+                self.assertEqual(index.get_document_frequency(term), expected.get_document_frequency(term))
+        self.assertEqual(index.cache.misses, 4)
+        self.assertEqual(index.cache.hits, 4)
+        self.assertLessEqual(index.cache.size, index.cache.memory_budget)
+        query = "(of OR acid) ANDNOT hydrogen"
+        self.assertListEqual(list(BooleanSearchEngine(index).evaluate(query)),
+                             list(BooleanSearchEngine(expected).evaluate(query)))
+
+    def test_invalidation(self):
+        from mapreduce.caching import CachedInvertedIndex, ResultCache
+        from mapreduce.corpus import InMemoryDocument
+        from mapreduce.query import BooleanSearchEngine
+        from mapreduce.ranking import RankedSearchEngine
+        from mapreduce.segments import SegmentedInvertedIndex
+
+        with SegmentedInvertedIndex(["body"], self._normalizer, self._tokenizer) as segmented_index:
+            index = CachedInvertedIndex(segmented_index)
+            result_cache = ResultCache()
+            engine = BooleanSearchEngine(index, result_cache)
+            ranked_engine = RankedSearchEngine(index, result_cache=result_cache)
+            segmented_index.add_documents([InMemoryDocument(0, {"body": "this is a Test"})])
+            self.assertListEqual(list(engine.evaluate("test")), [0])
+            self.assertListEqual(list(engine.evaluate("TEST  ")), [0])
+            self.assertListEqual([d for d, _ in ranked_engine.evaluate("test is")], [0])
+            self.assertListEqual([d for d, _ in ranked_engine.evaluate("IS test")], [0])
+            self.assertTupleEqual((result_cache.cache.hits, result_cache.cache.misses), (2, 2))
+            segmented_index.add_documents([InMemoryDocument(1, {"body": "test TEST prØve"})])
+            self.assertListEqual(list(engine.evaluate("test")), [0, 1])
+            self.assertListEqual([d for d, _ in ranked_engine.evaluate("test is")], [0, 1])
+            self.assertListEqual([(p.document_id, p.term_frequency) for p in index["test"]], [(0, 1), (1, 2)])
+            self.assertGreaterEqual(index.cache.invalidations, 1)
+            self.assertGreaterEqual(result_cache.cache.invalidations, 1)
+
+            # The cache belongs to the index it was first used with.
+            with self.assertRaises(ValueError):
+                BooleanSearchEngine(segmented_index, result_cache).evaluate("test")
+
+
+if __name__ == '__main__':
+    unittest.main()
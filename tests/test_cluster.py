@@ -0,0 +1,84 @@
+import unittest
+
+
+class TestCluster(unittest.TestCase):
+    def setUp(self):
+        import subprocess
+        import sys
+        import tempfile
+        from mapreduce.cluster import parse_addresses
+
+        self._directory = tempfile.TemporaryDirectory()
+        self._workers = [subprocess.Popen([sys.executable, "-m", "mapreduce.cluster", "--directory",
+                                           self._directory.name], stdout=subprocess.PIPE, text=True)
+                         for _ in range(3)]
+        self._addresses = parse_addresses(",".join(worker.stdout.readline().split()[-1] for worker in self._workers))
+
+    def tearDown(self):
+        for worker in self._workers:
+            worker.terminate()
+            worker.wait()
+            worker.stdout.close()
+        self._directory.cleanup()
+
+    def test_mapreduce(self):
+        import os
+        import socket
+        from mapreduce.cluster import ClusterExecutor
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.invertedindex import InMemoryInvertedIndex, MapReduceInvertedIndex
+        from mapreduce.normalization import BrainDeadNormalizer
+        from mapreduce.tokenization import BrainDeadTokenizer
+
+        # A worker that's down is left out.
+        with socket.socket() as unused:
+            unused.bind(("127.0.0.1", 0))
+            down = unused.getsockname()
+
+        normalizer, tokenizer = BrainDeadNormalizer(), BrainDeadTokenizer()
+        corpus = InMemoryCorpus(os.path.join("data", "mesh.txt"))
+        expected = InMemoryInvertedIndex(corpus, ["body"], normalizer, tokenizer)
+        index = MapReduceInvertedIndex(corpus, ["body"], normalizer, tokenizer, ClusterExecutor(self._addresses + [down]),
+                                       mappers=3, reducers=3)
+        self.assertListEqual(list(index.get_vocabulary()), list(expected.get_vocabulary()))
+        for term in ["hydrogen", "hydrocephalus", "acid", "wtf"]:
+            self.assertListEqual([(p.document_id, p.term_frequency) for p in index[term]],
+                                 [(p.document_id, p.term_frequency) for p in expected[term]])
+        self.assertGreater(index.stats.bytes_shuffled, 0)
+
+        # Every worker mapped and kept runs, and dropped them when the job was done.
+        workers = os.listdir(self._directory.name)
+        self.assertEqual(len(workers), 3)
+        for worker in workers:
+            self.assertListEqual(os.listdir(os.path.join(self._directory.name, worker)), [])
+
+    def test_errors(self):
+        from mapreduce.cluster import ClusterExecutor
+
+        executor = ClusterExecutor(self._addresses)
+        self.assertListEqual(executor.map(divmod, [3, 4], 7), [(2, 1), (1, 3)])
+        with self.assertRaises(ZeroDivisionError):
+            executor.map(divmod, [0], 7)
+
+    def test_authentication(self):
+        import os
+        import subprocess
+        import sys
+        from mapreduce.cluster import AuthenticationError, ClusterExecutor, Worker, parse_addresses
+
+        with self.assertRaises(ValueError):
+            Worker("0.0.0.0")
+        environment = dict(os.environ, MAPREDUCE_AUTHKEY="secret")
+        worker = subprocess.Popen([sys.executable, "-m", "mapreduce.cluster", "--directory", self._directory.name],
+                                  stdout=subprocess.PIPE, text=True, env=environment)
+        self._workers.append(worker)
+        addresses = parse_addresses(worker.stdout.readline().split()[-1])
+        self.assertListEqual(ClusterExecutor(addresses, b"secret").map(divmod, [3], 7), [(2, 1)])
+        for executor in [ClusterExecutor(addresses, b"guess"), ClusterExecutor(addresses),
+                         ClusterExecutor(self._addresses, b"secret")]:
+            with self.assertRaises(AuthenticationError):
+                executor.map(divmod, [3], 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
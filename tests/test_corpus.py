@@ -0,0 +1,125 @@
+import unittest
+
+class TestStreamingCorpus(unittest.TestCase):
+    def test_same_documents(self):
+        import os.path
+        from mapreduce.corpus import InMemoryCorpus, StreamingCorpus
+        for filename in ["en.txt", "docs.json", "imdb.csv", "cran.xml"]:
+            expected = InMemoryCorpus(os.path.join("data", filename))
+            corpus = StreamingCorpus(os.path.join("data", filename))
+            self.assertListEqual([(d.document_id, d._fields) for d in corpus],
+                                 [(d.document_id, d._fields) for d in expected])
+            self.assertEqual(len(corpus), len(expected))
+
+    def test_random_access(self):
+        import os.path
+        from mapreduce.corpus import InMemoryCorpus, StreamingCorpus
+        expected = InMemoryCorpus(os.path.join("data", "imdb.csv"))
+        corpus = StreamingCorpus(os.path.join("data", "imdb.csv"))
+        self.assertDictEqual(corpus[417]._fields, expected[417]._fields)
+        self.assertListEqual([d.document_id for d in corpus.get_documents(10, 13)], [10, 11, 12])
+        self.assertListEqual(list(corpus.get_documents(5, 5)), [])
+
+        expected = InMemoryCorpus(os.path.join("data", "cran.xml"))
+        corpus = StreamingCorpus(os.path.join("data", "cran.xml"))
+        self.assertListEqual([d._fields for d in corpus.get_documents(0, 3)], [d._fields for d in expected][0:3])
+        self.assertDictEqual(corpus[len(expected) - 1]._fields, expected[len(expected) - 1]._fields)
+
+    def test_mapreduce(self):
+        import os.path
+        from mapreduce.corpus import StreamingCorpus
+        from mapreduce.invertedindex import MapReduceInvertedIndex
+        from mapreduce.normalization import BrainDeadNormalizer
+        from mapreduce.tokenization import BrainDeadTokenizer
+        corpus = StreamingCorpus(os.path.join("data", "mesh.txt"))
+        index = MapReduceInvertedIndex(corpus, ["body"], BrainDeadNormalizer(), BrainDeadTokenizer(), "processes")
+        self.assertEqual(len(list(index["hydrogen"])), 8)
+        self.assertEqual(len(list(index["hydrocephalus"])), 2)
+
+    def test_parallel_index(self):
+        import os.path
+        from mapreduce.corpus import StreamingCorpus
+        from mapreduce.executor import ProcessExecutor, ThreadExecutor
+        for filename in ["en.txt", "docs.json", "imdb.csv"]:
+            expected = StreamingCorpus(os.path.join("data", filename))
+            for executor in [ThreadExecutor(3), ProcessExecutor(2)]:
+                corpus = StreamingCorpus(os.path.join("data", filename), executor)
+                self.assertEqual(corpus._get_offsets(), expected._get_offsets())
+                self.assertEqual(corpus.get_document_sizes(["body"]), expected.get_document_sizes(["body"]))
+
+    def test_line_breaks(self):
+        import os.path
+        import tempfile
+        from mapreduce.corpus import InMemoryCorpus, StreamingCorpus
+        from mapreduce.executor import ThreadExecutor
+        files = {"old.txt": b"first\rsecond\tmeta\r\rthird\r\nfourth\nfifth\r",
+                 "lines.json": b'{"body": "a"}\r{"body": "b"}\r\n\r{"body": "c"}',
+                 "quoted.csv": b'body,meta\r\n"two\r\nlines",x\r\n\r\n"three\nlines\r""",""",y\rplain\r\n"more\n\nlines",z\n'}
+        with tempfile.TemporaryDirectory() as directory:
+            for filename, data in files.items():
+                path = os.path.join(directory, filename)
+                with open(path, mode="wb") as f:
+                    f.write(data)
+                expected = [(d.document_id, d._fields) for d in InMemoryCorpus(path)]
+                self.assertGreaterEqual(len(expected), 3)
+                for executor in [None, ThreadExecutor(3)]:
+                    corpus = StreamingCorpus(path, executor)
+                    self.assertListEqual([(d.document_id, d._fields) for d in corpus], expected)
+                    self.assertListEqual([(d.document_id, d._fields) for d in corpus.get_documents(1, len(corpus))],
+                                         expected[1:])
+                    self.assertListEqual([(corpus[i].document_id, corpus[i]._fields) for i in range(len(corpus))],
+                                         expected)
+
+    def test_split_lines(self):
+        import os.path
+        from mapreduce.corpus import split_lines
+        filename = os.path.join("data", "docs.json")
+        with open(filename, mode="rb") as f:
+            data = f.read()
+        for parts in [1, 2, 3, 7, 1000]:
+            ranges = split_lines(filename, parts)
+            self.assertLessEqual(len(ranges), parts)
+            self.assertEqual(b"".join(data[start:end] for start, end in ranges), data)
+            self.assertTrue(all(data[start - 1:start] == b"\n" for start, _ in ranges[1:]))
+
+    def test_unsupported_extension(self):
+        from mapreduce.corpus import StreamingCorpus
+        with self.assertRaises(IOError):
+            StreamingCorpus("corpus.pdf")
+
+
+class TestXmlDocumentReader(unittest.TestCase):
+    _XML = (b'<?xml version="1.0"?>\n<!-- comment -->\n<docs>\n'
+            b'<doc>a &amp; b<!-- c -->d<x>no<doc>inner</doc>tail</x><![CDATA[e]]>after<?pi x?>\xc3\xa6</doc>\n'
+            b'<doc/>\n<doc>last</doc>\n</docs>\n')
+
+    def test_same_as_dom(self):
+        import io
+        from xml.dom.minidom import parseString
+        from mapreduce.corpus import _XmlDocumentReader
+
+        def get_text(nodes):
+            return " ".join(node.data for node in nodes if node.nodeType == node.TEXT_NODE)
+
+        expected = [get_text(node.childNodes) for node in parseString(self._XML).getElementsByTagName("doc")]
+        reader = _XmlDocumentReader()
+        reader._CHUNK_SIZE = 7
+        self.assertListEqual([fields["body"] for _, fields in reader.read(io.BytesIO(self._XML))], expected)
+        self.assertListEqual(expected, ["a & b d after æ", "inner", "", "last"])
+        self.assertFalse(reader.children_of_root)
+
+    def test_nested_documents(self):
+        import os.path
+        import tempfile
+        from mapreduce.corpus import StreamingCorpus
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "nested.xml")
+            with open(filename, mode="wb") as f:
+                f.write(self._XML)
+            corpus = StreamingCorpus(filename)
+            self.assertEqual(len(corpus), 4)
+            self.assertListEqual([d["body"] for d in corpus.get_documents(1, 3)], ["inner", ""])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+
+class TestFrontCodedDictionary(unittest.TestCase):
+    def setUp(self):
+        self._terms = ["apple", "app", "application", "banana", "band", "bandana", "ø", "øl", "a", "app"] + \
+                      ["t{:03}".format(i) for i in range(100)] + ["x" * 200 + str(i) for i in range(20)]
+        self._sorted = sorted(set(self._terms))
+
+    def test_lookup(self):
+        from mapreduce.dictionary import FrontCodedDictionary
+        for block_size in [1, 4, 16]:
+            dictionary = FrontCodedDictionary(self._terms, block_size)
+            self.assertEqual(len(dictionary), len(self._sorted))
+            self.assertListEqual(list(dictionary), [(term, i) for i, term in enumerate(self._sorted)])
+            for i, term in enumerate(self._sorted):
+                self.assertEqual(dictionary[term], i)
+                self.assertEqual(dictionary.get_term(i), term)
+            for term in ["", "ap", "applez", "b", "t1000", "zzz"]:
+                self.assertIsNone(dictionary.get_term_id(term))
+                self.assertNotIn(term, dictionary)
+            self.assertEqual(dictionary.add_if_absent("band"), dictionary["band"])
+            with self.assertRaises(ValueError):
+                dictionary.add_if_absent("wtf")
+
+    def test_prefix(self):
+        from mapreduce.dictionary import FrontCodedDictionary
+        dictionary = FrontCodedDictionary(self._terms, 4)
+        for prefix in ["", "a", "app", "b", "ø", "t0", "t09", "x", "xx", "0", "zz"]:
+            self.assertListEqual([dictionary.get_term(i) for i in dictionary.prefix(prefix)],
+                                 [term for term in self._sorted if term.startswith(prefix)])
+        self.assertEqual(dictionary.prefix("ban"), range(4, 7))
+        self.assertEqual(len(FrontCodedDictionary([]).prefix("a")), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -48,5 +48,25 @@ class TestInMemoryInvertedIndex(unittest.TestCase):
         self.assertEqual(posting.term_frequency, 5)
 
 
+    def test_front_coding(self):
+        import os.path
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.dictionary import FrontCodedDictionary, InMemoryDictionary
+        from mapreduce.invertedindex import InMemoryInvertedIndex, MapReduceInvertedIndex
+
+        corpus = InMemoryCorpus(os.path.join("data", 'mesh.txt'))
+        expected = InMemoryInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer)
+        self.assertIsInstance(expected._dictionary, InMemoryDictionary)
+        terms = sorted(expected.get_vocabulary())
+        for index in [InMemoryInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer, front_coding=True),
+                      MapReduceInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer, "serial",
+                                             front_coding=True)]:
+            self.assertIsInstance(index._dictionary, FrontCodedDictionary)
+            self.assertListEqual(list(index.get_vocabulary()), terms)
+            for term in terms[::20] + ["wtf"]:
+                self.assertListEqual([(p.document_id, p.term_frequency) for p in index[term]],
+                                     [(p.document_id, p.term_frequency) for p in expected[term]])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+
+from mapreduce.jobs import Job
+
+
+class DocumentFrequencyJob(Job):
+    # Counts the documents each first letter of a term occurs in, at module level so that worker processes
+    # can unpickle it.
+    def map(self, document):
+        return [(letter, 1) for letter in sorted({term[0] for term in document.get_field("body", "").split()})]
+
+    def reduce(self, key, pieces):
+        return sum(1 for _ in self.records(pieces))
+
+
+class TestJobs(unittest.TestCase):
+    def setUp(self):
+        import os.path
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.normalization import BrainDeadNormalizer
+        from mapreduce.tokenization import BrainDeadTokenizer
+        self._normalizer = BrainDeadNormalizer()
+        self._tokenizer = BrainDeadTokenizer()
+        self._corpus = InMemoryCorpus(os.path.join("data", "mesh.txt"))
+
+    def _mapreducer(self, corpus):
+        from mapreduce.mapreducer import MapReducer
+        return MapReducer(["body"], corpus, self._normalizer, self._tokenizer, min_split_size=0)
+
+    def test_word_count(self):
+        from collections import Counter
+        from mapreduce.analysis import Analyzer
+        from mapreduce.jobs import WordCountJob
+        analyzer = Analyzer(self._normalizer, self._tokenizer)
+        expected = Counter(term for document in self._corpus for term in analyzer.get_document_terms(document, ["body"]))
+        for backend in ["serial", "processes"]:
+            counts = self._mapreducer(self._corpus).run(WordCountJob(["body"], analyzer), 2, 3, backend)
+            self.assertListEqual(counts, sorted(expected.items()))
+
+    def test_grep(self):
+        from mapreduce.corpus import InMemoryCorpus, InMemoryDocument
+        from mapreduce.jobs import GrepJob
+        corpus = InMemoryCorpus()
+        for document_id, body in enumerate(["an acid\nno match\nacid acid", "nothing", "acid\nan acid"] * 10):
+            corpus.add_document(InMemoryDocument(document_id, {"body": body}))
+        expected = [(document.document_id, line_number, line) for document in corpus
+                    for line_number, line in enumerate(document["body"].splitlines()) if "acid" in line]
+        matches = self._mapreducer(corpus).run(GrepJob("acid"), 2, 2, "serial")
+        self.assertListEqual(matches, expected)
+        self.assertListEqual(self._mapreducer(corpus).run(GrepJob("^ACID$", flags=2), 2, 2, "serial"),
+                             [(document_id, 0, "acid") for document_id in range(2, 30, 3)])
+
+    def test_sort(self):
+        from mapreduce.jobs import SortJob
+        from mapreduce.partitioning import RangePartitioner
+        expected = sorted(range(len(self._corpus)), key=lambda document_id: (self._corpus[document_id]["body"],
+                                                                            document_id))
+        partitioner = RangePartitioner(sample_size=100)
+        mapreducer = self._mapreducer(self._corpus)
+        self.assertListEqual(mapreducer.run(SortJob("body", partitioner), 2, 4, "threading"), expected)
+        self.assertEqual(len(partitioner.boundaries), 3)
+        self.assertListEqual(partitioner.boundaries, sorted(partitioner.boundaries))
+        self.assertLess(max(mapreducer.stats.partition_records), len(self._corpus) / 2)
+
+    def test_custom_job(self):
+        from collections import Counter
+        expected = Counter(letter for document in self._corpus for letter in {term[0] for term in document["body"].split()})
+        frequencies = self._mapreducer(self._corpus).run(DocumentFrequencyJob(["body"]), 2, 2, "processes")
+        self.assertListEqual(frequencies, sorted(expected.items()))
+
+    def test_inverted_index(self):
+        from mapreduce.analysis import Analyzer
+        from mapreduce.jobs import InvertedIndexJob
+        mapreducer = self._mapreducer(self._corpus)
+        expected_lists, expected_dictionary = mapreducer.mapreduce(2, 2, False, "serial")
+        job = InvertedIndexJob(["body"], Analyzer(self._normalizer, self._tokenizer))
+        posting_lists, dictionary, lengths = mapreducer.run(job, 2, 2, "serial")
+        self.assertDictEqual(dictionary, expected_dictionary)
+        self.assertListEqual([[(p.document_id, p.term_frequency) for p in posting_list] for posting_list in posting_lists],
+                             [[(p.document_id, p.term_frequency) for p in posting_list] for posting_list in expected_lists])
+        self.assertListEqual(list(lengths), list(mapreducer.document_lengths))
+
+
+if __name__ == '__main__':
+    unittest.main()
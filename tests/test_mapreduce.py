@@ -1,5 +1,16 @@
 import unittest
 
+from mapreduce.combining import TermFrequencyCombiner
+
+
+class FailingCombiner(TermFrequencyCombiner):
+    # Fails the map task of document 100, at module level so that worker processes can unpickle it.
+    def combine_document(self, document_id, terms):
+        if document_id == 100:
+            raise RuntimeError("failed")
+        return super().combine_document(document_id, terms)
+
+
 class TestMapReduceInvertedIndex(unittest.TestCase):
     def setUp(self):
         from mapreduce.normalization import BrainDeadNormalizer
@@ -47,6 +58,222 @@ class TestMapReduceInvertedIndex(unittest.TestCase):
         self.assertEqual(posting.document_id, 0)
         self.assertEqual(posting.term_frequency, 5)
 
+    def test_backends(self):
+        import os.path
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.invertedindex import InMemoryInvertedIndex, MapReduceInvertedIndex
+
+        corpus = InMemoryCorpus(os.path.join("data", "mesh.txt"))
+        expected = InMemoryInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer)
+        for backend in ["serial", "threading", "processes"]:
+            index = MapReduceInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer, backend)
+            for term in ["hydrogen", "hydrocephalus", "acid", "wtf"]:
+                self.assertListEqual([(p.document_id, p.term_frequency) for p in index[term]],
+                                     [(p.document_id, p.term_frequency) for p in expected[term]])
+
+        with self.assertRaises(ValueError):
+            MapReduceInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer, "quantum")
+
+    def test_configuration(self):
+        import os.path
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.invertedindex import InMemoryInvertedIndex, MapReduceInvertedIndex
+
+        corpus = InMemoryCorpus(os.path.join("data", "mesh.txt"))
+        expected = InMemoryInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer)
+        index = MapReduceInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer, "serial", mappers=1,
+                                       reducers=3)
+        self.assertListEqual(list(index.get_vocabulary()), list(expected.get_vocabulary()))
+        self.assertListEqual(list(index.stats.timings),
+                             ["splitting", "mapping", "partitioning", "reducing", "combining", "freezing"])
+
+    def test_stats(self):
+        import os.path
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.mapreducer import MapReducer
+        from mapreduce.stats import JobListener
+
+        class RecordingListener(JobListener):
+            def __init__(self):
+                self.events = []
+
+            def phase_started(self, stats, name):
+                self.events.append(("started", name))
+
+            def task_finished(self, stats, task):
+                self.events.append(("task", task.phase))
+
+            def phase_finished(self, stats, phase):
+                self.events.append(("finished", phase.name))
+
+        corpus = InMemoryCorpus(os.path.join("data", "mesh.txt"))
+        for backend in ["serial", "threading", "processes"]:
+            listener = RecordingListener()
+            mapreducer = MapReducer(["body"], corpus, self._normalizer, self._tokenizer)
+            _, terms = mapreducer.mapreduce(2, 3, False, backend, listener)
+            stats = mapreducer.stats
+            mapping, reducing = stats.phases["mapping"], stats.phases["reducing"]
+            self.assertEqual(sum(task.records_in for task in mapping.tasks), len(corpus))
+            self.assertEqual(sum(task.records_out for task in mapping.tasks), sum(stats.partition_records))
+            self.assertListEqual([task.records_in for task in reducing.tasks], stats.partition_records)
+            self.assertEqual(sum(task.records_out for task in reducing.tasks), len(terms))
+            self.assertEqual(len(stats.partition_bytes), 3)
+            self.assertGreater(stats.bytes_shuffled, 0)
+            self.assertGreater(stats.peak_memory, 0)
+            self.assertTrue(all(task.wall >= 0 and task.cpu >= 0 for task in mapping.tasks + reducing.tasks))
+            self.assertIs(reducing.slowest, max(reducing.tasks, key=lambda task: task.wall))
+            self.assertListEqual(listener.events[:2], [("started", "splitting"), ("finished", "splitting")])
+            self.assertEqual(listener.events.count(("task", "mapping")), len(mapping.tasks))
+            self.assertEqual(listener.events.count(("task", "reducing")), 3)
+            self.assertEqual(listener.events[-1], ("finished", "combining"))
+
+            # Without measuring, the tasks are still counted, but not timed.
+            unmeasured = MapReducer(["body"], corpus, self._normalizer, self._tokenizer, measure_tasks=False)
+            unmeasured.mapreduce(2, 3, False, backend)
+            unmeasured_reducing = unmeasured.stats.phases["reducing"]
+            self.assertListEqual([task.records_in for task in unmeasured_reducing.tasks], stats.partition_records)
+            self.assertTrue(all(task.wall == task.cpu == task.peak_memory == 0 for task in unmeasured_reducing.tasks))
+
+    def test_combiners(self):
+        from mapreduce.corpus import InMemoryDocument, InMemoryCorpus
+        from mapreduce.combining import TermFrequencyCombiner
+        from mapreduce.mapreducer import MapReducer
+        from mapreduce.partitioning import HashPartitioner
+        from mapreduce.shuffle import Shuffle
+        partitioner = HashPartitioner()
+        partitioner.fit(1, [])
+        corpus = InMemoryCorpus()
+        corpus.add_document(InMemoryDocument(0, {"body": "test a test"}))
+        corpus.add_document(InMemoryDocument(1, {"body": "a test TEST test"}))
+        for combiner, records in [(None, 7), (TermFrequencyCombiner(), 4), (TermFrequencyCombiner(False), 4)]:
+            mapreducer = MapReducer(["body"], corpus, self._normalizer, self._tokenizer, combiner=combiner)
+            runs, counts, lengths = mapreducer._map((range(0, 2), Shuffle(partitioner)))
+            self.assertEqual(len(runs[0][0]), records)
+            self.assertListEqual(counts, [records])
+            self.assertListEqual(list(lengths), [3, 4])
+            posting_lists, dictionary = mapreducer.mapreduce(1, 2, False, "serial")
+            self.assertListEqual(list(mapreducer.document_lengths), [3, 4])
+            self.assertListEqual([(p.document_id, p.term_frequency) for p in posting_lists[dictionary["test"]]],
+                                 [(0, 2), (1, 3)])
+
+    def test_packed_runs(self):
+        import tempfile
+        from mapreduce.partitioning import HashPartitioner, SampledPartitioner
+        from mapreduce.shuffle import PackedRun, Shuffle
+        partitioner = SampledPartitioner()
+        partitioner.fit(2, [("b", document_id, 1) for document_id in range(10)] + [("a", 0, 1), ("c", 1, 1)])
+        self.assertTrue(partitioner.is_split("b"))
+        self.assertFalse(partitioner.is_split("a"))
+        writer = Shuffle(partitioner).writer()
+        writer.add_document(0, [("b", 1), ("a", 2), ("b", 1)])
+        writer.add_document(8, [("b", 3)])
+        writer.add([("c", 1, 1), ("ø", 9, 4)])
+        runs = writer.close()
+        self.assertEqual(sum(writer.records), 6)
+        records = sorted(record for partition_runs in runs for run in partition_runs for record in run)
+        self.assertListEqual(records, [("a", 0, 2), ("b", 0, 1), ("b", 0, 1), ("b", 8, 3), ("c", 1, 1), ("ø", 9, 4)])
+        with tempfile.TemporaryDirectory() as directory:
+            for partition_runs in runs:
+                for run in partition_runs:
+                    filename = Shuffle(partitioner, directory=directory).write_run(run)
+                    self.assertListEqual(list(PackedRun.attach(filename)), list(run))
+                    self.assertListEqual([(term, list(piece)) for term, piece in PackedRun.scan(filename)],
+                                         [(term, list(pieces[0])) for term, pieces in Shuffle.merge([run])])
+                    self.assertListEqual(run.terms, sorted(run.terms))
+
+            # Runs in memory and in files merge alike, with the pieces of a term in the order of the runs.
+            partitioner = HashPartitioner()
+            partitioner.fit(1, [])
+            first = Shuffle(partitioner).writer()
+            first.add([("a", 1, 1), ("b", 2, 1)])
+            second = Shuffle(partitioner).writer()
+            second.add([("b", 5, 2), ("c", 6, 1)])
+            mixed = [first.close()[0][0], Shuffle(partitioner, directory=directory).write_run(second.close()[0][0])]
+            self.assertListEqual([(term, [list(piece) for piece in pieces]) for term, pieces in Shuffle.merge(mixed)],
+                                 [("a", [[1, 1]]), ("b", [[2, 1], [5, 2]]), ("c", [[6, 1]])])
+        merged = dict(Shuffle.merge([run for partition_runs in runs for run in partition_runs]))
+        self.assertListEqual(sorted(merged), ["a", "b", "c", "ø"])
+        self.assertEqual(sorted(document_id for piece in merged["b"] for document_id in piece[::2]), [0, 0, 8])
+
+    def test_spilling_shuffle(self):
+        import os
+        import os.path
+        import tempfile
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.invertedindex import InMemoryInvertedIndex
+        from mapreduce.mapreducer import MapReducer
+
+        corpus = InMemoryCorpus(os.path.join("data", "mesh.txt"))
+        expected = InMemoryInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer)
+        with tempfile.TemporaryDirectory() as directory:
+            mapreducer = MapReducer(["body"], corpus, self._normalizer, self._tokenizer,
+                                    memory_budget=64 * 1024, spill_directory=directory)
+            for backend in ["serial", "processes"]:
+                posting_lists, dictionary = mapreducer.mapreduce(2, 3, False, backend)
+                for term in ["hydrogen", "hydrocephalus", "acid", "of"]:
+                    self.assertListEqual([(p.document_id, p.term_frequency) for p in posting_lists[dictionary[term]]],
+                                         [(p.document_id, p.term_frequency) for p in expected[term]])
+                self.assertListEqual(os.listdir(directory), [])
+
+    def test_shared_shuffle(self):
+        import os
+        import os.path
+        import tempfile
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.invertedindex import InMemoryInvertedIndex
+        from mapreduce.mapreducer import MapReducer
+        from mapreduce.partitioning import HashPartitioner
+        from mapreduce.shuffle import Shuffle
+
+        corpus = InMemoryCorpus(os.path.join("data", "mesh.txt"))
+        expected = InMemoryInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer)
+        with tempfile.TemporaryDirectory() as directory:
+            partitioner = HashPartitioner()
+            partitioner.fit(2, [])
+            mapreducer = MapReducer(["body"], corpus, self._normalizer, self._tokenizer, spill_directory=directory)
+            runs, _, _ = mapreducer._map((range(0, 10), Shuffle(partitioner, directory=directory, shared=True)))
+            self.assertTrue(all(isinstance(run, str) for partition_runs in runs for run in partition_runs))
+            for partition_runs in runs:
+                for run in partition_runs:
+                    os.remove(run)
+
+            posting_lists, dictionary = mapreducer.mapreduce(2, 3, False, "processes")
+            for term in ["hydrogen", "hydrocephalus", "acid", "of"]:
+                self.assertListEqual([(p.document_id, p.term_frequency) for p in posting_lists[dictionary[term]]],
+                                     [(p.document_id, p.term_frequency) for p in expected[term]])
+            self.assertListEqual(os.listdir(directory), [])
+
+            mapreducer = MapReducer(["body"], corpus, self._normalizer, self._tokenizer,
+                                    combiner=FailingCombiner(), spill_directory=directory)
+            with self.assertRaises(RuntimeError):
+                mapreducer.mapreduce(2, 3, False, "processes")
+            self.assertListEqual(os.listdir(directory), [])
+
+    def test_sampled_partitioner(self):
+        import os.path
+        from mapreduce.corpus import InMemoryCorpus, InMemoryDocument
+        from mapreduce.invertedindex import InMemoryInvertedIndex
+        from mapreduce.mapreducer import MapReducer
+        from mapreduce.partitioning import SampledPartitioner
+
+        # No term of en.txt makes up more than a few percent of the records, so none is split.
+        # Every document has "common", which makes up half of the records of the skewed corpus.
+        skewed_corpus = InMemoryCorpus()
+        for document_id in range(1000):
+            skewed_corpus.add_document(InMemoryDocument(document_id, {"body": "common w{}".format(document_id % 97)}))
+        for corpus, heavy_hitters in [(InMemoryCorpus(os.path.join("data", "en.txt")), []),
+                                      (skewed_corpus, ["common"])]:
+            expected = InMemoryInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer)
+            partitioner = SampledPartitioner()
+            mapreducer = MapReducer(["body"], corpus, self._normalizer, self._tokenizer, partitioner=partitioner)
+            posting_lists, dictionary = mapreducer.mapreduce(2, 4, False, "serial")
+            self.assertListEqual(list(partitioner.heavy_hitters), heavy_hitters)
+            for term in heavy_hitters:
+                self.assertEqual(len(set(partitioner.heavy_hitters[term][1])), 2)
+            self.assertEqual(len(dictionary), len(expected._dictionary))
+            for term in ["the", "of", "and", "hydrogen", "common", "w0", "w96", "wtf"]:
+                self.assertListEqual([(p.document_id, p.term_frequency) for p in posting_lists[dictionary[term]]] if term in dictionary else [],
+                                     [(p.document_id, p.term_frequency) for p in expected[term]])
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,128 @@
+import time
+import unittest
+
+from mapreduce.corpus import InMemoryCorpus, InMemoryDocument
+from mapreduce.jobs import Job
+
+
+class SlowCorpus(InMemoryCorpus):
+    # A corpus that can only be read in order, and slowly, like a stream from the network.
+    def __init__(self, documents, delay):
+        super().__init__()
+        self._delay = delay
+        for document_id in range(documents):
+            self.add_document(InMemoryDocument(document_id, {"body": "a b c " + str(document_id % 10)}))
+
+    def __iter__(self):
+        for document in super().__iter__():
+            time.sleep(self._delay)
+            yield document
+
+
+class SlowWordCountJob(Job):
+    # Counts words and takes its time doing so, at module level so that worker processes can unpickle it.
+    def __init__(self, delay):
+        super().__init__(["body"])
+        self._delay = delay
+
+    def map(self, document):
+        time.sleep(self._delay)
+        return [(word, 1) for word in document["body"].split()]
+
+    def reduce(self, key, pieces):
+        return sum(piece[i] for piece in pieces for i in range(1, len(piece), 2))
+
+
+class BrokenCorpus(InMemoryCorpus):
+    def __iter__(self):
+        yield from list(super().__iter__())[:5]
+        raise IOError("broken")
+
+
+class TestPipeline(unittest.TestCase):
+    def test_batches(self):
+        from mapreduce.pipeline import batches
+        documents = [InMemoryDocument(i, {"body": "x" * (i % 3)}) for i in range(10)]
+        self.assertListEqual([[document.document_id for document in batch] for batch in batches(documents, ["body"], 3)],
+                             [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]])
+        self.assertListEqual(list(batches([], ["body"], 3)), [])
+
+    def test_read_ahead(self):
+        from mapreduce.pipeline import read_ahead, Stage
+        self.assertListEqual(list(read_ahead(range(100), 3)), list(range(100)))
+        with self.assertRaises(IOError):
+            list(read_ahead(BrokenCorpus(), 2))
+
+        stage = Stage(sum, 2)
+        for i in range(100):
+            stage.put(i)
+        self.assertEqual(stage.close(), sum(range(100)))
+        stage = Stage(lambda items: [1 / item for item in items], 2)
+        with self.assertRaises(ZeroDivisionError):
+            for i in range(10):
+                stage.put(i)
+            stage.close()
+
+    def test_mapreduce(self):
+        import os.path
+        import tempfile
+        from mapreduce.combining import TermFrequencyCombiner
+        from mapreduce.corpus import StreamingCorpus
+        from mapreduce.mapreducer import MapReducer
+        from mapreduce.normalization import BrainDeadNormalizer
+        from mapreduce.tokenization import BrainDeadTokenizer
+
+        normalizer, tokenizer = BrainDeadNormalizer(), BrainDeadTokenizer()
+        path = os.path.join("data", "mesh.txt")
+        corpus = InMemoryCorpus(path)
+        expected = MapReducer(["body"], corpus, normalizer, tokenizer)
+        expected_lists, expected_dictionary = expected.mapreduce(2, 3, False)
+        for backend in ["serial", "threading", "processes"]:
+            for combiner in [TermFrequencyCombiner(), None]:
+                with tempfile.TemporaryDirectory() as directory:
+                    mapreducer = MapReducer(["body"], StreamingCorpus(path), normalizer, tokenizer, combiner=combiner,
+                                            memory_budget=256 * 1024, spill_directory=directory,
+                                            batch_size=32 * 1024, merge_factor=3)
+                    posting_lists, dictionary = mapreducer.mapreduce(2, 3, False, backend)
+                    self.assertDictEqual(dictionary, expected_dictionary)
+                    for term in ["hydrogen", "hydrocephalus", "acid", "wtf"]:
+                        self.assertListEqual(
+                            [(p.document_id, p.term_frequency) for p in posting_lists[dictionary[term]]]
+                            if term in dictionary else [],
+                            [(p.document_id, p.term_frequency) for p in expected_lists[expected_dictionary[term]]]
+                            if term in expected_dictionary else [])
+                    self.assertListEqual(list(mapreducer.document_lengths), list(expected.document_lengths))
+
+                    # Every complete block of map tasks was merged, into a single run per partition.
+                    stats = mapreducer.stats
+                    batches = len(stats.phases["mapping"].tasks)
+                    self.assertGreater(batches, 3)
+                    self.assertEqual(len(stats.phases["merging"].tasks), batches // 3 * 3)
+                    self.assertEqual(sum(task.records_in for task in stats.phases["mapping"].tasks), len(corpus))
+                    self.assertListEqual(os.listdir(directory), [])
+
+        with self.assertRaises(IOError):
+            MapReducer(["body"], BrokenCorpus(path), normalizer, tokenizer, batch_size=100).mapreduce(2, 2, False)
+
+    def test_overlap(self):
+        from mapreduce.mapreducer import MapReducer
+        from mapreduce.normalization import BrainDeadNormalizer
+        from mapreduce.tokenization import BrainDeadTokenizer
+
+        # Reading and mapping take about a second each. With barriers, all documents are read
+        # before the first is mapped, while the pipeline maps a batch as soon as it's read.
+        corpus = SlowCorpus(200, 0.005)
+        timings = {}
+        for batch_size in [None, 100]:
+            mapreducer = MapReducer(["body"], corpus, BrainDeadNormalizer(), BrainDeadTokenizer(), min_split_size=0,
+                                    batch_size=batch_size)
+            start = time.perf_counter()
+            counts = mapreducer.run(SlowWordCountJob(0.005), 1, 1, "threading")
+            timings[batch_size] = time.perf_counter() - start
+            self.assertListEqual(counts, [(str(i), 20) for i in range(10)] + [("a", 200), ("b", 200), ("c", 200)])
+        self.assertGreater(timings[None], 1.9)
+        self.assertLess(timings[100], 1.6)
+
+
+if __name__ == '__main__':
+    unittest.main()
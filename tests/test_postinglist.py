@@ -0,0 +1,70 @@
+import unittest
+
+class TestCompressedPostingList(unittest.TestCase):
+    def test_round_trip(self):
+        from mapreduce.postinglist import CompressedPostingList
+        postings = [(0, 1), (1, 200), (127, 3), (128, 1), (100000, 1), (2 ** 40, 2 ** 20)]
+        posting_list = CompressedPostingList()
+        for document_id, term_frequency in postings:
+            posting_list.append(document_id, term_frequency)
+        self.assertEqual(len(posting_list), len(postings))
+        self.assertEqual(posting_list.last_document_id, 2 ** 40)
+        self.assertListEqual([(p.document_id, p.term_frequency) for p in posting_list], postings)
+        self.assertListEqual([(p.document_id, p.term_frequency) for p in posting_list], postings)
+
+        copy = CompressedPostingList(memoryview(bytes(posting_list.buffer)), len(postings))
+        self.assertListEqual([(p.document_id, p.term_frequency) for p in copy], postings)
+
+    def test_compact(self):
+        from mapreduce.postinglist import CompressedPostingList
+        posting_list = CompressedPostingList()
+        for document_id in range(0, 1000, 3):
+            posting_list.append(document_id, 1)
+        self.assertEqual(len(posting_list.buffer), 2 * len(posting_list))
+
+    def test_ascending_order(self):
+        from mapreduce.postinglist import CompressedPostingList
+        posting_list = CompressedPostingList()
+        posting_list.append(5, 1)
+        with self.assertRaises(AssertionError):
+            posting_list.append(5, 1)
+        self.assertListEqual(list(CompressedPostingList()), [])
+
+    def test_extend(self):
+        from mapreduce.postinglist import CompressedPostingList
+        posting_list = CompressedPostingList()
+        posting_list.append(0, 1)
+        posting_list.extend([1, 200, 127, 3, 100000, 1])
+        posting_list.extend([100001, 1, 100001, 2, 2 ** 40, 1, 2 ** 40, 2 ** 20])
+        self.assertListEqual([(p.document_id, p.term_frequency) for p in posting_list],
+                             [(0, 1), (1, 200), (127, 3), (100000, 1), (100001, 3), (2 ** 40, 2 ** 20 + 1)])
+        self.assertEqual(len(posting_list), 6)
+        self.assertEqual(posting_list.last_document_id, 2 ** 40)
+        with self.assertRaises(AssertionError):
+            posting_list.extend([2 ** 40, 1])
+
+    def test_cursor(self):
+        import bisect
+        from mapreduce.posting import Posting
+        from mapreduce.postinglist import CompressedPostingList, ConcatenatedPostingsCursor, PostingsCursor
+        document_ids = list(range(0, 10000, 7))
+        posting_list = CompressedPostingList.from_postings(
+            Posting(document_id, document_id % 5 + 1) for document_id in document_ids)
+        head = CompressedPostingList.from_postings(Posting(document_id, 1) for document_id in document_ids[:500])
+        tail = CompressedPostingList.from_postings(Posting(document_id, 1) for document_id in document_ids[500:])
+        for cursor in [posting_list.cursor(), ConcatenatedPostingsCursor([head, CompressedPostingList(), tail])]:
+            self.assertEqual(cursor.document_id, 0)
+            for target in [3, 3, 500, 501, 3600, 3601, 9000, 9996]:
+                cursor.advance(target)
+                self.assertEqual(cursor.document_id, document_ids[bisect.bisect_left(document_ids, target)])
+            cursor.next()
+            self.assertEqual(cursor.document_id, PostingsCursor.END)
+        cursor = posting_list.cursor()
+        cursor.advance(700)
+        self.assertTupleEqual((cursor.document_id, cursor.term_frequency), (700, 1))
+        cursor.next()
+        self.assertTupleEqual((cursor.document_id, cursor.term_frequency), (707, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
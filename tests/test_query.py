@@ -0,0 +1,60 @@
+import unittest
+
+class TestBooleanSearchEngine(unittest.TestCase):
+    def setUp(self):
+        import os.path
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.invertedindex import InMemoryInvertedIndex
+        from mapreduce.normalization import BrainDeadNormalizer
+        from mapreduce.tokenization import BrainDeadTokenizer
+        self._index = InMemoryInvertedIndex(InMemoryCorpus(os.path.join("data", "mesh.txt")), ["body"],
+                                            BrainDeadNormalizer(), BrainDeadTokenizer())
+
+    def _documents(self, term):
+        return {p.document_id for p in self._index[term]}
+
+    def test_operators(self):
+        from mapreduce.query import BooleanSearchEngine
+        engine = BooleanSearchEngine(self._index)
+        a, b, c = self._documents("acid"), self._documents("hydrogen"), self._documents("disease")
+        self.assertListEqual(list(engine.evaluate("ACID AND hydrogen")), sorted(a & b))
+        self.assertListEqual(list(engine.evaluate("acid hydrogen")), sorted(a & b))
+        self.assertListEqual(list(engine.evaluate("acid OR hydrogen OR disease")), sorted(a | b | c))
+        self.assertListEqual(list(engine.evaluate("acid ANDNOT hydrogen")), sorted(a - b))
+        self.assertListEqual(list(engine.evaluate("disease OR acid AND hydrogen")), sorted(c | (a & b)))
+        self.assertListEqual(list(engine.evaluate("(disease OR acid) AND hydrogen")), sorted((c | a) & b))
+        self.assertListEqual(list(engine.evaluate("(disease OR acid) ANDNOT (hydrogen OR disease)")),
+                             sorted(a - b - c))
+        self.assertListEqual(list(engine.evaluate("acid AND wtf")), [])
+        self.assertListEqual(list(engine.evaluate("acid OR wtf")), sorted(a))
+        self.assertListEqual(list(engine.evaluate("acid AND ,,")), sorted(a))
+        self.assertListEqual(list(engine.evaluate("")), [])
+
+    def test_cursors(self):
+        import tempfile
+        from mapreduce.query import BooleanSearchEngine
+        from mapreduce.postinglist import IteratorPostingsCursor
+        from mapreduce.storage import DiskInvertedIndex
+
+        query = "(of OR the) AND (disease OR acid) ANDNOT hydrogen"
+        expected = sorted(((self._documents("of") | self._documents("the")) &
+                           (self._documents("disease") | self._documents("acid"))) - self._documents("hydrogen"))
+        self.assertListEqual(list(BooleanSearchEngine(self._index).evaluate(query)), expected)
+        with tempfile.TemporaryDirectory() as directory:
+            self._index.save(directory)
+            with DiskInvertedIndex(directory, self._index._normalizer, self._index._tokenizer) as index:
+                self.assertListEqual(list(BooleanSearchEngine(index).evaluate(query)), expected)
+        cursor = IteratorPostingsCursor(self._index["of"])
+        cursor.advance(1000)
+        self.assertEqual(cursor.document_id, min(d for d in self._documents("of") if d >= 1000))
+
+    def test_syntax_errors(self):
+        from mapreduce.query import BooleanSearchEngine
+        engine = BooleanSearchEngine(self._index)
+        for query in ["(acid", "acid OR", "AND acid", "acid )", "acid AND ()"]:
+            with self.assertRaises(ValueError):
+                engine.evaluate(query)
+
+
+if __name__ == '__main__':
+    unittest.main()
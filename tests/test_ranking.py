@@ -0,0 +1,107 @@
+import unittest
+
+class TestRankedSearchEngine(unittest.TestCase):
+    def setUp(self):
+        from mapreduce.normalization import BrainDeadNormalizer
+        from mapreduce.tokenization import BrainDeadTokenizer
+        self._normalizer = BrainDeadNormalizer()
+        self._tokenizer = BrainDeadTokenizer()
+
+    def test_bm25(self):
+        import math
+        from mapreduce.corpus import InMemoryDocument, InMemoryCorpus
+        from mapreduce.invertedindex import InMemoryInvertedIndex
+        from mapreduce.ranking import RankedSearchEngine
+        corpus = InMemoryCorpus()
+        corpus.add_document(InMemoryDocument(0, {"body": "this is a Test"}))
+        corpus.add_document(InMemoryDocument(1, {"body": "test TEST prØve"}))
+        corpus.add_document(InMemoryDocument(2, {"body": "nothing to see here, move along"}))
+        index = InMemoryInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer)
+        self.assertListEqual(list(index.get_document_lengths()), [4, 3, 6])
+
+        idf = math.log(1 + (3 - 2 + 0.5) / (2 + 0.5))
+        def bm25(tf, length):
+            return idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * length / (13 / 3)))
+        results = RankedSearchEngine(index).evaluate("test", 5)
+        self.assertListEqual([document_id for document_id, _ in results], [1, 0])
+        self.assertAlmostEqual(results[0][1], bm25(2, 3))
+        self.assertAlmostEqual(results[1][1], bm25(1, 4))
+        self.assertListEqual(RankedSearchEngine(index).evaluate("wtf"), [])
+
+    def test_pruning(self):
+        import os.path
+        import random
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.invertedindex import InMemoryInvertedIndex
+        from mapreduce.ranking import RankedSearchEngine, TfIdfScorer
+
+        index = InMemoryInvertedIndex(InMemoryCorpus(os.path.join("data", "mesh.txt")), ["body"],
+                                      self._normalizer, self._tokenizer)
+        vocabulary = sorted(index.get_vocabulary())
+        generator = random.Random(0)
+        for scorer in [None, TfIdfScorer()]:
+            engine = RankedSearchEngine(index, scorer)
+            for _ in range(50):
+                query = " ".join(generator.sample(vocabulary, 2) + generator.sample(["of", "and", "acid", "the"], 2))
+                k = generator.choice([1, 3, 10, 100])
+                self.assertListEqual(engine.evaluate(query, k), engine.evaluate_exhaustively(query, k))
+
+    def test_document_lengths(self):
+        import os.path
+        import tempfile
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.invertedindex import InMemoryInvertedIndex, MapReduceInvertedIndex
+        from mapreduce.segments import SegmentedInvertedIndex
+        from mapreduce.storage import DiskInvertedIndex
+
+        corpus = InMemoryCorpus(os.path.join("data", "mesh.txt"))
+        expected = list(InMemoryInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer).get_document_lengths())
+        self.assertEqual(len(expected), corpus.size())
+        index = MapReduceInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer, "serial")
+        self.assertListEqual(list(index.get_document_lengths()), expected)
+        with tempfile.TemporaryDirectory() as directory:
+            index.save(directory)
+            with DiskInvertedIndex(directory, self._normalizer, self._tokenizer) as disk_index:
+                self.assertListEqual(list(disk_index.get_document_lengths()), expected)
+        with SegmentedInvertedIndex(["body"], self._normalizer, self._tokenizer) as segmented_index:
+            for start in range(0, corpus.size(), 100):
+                segmented_index.add_documents(corpus.get_documents(start, min(start + 100, corpus.size())))
+            segmented_index.wait_for_merges()
+            self.assertListEqual(list(segmented_index.get_document_lengths()), expected)
+
+
+    def test_term_bounds(self):
+        import os.path
+        import tempfile
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.invertedindex import InvertedIndex, InMemoryInvertedIndex, MapReduceInvertedIndex
+        from mapreduce.segments import SegmentedInvertedIndex
+        from mapreduce.storage import DiskInvertedIndex
+
+        corpus = InMemoryCorpus(os.path.join("data", "mesh.txt"))
+        in_memory_index = InMemoryInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer)
+        terms = sorted(in_memory_index.get_vocabulary())[::50] + ["of", "and", "acid", "wtf"]
+        # The default makes a pass over each posting list.
+        expected = [InvertedIndex.get_term_bounds(in_memory_index, term) for term in terms]
+        self.assertTupleEqual(expected[-1], (0, 0))
+
+        def assert_bounds(index):
+            self.assertListEqual([index.get_term_bounds(term) for term in terms], expected)
+
+        assert_bounds(in_memory_index)
+        for mode in ["serial", "processes"]:
+            assert_bounds(MapReduceInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer, mode))
+        with tempfile.TemporaryDirectory() as directory:
+            in_memory_index.save(directory)
+            with DiskInvertedIndex(directory, self._normalizer, self._tokenizer) as disk_index:
+                assert_bounds(disk_index)
+        with SegmentedInvertedIndex(["body"], self._normalizer, self._tokenizer) as segmented_index:
+            for start in range(0, corpus.size(), 100):
+                segmented_index.add_documents(corpus.get_documents(start, min(start + 100, corpus.size())))
+            assert_bounds(segmented_index)
+            segmented_index.wait_for_merges()
+            assert_bounds(segmented_index)
+
+
+if __name__ == '__main__':
+    unittest.main()
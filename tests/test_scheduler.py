@@ -0,0 +1,111 @@
+import os
+import time
+import unittest
+
+from mapreduce.combining import TermFrequencyCombiner
+
+
+def _first_attempt(directory, task):
+    # True for the first attempt at a task, also across processes, by leaving a file behind.
+    try:
+        open(os.path.join(directory, str(task)), "x").close()
+        return True
+    except FileExistsError:
+        return False
+
+
+def flaky_square(directory, task):
+    if task % 3 == 0 and _first_attempt(directory, task):
+        raise ValueError("flaky")
+    return task * task
+
+
+def crashing_square(directory, task):
+    if task == 2 and _first_attempt(directory, task):
+        os._exit(1)
+    return task * task
+
+
+def slow_square(directory, task):
+    if task == 5 and _first_attempt(directory, task):
+        time.sleep(5)
+    return task * task
+
+
+class FlakyCombiner(TermFrequencyCombiner):
+    # Fails the first attempt at the map task of document 100.
+    def __init__(self, directory):
+        super().__init__()
+        self._directory = directory
+
+    def combine_document(self, document_id, terms):
+        if document_id == 100 and _first_attempt(self._directory, document_id):
+            raise RuntimeError("flaky")
+        return super().combine_document(document_id, terms)
+
+
+class TestScheduler(unittest.TestCase):
+    def test_retry(self):
+        import tempfile
+        from mapreduce.executor import make_executor
+        from mapreduce.scheduler import Scheduler
+
+        for backend in ["serial", "threading", "processes"]:
+            with tempfile.TemporaryDirectory() as directory:
+                scheduler = Scheduler(make_executor(backend, 2), max_attempts=2)
+                self.assertListEqual(scheduler.map(flaky_square, range(8), directory), [i * i for i in range(8)])
+                self.assertListEqual(scheduler.attempts, [2 if i % 3 == 0 else 1 for i in range(8)])
+            with tempfile.TemporaryDirectory() as directory:
+                with self.assertRaises(ValueError):
+                    Scheduler(make_executor(backend, 2), max_attempts=1).map(flaky_square, range(8), directory)
+
+    def test_crash(self):
+        import tempfile
+        from mapreduce.executor import ProcessExecutor
+        from mapreduce.scheduler import Scheduler
+
+        with tempfile.TemporaryDirectory() as directory:
+            scheduler = Scheduler(ProcessExecutor(2))
+            self.assertListEqual(scheduler.map(crashing_square, range(6), directory), [i * i for i in range(6)])
+            self.assertGreaterEqual(scheduler.attempts[2], 2)
+
+    def test_speculation(self):
+        import tempfile
+        from mapreduce.executor import ThreadExecutor
+        from mapreduce.scheduler import Scheduler
+
+        with tempfile.TemporaryDirectory() as directory:
+            scheduler = Scheduler(ThreadExecutor(4), speculation=2, speculation_delay=0.1)
+            start = time.perf_counter()
+            self.assertListEqual(scheduler.map(slow_square, range(8), directory), [i * i for i in range(8)])
+            self.assertLess(time.perf_counter() - start, 2)
+            self.assertListEqual(scheduler.attempts, [2 if i == 5 else 1 for i in range(8)])
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Speculation is off by default.
+            scheduler = Scheduler(ThreadExecutor(4), speculation_delay=0.1)
+            start = time.perf_counter()
+            scheduler.map(slow_square, range(8), directory)
+            self.assertGreater(time.perf_counter() - start, 4)
+
+    def test_mapreduce(self):
+        import tempfile
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.invertedindex import InMemoryInvertedIndex
+        from mapreduce.mapreducer import MapReducer
+        from mapreduce.normalization import BrainDeadNormalizer
+        from mapreduce.tokenization import BrainDeadTokenizer
+
+        normalizer, tokenizer = BrainDeadNormalizer(), BrainDeadTokenizer()
+        corpus = InMemoryCorpus(os.path.join("data", "mesh.txt"))
+        expected = InMemoryInvertedIndex(corpus, ["body"], normalizer, tokenizer)
+        with tempfile.TemporaryDirectory() as directory:
+            mapreducer = MapReducer(["body"], corpus, normalizer, tokenizer, combiner=FlakyCombiner(directory))
+            posting_lists, terms = mapreducer.mapreduce(2, 2, False, "processes")
+            self.assertListEqual(sorted(terms), sorted(expected.get_vocabulary()))
+            self.assertListEqual([task.attempts for task in mapreducer.stats.phases["mapping"].tasks],
+                                 [2 if 100 in split else 1 for split in mapreducer._split(2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+class TestSegmentedInvertedIndex(unittest.TestCase):
+    def setUp(self):
+        from mapreduce.normalization import BrainDeadNormalizer
+        from mapreduce.tokenization import BrainDeadTokenizer
+        self._normalizer = BrainDeadNormalizer()
+        self._tokenizer = BrainDeadTokenizer()
+
+    def _assert_same_index(self, index, expected):
+        self.assertListEqual(sorted(index.get_vocabulary()), sorted(expected.get_vocabulary()))
+        for term in expected.get_vocabulary():
+            self.assertEqual(index.get_document_frequency(term), expected.get_document_frequency(term))
+            self.assertListEqual([(p.document_id, p.term_frequency) for p in index[term]],
+                                 [(p.document_id, p.term_frequency) for p in expected[term]])
+
+    def test_incremental_batches(self):
+        import os.path
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.invertedindex import InMemoryInvertedIndex
+        from mapreduce.segments import SegmentedInvertedIndex, TieredMergePolicy
+
+        corpus = InMemoryCorpus(os.path.join("data", "mesh.txt"))
+        expected = InMemoryInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer)
+        policy = TieredMergePolicy(segments_per_tier=3, floor_size=50)
+        for background in [False, True]:
+            with SegmentedInvertedIndex(["body"], self._normalizer, self._tokenizer, policy, background) as index:
+                for start in range(0, corpus.size(), 40):
+                    index.add_documents(corpus.get_documents(start, min(start + 40, corpus.size())))
+                    self.assertEqual(len(list(index["hydrogen"])),
+                                     len([p for p in expected["hydrogen"] if p.document_id < start + 40]))
+                index.wait_for_merges()
+                self.assertIsNone(policy.find_merge(index.segments))
+                self.assertLess(len(index.segments), corpus.size() // 40)
+                self.assertEqual(sum(segment.documents for segment in index.segments), corpus.size())
+                self._assert_same_index(index, expected)
+
+    def test_document_order(self):
+        from mapreduce.corpus import InMemoryDocument
+        from mapreduce.segments import SegmentedInvertedIndex
+
+        with SegmentedInvertedIndex(["body"], self._normalizer, self._tokenizer) as index:
+            generation = index.generation
+            self.assertIsNone(index.add_documents([]))
+            self.assertEqual(index.generation, generation)
+            index.add_documents([InMemoryDocument(3, {"body": "test TEST prØve"})])
+            self.assertGreater(index.generation, generation)
+            with self.assertRaises(AssertionError):
+                index.add_documents([InMemoryDocument(2, {"body": "test"})])
+            self.assertListEqual([(p.document_id, p.term_frequency) for p in index["test"]], [(3, 2)])
+            self.assertNotIn("wtf", index)
+
+    def test_tiered_merge_policy(self):
+        from mapreduce.segments import Segment, TieredMergePolicy
+
+        policy = TieredMergePolicy(segments_per_tier=2, floor_size=10)
+        sizes = [40, 20, 5, 10, 30]
+        segments = [Segment({}, size, 0, 0) for size in sizes]
+        self.assertListEqual([policy.get_tier(segment) for segment in segments], [2, 1, 0, 0, 1])
+        self.assertTupleEqual(policy.find_merge(segments), (2, 4))
+        self.assertIsNone(policy.find_merge(segments[:3]))
+
+
+if __name__ == '__main__':
+    unittest.main()
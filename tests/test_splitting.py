@@ -0,0 +1,27 @@
+import unittest
+
+class TestPlanSplits(unittest.TestCase):
+    def test_covers_all_documents(self):
+        from mapreduce.splitting import plan_splits
+        sizes = [3, 1, 4, 1, 5, 9, 2, 6, 5, 3, 5]
+        splits = plan_splits(sizes, 4, 0)
+        self.assertEqual(len(splits), 4)
+        self.assertListEqual([i for split in splits for i in split], list(range(len(sizes))))
+
+    def test_balanced_by_size(self):
+        from mapreduce.splitting import plan_splits
+        sizes = [100] + [1] * 300
+        splits = plan_splits(sizes, 4, 0)
+        self.assertListEqual(list(splits[0]), [0])
+        self.assertTrue(all(sum(sizes[i] for i in split) <= 101 for split in splits))
+
+    def test_min_split_size(self):
+        from mapreduce.splitting import plan_splits
+        splits = plan_splits([10] * 100, 50, 100)
+        self.assertEqual(len(splits), 10)
+        self.assertListEqual(plan_splits([10] * 5, 4, 1000), [range(0, 5)])
+        self.assertListEqual(plan_splits([], 4, 0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
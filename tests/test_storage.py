@@ -0,0 +1,89 @@
+import unittest
+
+class TestDiskInvertedIndex(unittest.TestCase):
+    def setUp(self):
+        from mapreduce.normalization import BrainDeadNormalizer
+        from mapreduce.tokenization import BrainDeadTokenizer
+        self._normalizer = BrainDeadNormalizer()
+        self._tokenizer = BrainDeadTokenizer()
+
+    def test_save_and_load(self):
+        import os.path
+        import tempfile
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.invertedindex import InMemoryInvertedIndex
+        from mapreduce.storage import DiskInvertedIndex
+
+        corpus = InMemoryCorpus(os.path.join("data", "mesh.txt"))
+        expected = InMemoryInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer)
+        with tempfile.TemporaryDirectory() as directory:
+            expected.save(directory)
+            with DiskInvertedIndex(directory, self._normalizer, self._tokenizer) as index:
+                self.assertListEqual(sorted(index.get_vocabulary()), sorted(expected.get_vocabulary()))
+                for term in expected.get_vocabulary():
+                    self.assertEqual(index.get_document_frequency(term), expected.get_document_frequency(term))
+                    self.assertListEqual([(p.document_id, p.term_frequency) for p in index[term]],
+                                         [(p.document_id, p.term_frequency) for p in expected[term]])
+                self.assertEqual(index.get_document_frequency("wtf"), 0)
+                self.assertListEqual(list(index["wtf"]), [])
+                self.assertListEqual(list(index.get_terms("HydroGen")), ["hydrogen"])
+                self.assertEqual(len(list(index["hydrogen"])), 8)
+
+    def test_skips(self):
+        import os.path
+        import tempfile
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.invertedindex import InMemoryInvertedIndex
+        from mapreduce.storage import DiskInvertedIndex
+
+        corpus = InMemoryCorpus(os.path.join("data", "mesh.txt"))
+        expected = InMemoryInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer)
+        with tempfile.TemporaryDirectory() as directory:
+            expected.save(directory)
+            with DiskInvertedIndex(directory, self._normalizer, self._tokenizer) as index:
+                for term in ["of", "and", "acid", "hydrogen"]:
+                    # The skip pointers come from the file, and match those of the posting list.
+                    posting_list = index._get_posting_list(term)
+                    self.assertListEqual([list(skips) for skips in posting_list._skips],
+                                         [list(skips) for skips in expected._posting_lists[
+                                             expected._dictionary[term]].get_skips()])
+                    for target in [0, 1, 500, 1234, 5000, 10 ** 9]:
+                        cursor, expected_cursor = index.get_postings_cursor(term), expected.get_postings_cursor(term)
+                        cursor.advance(target)
+                        expected_cursor.advance(target)
+                        self.assertTupleEqual((cursor.document_id, cursor.term_frequency),
+                                              (expected_cursor.document_id, expected_cursor.term_frequency))
+
+    def test_empty_index(self):
+        import tempfile
+        from mapreduce.corpus import InMemoryCorpus
+        from mapreduce.invertedindex import InMemoryInvertedIndex
+        from mapreduce.storage import DiskInvertedIndex
+
+        with tempfile.TemporaryDirectory() as directory:
+            InMemoryInvertedIndex(InMemoryCorpus(), ["body"], self._normalizer, self._tokenizer).save(directory)
+            with DiskInvertedIndex(directory, self._normalizer, self._tokenizer) as index:
+                self.assertListEqual(list(index.get_vocabulary()), [])
+                self.assertNotIn("test", index)
+
+    def test_version_mismatch(self):
+        import os.path
+        import struct
+        import tempfile
+        from mapreduce.corpus import InMemoryCorpus, InMemoryDocument
+        from mapreduce.invertedindex import InMemoryInvertedIndex
+        from mapreduce.storage import DiskInvertedIndex
+
+        corpus = InMemoryCorpus()
+        corpus.add_document(InMemoryDocument(0, {"body": "this is a Test"}))
+        with tempfile.TemporaryDirectory() as directory:
+            InMemoryInvertedIndex(corpus, ["body"], self._normalizer, self._tokenizer).save(directory)
+            with open(os.path.join(directory, "postings.bin"), mode="r+b") as f:
+                f.seek(4)
+                f.write(struct.pack("<I", 99))
+            with self.assertRaises(IOError):
+                DiskInvertedIndex(directory, self._normalizer, self._tokenizer)
+
+
+if __name__ == '__main__':
+    unittest.main()